@@ -0,0 +1,137 @@
+"""Persistent, content-addressed cache for document analysis results.
+
+Entries are keyed on a hash of the extracted text together with everything
+that changes the model's answer: the expected element list, the model name
+and the prompt template version.  Re-analysing the same document is then a
+single SQLite lookup instead of an OpenAI round trip.
+"""
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+
+
+def make_cache_key(content, elements, model, prompt_version):
+    """Return the cache key for one (document, type, model, prompt) combination."""
+    digest = hashlib.sha256()
+    digest.update(content.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(json.dumps(list(elements)).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(f"{model}\0{prompt_version}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed cache with TTL expiry and least-recently-used eviction."""
+
+    def __init__(self, path, max_entries=5000, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS analysis_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS analysis_cache_accessed_at ON analysis_cache (accessed_at)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Return the cached analysis for ``key`` or None."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value, created_at FROM analysis_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row and self.ttl and row[1] + self.ttl < now:
+                conn.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+                row = None
+            if row:
+                conn.execute('UPDATE analysis_cache SET accessed_at = ? WHERE key = ?', (now, key))
+
+        self._count(row is not None)
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, analysis):
+        """Store ``analysis`` under ``key`` and evict old entries if over budget."""
+        value = json.dumps(analysis)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, value, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value), now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        if self.ttl:
+            cursor = conn.execute('DELETE FROM analysis_cache WHERE created_at < ?', (time.time() - self.ttl,))
+            self._add_evictions(cursor.rowcount)
+
+        count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache').fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        # Walk from least recently used until both budgets are met
+        doomed = []
+        for key, size in conn.execute('SELECT key, size FROM analysis_cache ORDER BY accessed_at'):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany('DELETE FROM analysis_cache WHERE key = ?', doomed)
+        self._add_evictions(len(doomed))
+
+    def _add_evictions(self, n):
+        if n > 0:
+            with self._lock:
+                self.evictions += n
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM analysis_cache')
+
+    def stats(self):
+        """Return hit/miss counters and current size of the cache."""
+        with self._connect() as conn:
+            count, total = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache'
+            ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': count,
+                'bytes': total,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl
+            }
@@ -1,31 +1,268 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect, url_for, flash, session
 from werkzeug.utils import secure_filename
+import hashlib
+import hmac
+import io
 import os
 import json
+import logging
+import time
 import re
-import threading
-import queue
+import uuid
 from datetime import datetime
-from docx import Document
-import PyPDF2
-import markdown
-from openai import OpenAI
 from dotenv import load_dotenv
+from session_store import create_session_interface
+from analysis_cache import AnalysisCache, make_cache_key
+from jobs import JobQueue, JobQueueFull, JobStore, sse_stream
+from stream_parser import ElementStreamParser, parse_analysis, validate_analysis, normalize_status, merge_repair
+from chunking import split_into_chunks, apply_token_budget, analyze_in_chunks
+from extraction import extract_pdf_text, extract_pdf_pages, extract_docx_structure
+from artifacts import save_artifact, load_artifact
+from llm_client import LLMClientManager
+from providers import create_backend
+from prompts import build_prompt, document_budget, count_tokens, pack_document
+from enhancement import (SYSTEM_PROMPT as ENHANCEMENT_SYSTEM_PROMPT, enhancement_targets, find_section,
+                         make_enhancement_key, build_section_prompt, local_draft, enhance_sections,
+                         summarize_improvements)
+from heuristics import CONFIDENCE_THRESHOLD, detect_elements, build_local_analysis, merge_local_and_llm
+from batch import collect_inputs, run_batch
+from upload_store import UploadStore
+from knowledge_base import KnowledgeBase, SEARCH_MODES, local_embedder
+from near_duplicates import NearDuplicateIndex
+from share_store import ShareStore
+from export import EXPORT_FORMATS, export_sections, make_export_key, build_export
+from incremental import section_fingerprints, changed_elements, changed_text, merge_incremental
+from json_logging import configure_logging
+import metrics
+from profiling import RequestProfiler, to_collapsed, to_speedscope
 
 app = Flask(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# JSON log lines (LOG_FORMAT=text for local development)
+configure_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FORMAT', 'json'))
+logger = logging.getLogger('knowha')
+
 # Configure Flask with secure secret key
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-key-change-in-production')
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max file size
 app.config['ALLOWED_EXTENSIONS'] = {'pdf', 'docx'}
 
+# Uploads are stored once per content hash; unreferenced blobs are deleted after the grace period
+app.config['UPLOAD_BLOB_FOLDER'] = os.path.join('uploads', 'blobs')
+app.config['UPLOAD_INDEX_PATH'] = os.path.join('uploads', 'uploads.sqlite3')
+app.config['UPLOAD_ORPHAN_GRACE'] = 600  # seconds a queued analysis may still need a replaced upload
+app.config['UPLOAD_MAX_BYTES'] = int(os.getenv('UPLOAD_MAX_BYTES', 2 * 1024 ** 3))  # 2GB of stored uploads, 0 = no quota
+app.config['UPLOAD_SWEEP_INTERVAL'] = 300  # seconds between upload cleanup sweeps
+
 # Session configuration
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
-app.config['SESSION_TYPE'] = 'filesystem'
+app.config['SESSION_TYPE'] = os.getenv('SESSION_TYPE', 'filesystem')  # 'filesystem' or 'sqlite'
+app.config['SESSION_FILE_DIR'] = 'flask_session'
+app.config['SESSION_SQLITE_PATH'] = 'flask_session/sessions.sqlite3'
+app.config['SESSION_SWEEP_INTERVAL'] = 300  # seconds between expired-session sweeps
+
+# Keep session data on the server; the cookie only carries the session id
+app.session_interface = create_session_interface(app)
+
+# 'hybrid' checks elements locally and only asks the LLM about uncertain ones,
+# 'llm' sends every element to the LLM, 'offline' never calls the LLM
+app.config['ANALYSIS_MODE'] = os.getenv('ANALYSIS_MODE', 'hybrid')
+app.config['LOCAL_CONFIDENCE_THRESHOLD'] = CONFIDENCE_THRESHOLD
+
+# Extraction limits: stop reading a PDF after this many pages or characters
+app.config['PDF_MAX_PAGES'] = 1000
+app.config['EXTRACTION_MAX_CHARS'] = 2_000_000
+
+# Documents that do not fit one prompt are analysed in chunks, several at a
+# time; each chunk is sized to the room PROMPT_TOKEN_BUDGET leaves for it
+app.config['ANALYSIS_CHUNK_PARALLELISM'] = 4
+app.config['ANALYSIS_TOKEN_BUDGET'] = 60000  # max prompt tokens (instructions included) sent per chunked analysis
+# Input tokens per request (instructions plus packed document); large enough that the ~370 tokens of
+# instructions every chunk repeats stay a small share of each call
+app.config['PROMPT_TOKEN_BUDGET'] = int(os.getenv('PROMPT_TOKEN_BUDGET', 16000))
+app.config['REPAIR_TOKEN_BUDGET'] = 1100  # input tokens of a follow-up request for fields a response left out
+
+# Analysis cache configuration
+app.config['ANALYSIS_CACHE_PATH'] = 'cache/analysis.sqlite3'
+app.config['ANALYSIS_CACHE_MAX_ENTRIES'] = 5000
+app.config['ANALYSIS_CACHE_MAX_BYTES'] = 256 * 1024 * 1024  # 256MB
+app.config['ANALYSIS_CACHE_TTL'] = 7 * 24 * 3600  # 7 days
+
+# Enhancement rewrites PARTIAL and drafts MISSING sections, several at a time;
+# generated sections are cached per document, element and action
+app.config['ENHANCEMENT_PARALLELISM'] = 4
+app.config['ENHANCEMENT_PROMPT_BUDGET'] = 1500  # input tokens per section request
+app.config['ENHANCEMENT_MAX_TOKENS'] = 700  # output tokens per section
+app.config['ENHANCEMENT_CACHE_PATH'] = 'cache/enhancement.sqlite3'
+
+# Every analysed document is kept in a searchable knowledge base; vector
+# search additionally needs NumPy and can be turned off with KNOWLEDGE_BASE_VECTORS=0
+app.config['KNOWLEDGE_BASE_PATH'] = os.path.join('knowledge', 'knowledge.sqlite3')
+app.config['KNOWLEDGE_BASE_VECTORS'] = os.getenv('KNOWLEDGE_BASE_VECTORS', '1').lower() not in ('0', 'false', 'no')
+app.config['KNOWLEDGE_BASE_MAX_CHARS'] = 200_000  # characters of each document indexed
+app.config['SEARCH_MAX_RESULTS'] = 50
+
+# Uploads are compared with earlier ones by MinHash; a near-copy of an analysed
+# document of the same type reuses that analysis instead of calling the LLM
+app.config['NEAR_DUPLICATE_INDEX_PATH'] = os.path.join('knowledge', 'near_duplicates.sqlite3')
+app.config['NEAR_DUPLICATE_THRESHOLD'] = 0.8  # estimated Jaccard similarity flagged as a near-copy
+app.config['NEAR_DUPLICATE_REUSE'] = float(os.getenv('NEAR_DUPLICATE_REUSE', 0.9))  # similarity at which the analysis is reused, 1.1 = never
+
+# A re-upload is diffed by section against the session's previous analysis (or
+# an analysed near-copy); only elements whose sections changed are re-checked
+app.config['INCREMENTAL_ANALYSIS'] = os.getenv('INCREMENTAL_ANALYSIS', '1').lower() not in ('0', 'false', 'no')
+app.config['INCREMENTAL_MAX_CHANGED'] = 0.5  # share of changed elements above which the document is analysed afresh
+
+# Share links serve a page and JSON rendered once at share time, precompressed
+app.config['SHARE_FOLDER'] = 'shares'
+app.config['SHARE_INDEX_PATH'] = os.path.join('shares', 'shares.sqlite3')
+app.config['SHARE_TTL'] = int(os.getenv('SHARE_TTL', 24 * 3600))  # seconds a share link stays valid
+app.config['SHARE_SWEEP_INTERVAL'] = 300  # seconds between expired-share sweeps
+app.config['SHARE_MAX_AGE'] = 3600  # seconds browsers and proxies may cache a shared page
+
+# DOCX/PDF exports are built by their own workers and cached by content hash
+app.config['EXPORT_FOLDER'] = 'exports'
+app.config['EXPORT_WORKERS'] = int(os.getenv('EXPORT_WORKERS', 2))
+app.config['EXPORT_QUEUE_SIZE'] = 16  # exports allowed to wait for a free worker
+app.config['EXPORT_MAX_BYTES'] = 500 * 1024 * 1024  # cached exports kept; least recently used are deleted first
+
+# Model and prompt version; bump PROMPT_VERSION whenever the prompt changes
+# so that cached analyses produced by the old prompt are not reused
+OPENAI_MODEL = 'gpt-4o-mini'
+PROMPT_VERSION = '2'
+
+# Analysis backend: 'openai', 'gemini', or 'mock' (offline, deterministic, for load tests)
+app.config['ANALYSIS_BACKEND'] = os.getenv('ANALYSIS_BACKEND', 'openai')
+app.config['OPENAI_MODEL'] = os.getenv('OPENAI_MODEL', OPENAI_MODEL)
+app.config['GEMINI_MODEL'] = os.getenv('GEMINI_MODEL', 'gemini-pro')
+app.config['MOCK_LATENCY'] = float(os.getenv('MOCK_LATENCY', 0.2))  # seconds per mock call
+
+# OpenAI connection pool, concurrent requests per API key, and retries on 429/5xx
+app.config['LLM_MAX_CONNECTIONS'] = 20
+app.config['LLM_MAX_CONCURRENCY'] = 8
+app.config['LLM_MAX_RETRIES'] = 4
+
+# Opt-in request profiling; with PROFILING_ENABLED unset the hooks below do nothing
+app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+app.config['PROFILING_MODE'] = os.getenv('PROFILING_MODE', 'sample')  # 'sample' (stack sampling) or 'cprofile'
+app.config['PROFILING_SAMPLE_RATE'] = float(os.getenv('PROFILING_SAMPLE_RATE', 0))  # share of requests profiled without the header
+app.config['PROFILING_INTERVAL'] = 0.005  # seconds between stack samples
+app.config['PROFILING_TOKEN'] = os.getenv('PROFILING_TOKEN')  # required in X-Profile-Token; also guards POST /api/llm/reload
+app.config['PROFILING_FOLDER'] = 'profiles'
+app.config['PROFILING_MAX_PROFILES'] = 200
+
+# Background analysis workers
+app.config['ANALYSIS_WORKERS'] = int(os.getenv('ANALYSIS_WORKERS', 4))
+app.config['ANALYSIS_QUEUE_SIZE'] = 32  # jobs allowed to wait for a free worker
+# Job state and events are shared by all app processes through this SQLite file
+app.config['JOB_STORE_PATH'] = os.path.join('jobs', 'jobs.sqlite3')
+app.config['JOB_EVENTS_WINDOW'] = 25  # seconds an event stream stays open before the browser reconnects
+
+# Batch analysis: inputs and JSONL results live in BATCH_FOLDER/<batch_id>/
+app.config['BATCH_FOLDER'] = os.path.join('uploads', 'batches')
+app.config['BATCH_WORKERS'] = 4  # documents of one batch analysed at the same time
+app.config['BATCH_RETENTION'] = 7 * 24 * 3600  # seconds a finished batch's files are kept; they count towards UPLOAD_MAX_BYTES
+
+upload_store = UploadStore(
+    app.config['UPLOAD_BLOB_FOLDER'],
+    app.config['UPLOAD_INDEX_PATH'],
+    grace=app.config['UPLOAD_ORPHAN_GRACE'],
+    max_bytes=app.config['UPLOAD_MAX_BYTES'],
+    owner_alive=app.session_interface.session_exists,
+    owner_lifetime=app.config['PERMANENT_SESSION_LIFETIME'],
+    sweep_interval=app.config['UPLOAD_SWEEP_INTERVAL'],
+    legacy_directory=app.config['UPLOAD_FOLDER'],
+    batch_directory=app.config['BATCH_FOLDER'],
+    batch_retention=app.config['BATCH_RETENTION'],
+    batch_active=lambda batch_id: batch_running(batch_id)
+)
+analysis_cache = AnalysisCache(
+    app.config['ANALYSIS_CACHE_PATH'],
+    max_entries=app.config['ANALYSIS_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['ANALYSIS_CACHE_MAX_BYTES'],
+    ttl=app.config['ANALYSIS_CACHE_TTL']
+)
+enhancement_cache = AnalysisCache(
+    app.config['ENHANCEMENT_CACHE_PATH'],
+    max_entries=app.config['ANALYSIS_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['ANALYSIS_CACHE_MAX_BYTES'],
+    ttl=app.config['ANALYSIS_CACHE_TTL']
+)
+knowledge_base = KnowledgeBase(
+    app.config['KNOWLEDGE_BASE_PATH'],
+    embedder=local_embedder() if app.config['KNOWLEDGE_BASE_VECTORS'] else None,
+    max_chars=app.config['KNOWLEDGE_BASE_MAX_CHARS']
+)
+near_duplicates = NearDuplicateIndex(
+    app.config['NEAR_DUPLICATE_INDEX_PATH'],
+    threshold=app.config['NEAR_DUPLICATE_THRESHOLD']
+)
+share_store = ShareStore(
+    app.config['SHARE_FOLDER'],
+    app.config['SHARE_INDEX_PATH'],
+    ttl=app.config['SHARE_TTL'],
+    sweep_interval=app.config['SHARE_SWEEP_INTERVAL']
+)
+llm_clients = LLMClientManager(
+    max_connections=app.config['LLM_MAX_CONNECTIONS'],
+    max_concurrency=app.config['LLM_MAX_CONCURRENCY'],
+    max_retries=app.config['LLM_MAX_RETRIES']
+)
+analysis_backend = create_backend(app, llm_clients)
+job_store = JobStore(app.config['JOB_STORE_PATH'])
+job_queue = JobQueue(
+    max_workers=app.config['ANALYSIS_WORKERS'],
+    max_pending=app.config['ANALYSIS_QUEUE_SIZE'],
+    store=job_store
+)
+# Exports are CPU and disk work; a pool of their own keeps them from delaying analyses
+export_queue = JobQueue(
+    max_workers=app.config['EXPORT_WORKERS'],
+    max_pending=app.config['EXPORT_QUEUE_SIZE'],
+    store=job_store
+)
+profiler = RequestProfiler(
+    app.config['PROFILING_FOLDER'],
+    sample_rate=app.config['PROFILING_SAMPLE_RATE'],
+    mode=app.config['PROFILING_MODE'],
+    interval=app.config['PROFILING_INTERVAL'],
+    token=app.config['PROFILING_TOKEN'],
+    max_profiles=app.config['PROFILING_MAX_PROFILES']
+) if app.config['PROFILING_ENABLED'] else None
+
+@app.before_request
+def start_request_timer():
+    request.started_at = time.perf_counter()
+    request.profile = None
+    if profiler is not None and not request.path.startswith('/api/admin/profiles') and profiler.wants(request.headers):
+        request.profile = profiler.start('request', f"{request.method} {request.path}")
+
+@app.after_request
+def record_request_time(response):
+    started = getattr(request, 'started_at', None)
+    if started is not None:
+        # The route pattern, not the path, keeps job and batch ids out of the labels
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method, endpoint=endpoint, status=response.status_code
+        )
+    profile = getattr(request, 'profile', None)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profiler.stop(profile, status=response.status_code)
+    return response
+
+def profiled(fn):
+    """``fn`` as a job function that is profiled too when the current request is."""
+    return profiler.follow(fn) if profiler is not None else fn
+
+def attached(fn):
+    """``fn`` for a thread pool; its time counts towards the current job's profile, if any."""
+    return profiler.attach(fn) if profiler is not None else fn
 
 # Document types
 KNOWLEDGE_TYPES = {
@@ -107,35 +344,162 @@ def extract_text_from_pdf(file_path):
     """Extract text from a PDF file."""
     text = ""
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+        text = extract_pdf_text(
+            file_path,
+            max_pages=app.config['PDF_MAX_PAGES'],
+            max_chars=app.config['EXTRACTION_MAX_CHARS']
+        )
     except Exception as e:
-        print(f"Error extracting text from PDF: {str(e)}")
+        logger.warning('PDF text extraction failed', extra={'path': file_path, 'error': str(e)})
     return text
 
 def extract_text_from_docx(file_path):
     """Extract text from a DOCX file."""
     text = ""
     try:
-        doc = Document(file_path)
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
+        segments, _ = extract_docx_structure(file_path)
+        segments.append('')
+        text = '\n'.join(segments)
     except Exception as e:
-        print(f"Error extracting text from DOCX: {str(e)}")
+        logger.warning('DOCX text extraction failed', extra={'path': file_path, 'error': str(e)})
     return text
 
-def analyze_with_chatgpt(content, doc_type, doc_info):
-    """Analyze document content using ChatGPT API with element-based status."""
+def extract_document(file_path, artifact_dir=None):
+    """Extract a document and store the result as an artifact next to it (or in ``artifact_dir``)."""
+    segments = []
+    headings = None
+    unit = 'paragraph'
+    doc_format = file_path.rsplit('.', 1)[-1].lower()
+    started = time.perf_counter()
     try:
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            print("No API key found")
+        if file_path.endswith('.pdf'):
+            unit = 'page'
+            segments = extract_pdf_pages(
+                file_path,
+                max_pages=app.config['PDF_MAX_PAGES'],
+                max_chars=app.config['EXTRACTION_MAX_CHARS']
+            )
+        elif file_path.endswith('.docx'):
+            segments, headings = extract_docx_structure(file_path)
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                segments = f.read().split('\n')
+    except Exception as e:
+        logger.warning('Text extraction failed', extra={'path': file_path, 'error': str(e)})
+    metrics.EXTRACTION_SECONDS.observe(time.perf_counter() - started, format=doc_format)
+    return save_artifact(file_path, segments, unit, headings, artifact_dir)
+
+def load_document(file_path, artifact_dir=None):
+    """Return the extraction artifact for an upload, extracting only if it is missing."""
+    artifact = load_artifact(file_path, artifact_dir)
+    if artifact is None:
+        logger.info('No extraction artifact, extracting', extra={'path': file_path})
+        artifact = extract_document(file_path, artifact_dir)
+    return artifact
+
+def find_near_duplicates(artifact):
+    """Index an upload's MinHash signature and return its near-copies among earlier uploads."""
+    try:
+        signature = near_duplicates.signature(artifact['text'])
+        matches = near_duplicates.query(signature, exclude=artifact['content_hash'])
+        near_duplicates.add(artifact['content_hash'], signature)
+    except Exception as e:
+        logger.warning('Near-duplicate check failed', extra={'error': str(e)})
+        return []
+    found = []
+    for doc_id, similarity in matches:
+        entry = knowledge_base.get(doc_id)
+        found.append({'doc_id': doc_id, 'similarity': similarity, 'name': entry['name'] if entry else None})
+    if found:
+        metrics.NEAR_DUPLICATES.inc(result='flagged')
+        logger.info('Upload is a near-copy', extra={'similarity': found[0]['similarity'], 'matches': len(found)})
+    return found
+
+def reuse_near_duplicate(matches, doc_type):
+    """Return the analysis of the most similar analysed near-copy of the same type, or None.
+
+    With incremental analysis on, near-copies with section fingerprints are
+    diffed by section instead (see ``reanalyze_changes``).
+    """
+    for match in matches:
+        if match['similarity'] < app.config['NEAR_DUPLICATE_REUSE']:
+            break
+        entry = knowledge_base.get(match['doc_id'])
+        if not entry or entry['doc_type'] != doc_type:
+            continue
+        if not (app.config['INCREMENTAL_ANALYSIS'] and entry['analysis'].get('fingerprints')):
+            return {
+                **entry['analysis'],
+                'reused_from': {'doc_id': entry['doc_id'], 'name': entry['name'], 'similarity': match['similarity']}
+            }
+    return None
+
+def previous_versions(previous, near_copies, doc_type):
+    """Yield ``(analysis, source)`` for earlier versions an upload can be diffed against, closest first.
+
+    ``previous`` is the session's last analysis; the analysed near-copies of
+    the same type follow.  Only analyses with section fingerprints qualify.
+    """
+    if previous and previous.get('fingerprints') and not previous.get('fallback'):
+        yield previous, {'name': None, 'similarity': None}
+    for match in near_copies:
+        entry = knowledge_base.get(match['doc_id'])
+        if entry and entry['doc_type'] == doc_type and entry['analysis'].get('fingerprints'):
+            yield entry['analysis'], {'doc_id': entry['doc_id'], 'name': entry['name'], 'similarity': match['similarity']}
+
+def reanalyze_changes(job, content, doc_type, doc_info, outline, fingerprints, versions):
+    """Re-check only the elements whose sections changed since an earlier version.
+
+    Returns None when no earlier version is close enough (or the re-check
+    fails), in which case the document is analysed from scratch.
+    """
+    expected_elements = doc_info.get('elements', [])
+    for base, source in versions:
+        changed = changed_elements(base['fingerprints'], fingerprints)
+        if len(changed) <= app.config['INCREMENTAL_MAX_CHANGED'] * len(expected_elements):
+            break
+    else:
+        return None
+
+    update = {'elements': []}
+    if changed:
+        text, whole = changed_text(content, changed, outline)
+        logger.info('Re-analysing changed sections', extra={
+            'job_id': job.id, 'changed': changed, 'chars': len(text), 'whole_document': whole
+        })
+        job.publish('progress', {
+            'stage': 'analyzing',
+            'message': f"Re-checking {len(changed)} changed section{'s' if len(changed) != 1 else ''}..."
+        })
+        update = analyze_document_content(
+            text, doc_type, {**doc_info, 'elements': changed},
+            on_element=lambda element: job.publish('element', element),
+            on_progress=lambda message: job.publish('progress', {'stage': 'analyzing', 'message': message}),
+            outline=outline if whole else None
+        )
+        if update is None or update.get('fallback'):
+            logger.warning('Incremental re-analysis failed, analysing the whole document', extra={'job_id': job.id})
             return None
-            
-        client = OpenAI(api_key=api_key)
-        
+
+    carried = [e for e in base['elements'] if e['name'] in expected_elements and e['name'] not in changed]
+    for element in carried:
+        job.publish('element', element)
+    metrics.INCREMENTAL_ELEMENTS.inc(len(changed), result='reanalyzed')
+    metrics.INCREMENTAL_ELEMENTS.inc(len(carried), result='carried')
+
+    analysis = merge_incremental(base, update, expected_elements)
+    analysis['incremental'] = {**source, 'reanalyzed': changed, 'carried_forward': len(carried)}
+    return analysis
+
+def analyze_with_chatgpt(content, doc_type, doc_info, on_element=None, part=None, outline=None):
+    """Analyze document content with the configured backend, with element-based status.
+
+    When ``on_element`` is given the response is streamed and the callback is
+    invoked with each element dict as soon as the model has finished it.
+    ``part`` is an (index, total) tuple when ``content`` is one chunk of a
+    longer document; ``outline`` is the heading outline of a whole document.
+    """
+    try:
         # Get expected elements for this document type
         expected_elements = doc_info.get('elements', [
             'Executive Summary',
@@ -147,89 +511,156 @@ def analyze_with_chatgpt(content, doc_type, doc_info):
             'Recommendations',
             'Conclusion'
         ])
+
+        # Identical documents analysed with the same prompt give the same answer
+        prompt_version = f"{PROMPT_VERSION}:{app.config['PROMPT_TOKEN_BUDGET']}"
+        if part is not None:
+            prompt_version += f":part{part[0] + 1}/{part[1]}"
+        cache_key = make_cache_key(content, expected_elements, analysis_backend.cache_id, prompt_version)
+        cached = analysis_cache.get(cache_key)
+        metrics.ANALYSIS_CACHE.inc(result='miss' if cached is None else 'hit')
+        if cached is not None:
+            logger.info('Analysis cache hit', extra={'doc_type': doc_type, 'part': part})
+            if on_element:
+                for element in cached.get('elements', []):
+                    on_element(element)
+            return cached
+
+        if not analysis_backend.configured:
+            logger.error('Analysis backend is not configured', extra={'backend': analysis_backend.name})
+            return None
         
-        prompt = f"""
-        Analyze this {doc_info['title']} document and evaluate the following required elements.
-        For each element, determine its status: EXISTS (complete and well-documented), PARTIAL (present but needs improvement), or MISSING (completely absent).
+        # Static instructions come first and are cached per type; the document is packed into the token budget
+        with metrics.PROMPT_BUILD_SECONDS.time():
+            system, prompt = build_prompt(
+                doc_info, expected_elements, content,
+                budget=app.config['PROMPT_TOKEN_BUDGET'],
+                part=part,
+                outline=outline,
+                model=analysis_backend.model
+            )
+
+        logger.info('Requesting element analysis', extra={
+            'backend': analysis_backend.name, 'doc_type': doc_type, 'part': part, 'stream': bool(on_element)
+        })
+
+        if on_element:
+            # Hand each element over as soon as its JSON object is complete
+            parser = ElementStreamParser()
+            streamed = set()
+            names = {name.lower(): name for name in expected_elements}
+            for delta in analysis_backend.stream(system, prompt, max_tokens=1500, temperature=0.3):
+                for element in parser.feed(delta):
+                    # Streamed verdicts must already fit the schema; the rest is repaired below
+                    name = names.get(str(element['name']).strip().lower())
+                    status = normalize_status(element['status'])
+                    if name and status and element.get('description') and name not in streamed:
+                        streamed.add(name)
+                        on_element({**element, 'name': name, 'status': status})
+            result = parser.text
+        else:
+            result = analysis_backend.complete(system, prompt, max_tokens=1500, temperature=0.3).text
+        logger.info('Received analysis response', extra={'backend': analysis_backend.name, 'chars': len(result)})
+
+        # Recover what we can from fenced, truncated or loosely formatted JSON
+        with metrics.PARSE_SECONDS.time():
+            analysis_data, missing = validate_analysis(parse_analysis(result), expected_elements)
+        if missing:
+            logger.info('Response incomplete, requesting missing fields', extra={'missing': missing})
+            missing = repair_analysis(content, doc_info, analysis_data, missing)
+        if all('status' not in e for e in analysis_data['elements']):
+            logger.warning('Could not recover an analysis from the response', extra={'response': result[:500]})
+            return create_default_analysis(expected_elements)
+        if missing:
+            fill_missing_fields(analysis_data, missing)
+        if on_element:
+            for element in analysis_data['elements']:
+                if element['name'] not in streamed:
+                    on_element(element)
         
-        Required Elements to Check:
-        {chr(10).join([f"- {elem}" for elem in expected_elements])}
+        # Calculate summary stats
+        summary = {
+            'exists': sum(1 for e in analysis_data['elements'] if e['status'].upper() == 'EXISTS'),
+            'partial': sum(1 for e in analysis_data['elements'] if e['status'].upper() == 'PARTIAL'),
+            'missing': sum(1 for e in analysis_data['elements'] if e['status'].upper() == 'MISSING')
+        }
+        analysis_data['summary'] = summary
         
-        For each element, provide:
-        1. Status (EXISTS, PARTIAL, or MISSING)
-        2. Brief description of what you found (or what's missing)
-        3. Specific action needed to improve (if PARTIAL or MISSING)
+        # Guessed fields are not worth keeping; a later run may do better
+        if not analysis_data.get('incomplete'):
+            analysis_cache.set(cache_key, analysis_data)
+        return analysis_data
+            
+    except Exception:
+        logger.exception('Analysis request failed', extra={'backend': analysis_backend.name})
+        return None
+
+def repair_analysis(content, doc_info, analysis, missing):
+    """Ask the backend for only the fields the first response lacked.
+
+    Fills ``analysis`` in place and returns the fields that are still missing.
+    """
+    names = [name for name in missing if name]
+    top = missing.get('', [])
+    example = '{"elements": [{"name": "Element Name", "status": "EXISTS|PARTIAL|MISSING", "description": "...", "action": "..."}]'
+    if 'quality_score' in top:
+        example += ', "quality_score": 75'
+    if 'recommendations' in top:
+        example += ', "recommendations": ["Recommendation 1", "Recommendation 2"]'
+    example += '}'
+    # The repair prompt is short, so the excerpt gets most of its budget
+    excerpt = pack_document(content, app.config['REPAIR_TOKEN_BUDGET'] - 300, model=analysis_backend.model)
+
+    prompt = f"""
+        An earlier analysis of this {doc_info['title']} document came back incomplete.
+        Provide ONLY the missing information below, as JSON in this format:
+        {example}
         
-        Also provide:
-        - Overall quality score (0-100)
-        - 3-5 overall recommendations for the document
+        Required Elements to Check:
+        {chr(10).join([f"- {name}" for name in names]) or '- (none)'}
         
-        Format your response as JSON:
-        {{
-            "elements": [
-                {{
-                    "name": "Element Name",
-                    "status": "EXISTS|PARTIAL|MISSING",
-                    "description": "What was found or what's missing",
-                    "action": "What needs to be done (if applicable)"
-                }}
-            ],
-            "quality_score": 75,
-            "recommendations": ["Recommendation 1", "Recommendation 2"]
-        }}
+        Fields missing per element:
+        {chr(10).join([f"- {name}: {', '.join(missing[name])}" for name in names]) or '- (none)'}
+        {'Also missing: ' + ', '.join(top) if top else ''}
         
         Document Content:
-        {content[:4000]}
+        {excerpt}
         """
-
-        print("Sending request to OpenAI for element analysis...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a technical document analyst. Analyze documents by evaluating the presence and quality of required elements. Always respond with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.3,
-            timeout=30
+    try:
+        response = analysis_backend.complete(
+            "You are a technical document analyst. Always respond with valid JSON.",
+            prompt,
+            max_tokens=min(1500, 200 + 100 * len(names)),
+            temperature=0.3
         )
-        
-        result = response.choices[0].message.content
-        print(f"Received response: {len(result)} characters")
-        
-        # Parse JSON response
-        try:
-            # Extract JSON from markdown code blocks if present
-            if '```json' in result:
-                result = result.split('```json')[1].split('```')[0].strip()
-            elif '```' in result:
-                result = result.split('```')[1].split('```')[0].strip()
-            
-            analysis_data = json.loads(result)
-            
-            # Calculate summary stats
-            summary = {
-                'exists': sum(1 for e in analysis_data['elements'] if e['status'].upper() == 'EXISTS'),
-                'partial': sum(1 for e in analysis_data['elements'] if e['status'].upper() == 'PARTIAL'),
-                'missing': sum(1 for e in analysis_data['elements'] if e['status'].upper() == 'MISSING')
-            }
-            analysis_data['summary'] = summary
-            
-            return analysis_data
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Response content: {result}")
-            # Return default structure if JSON parsing fails
-            return create_default_analysis(expected_elements)
-            
+        return merge_repair(analysis, parse_analysis(response.text), missing)
     except Exception as e:
-        print(f"ChatGPT analysis error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return None
+        logger.warning('Repair request failed', extra={'error': str(e)})
+        return missing
+
+def fill_missing_fields(analysis, missing):
+    """Give fields that could not be recovered a neutral value and flag the analysis."""
+    for element in analysis['elements']:
+        fields = missing.get(element['name'], [])
+        if 'status' in fields:
+            element['status'] = 'PARTIAL'
+        if 'description' in fields:
+            element['description'] = 'This element could not be assessed automatically; please review it.'
+        if 'action' in fields:
+            element['action'] = '' if element['status'] == 'EXISTS' else f"Review the {element['name']} section."
+    top = missing.get('', [])
+    if 'quality_score' in top:
+        statuses = [e['status'] for e in analysis['elements']]
+        credit = sum(1 if s == 'EXISTS' else 0.5 if s == 'PARTIAL' else 0 for s in statuses)
+        analysis['quality_score'] = round(100 * credit / (len(statuses) or 1))
+    if 'recommendations' in top:
+        actions = [e['action'] for e in analysis['elements'] if e.get('action')]
+        analysis['recommendations'] = actions[:5] or ['Review the document against the template']
+    analysis['incomplete'] = True
 
 def create_default_analysis(expected_elements):
     """Create a default analysis structure when API fails."""
+    metrics.DEFAULT_ANALYSES.inc()
     return {
         "elements": [
             {
@@ -240,6 +671,7 @@ def create_default_analysis(expected_elements):
             }
             for elem in expected_elements[:5]
         ],
+        "fallback": True,
         "quality_score": 50,
         "recommendations": [
             "Ensure all required sections are present",
@@ -253,6 +685,84 @@ def create_default_analysis(expected_elements):
         }
     }
 
+def analyze_document_content(content, doc_type, doc_info, on_element=None, on_progress=None, outline=None):
+    """Analyze a document, checking elements locally first and asking the LLM about the rest.
+
+    ``outline`` is the heading outline stored with the extraction artifact.
+    """
+    expected_elements = doc_info.get('elements', [])
+    mode = app.config['ANALYSIS_MODE']
+    if mode == 'llm':
+        return analyze_with_llm(content, doc_type, doc_info, on_element, on_progress, outline)
+
+    detections = detect_elements(content, expected_elements, outline)
+    if mode == 'offline':
+        analysis = build_local_analysis(detections)
+        if on_element:
+            for element in analysis['elements']:
+                on_element(element)
+        return analysis
+
+    # Confident local verdicts are shown straight away and never sent to the LLM
+    local = [d for d in detections if d['confidence'] >= app.config['LOCAL_CONFIDENCE_THRESHOLD']]
+    if on_element:
+        for element in local:
+            on_element(element)
+    decided = {d['name'] for d in local}
+    remaining = [name for name in expected_elements if name not in decided]
+    logger.info('Local detector decided elements', extra={'decided': len(local), 'elements': len(expected_elements)})
+    if not remaining:
+        return build_local_analysis(detections)
+
+    analysis = analyze_with_llm(
+        content, doc_type, {**doc_info, 'elements': remaining}, on_element, on_progress, outline
+    )
+    if analysis is None or not local:
+        return analysis
+    return merge_local_and_llm(local, analysis, expected_elements)
+
+def analyze_with_llm(content, doc_type, doc_info, on_element=None, on_progress=None, outline=None):
+    """Analyze with the LLM, using chunked map-reduce when the document is too long for one prompt."""
+    budget = app.config['PROMPT_TOKEN_BUDGET']
+    model = analysis_backend.model
+    elements = doc_info.get('elements', [])
+    available = document_budget(doc_info, elements, budget, model=model)
+    # Counting a long document is wasted work when it clearly cannot fit
+    if len(content) < 16 * available and count_tokens(content, model) <= available:
+        return analyze_with_chatgpt(content, doc_type, doc_info, on_element=on_element, outline=outline)
+
+    # Every chunk fits its part prompt whole, so the prompt builder never cuts it;
+    # part (999 of 999) sizes the part note for any number of chunks
+    chunk_tokens = document_budget(doc_info, elements, budget, part=(998, 999), model=model)
+    chunks = split_into_chunks(content, chunk_tokens, outline=outline, model=model)
+    # The budget covers whole prompts: each call repeats the instructions, so long documents get fewer, fuller calls
+    chunks = apply_token_budget(
+        chunks, app.config['ANALYSIS_TOKEN_BUDGET'],
+        overhead=budget - chunk_tokens, max_tokens=chunk_tokens, model=model
+    )
+    logger.info('Analyzing long document in chunks', extra={'chunks': len(chunks)})
+
+    def analyze_chunk(chunk, index, total):
+        return analyze_with_chatgpt(chunk, doc_type, doc_info, part=(index, total))
+
+    def chunk_done(finished, total):
+        if on_progress:
+            on_progress(f"Analyzed section {finished} of {total}...")
+
+    expected_elements = doc_info.get('elements', [])
+    analysis = analyze_in_chunks(
+        chunks, attached(analyze_chunk), expected_elements,
+        max_workers=app.config['ANALYSIS_CHUNK_PARALLELISM'],
+        on_chunk_done=chunk_done
+    )
+    if analysis is None:
+        return create_default_analysis(expected_elements)
+
+    if on_element:
+        for element in analysis['elements']:
+            on_element(element)
+    return analysis
+
 def parse_analysis_response(analysis):
     """Legacy function - now analysis is returned as structured JSON."""
     # This function is kept for backward compatibility but is no longer used
@@ -394,30 +904,28 @@ def upload_document():
         return jsonify({'success': False, 'error': 'Invalid file type. Please upload a PDF or DOCX file'})
 
     try:
-        # Create upload folder if it doesn't exist
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        # Save the file
+        # Stream to the content-addressed store; identical files are kept once
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        # Extract text content
-        extracted_text = ''
-        if file_path.endswith('.pdf'):
-            extracted_text = extract_text_from_pdf(file_path)
-        else:
-            extracted_text = extract_text_from_docx(file_path)
-        
+        extension = filename.rsplit('.', 1)[1].lower()
+        stored = upload_store.add(session.sid, file.stream, extension, name=filename)
+        file_path = stored.path
+
+        # Extract text content once; a deduplicated upload already has its artifact
+        artifact = None if stored.created else load_artifact(file_path)
+        if artifact is None:
+            artifact = extract_document(file_path)
+        extracted_text = artifact['text']
+
         # Store file info in session
         session['file_path'] = file_path
-        session['file_content'] = extracted_text
         session['file_info'] = {
             'name': filename,
-            'size': os.path.getsize(file_path),
-            'type': filename.rsplit('.', 1)[1].lower(),
+            'size': stored.size,
+            'type': extension,
             'uploaded_at': datetime.now().isoformat(),
-            'source': 'upload'
+            'source': 'upload',
+            'content_hash': artifact['content_hash'],
+            'near_duplicates': find_near_duplicates(artifact)
         }
         
         return jsonify({
@@ -444,26 +952,25 @@ def save_editor_content():
         if not text or len(text.strip()) < 50:
             return jsonify({'success': False, 'error': 'Content is too short. Please write at least 50 characters.'})
         
-        # Create uploads folder if it doesn't exist
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        # Save content as a temporary file
+        # Editor text goes through the upload store like any other document
         filename = f"editor_content_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(text)
-        
+        stored = upload_store.add(session.sid, io.BytesIO(text.encode('utf-8')), 'txt', name=filename)
+        file_path = stored.path
+        artifact = None if stored.created else load_artifact(file_path)
+        if artifact is None:
+            artifact = extract_document(file_path)
+
         # Store file info in session
         session['file_path'] = file_path
-        session['file_content'] = text
         session['file_info'] = {
             'name': filename,
-            'size': len(text.encode('utf-8')),
+            'size': stored.size,
             'type': 'editor',
             'uploaded_at': datetime.now().isoformat(),
             'source': 'editor',
-            'word_count': len(text.split())
+            'word_count': len(text.split()),
+            'content_hash': artifact['content_hash'],
+            'near_duplicates': find_near_duplicates(artifact)
         }
         
         return jsonify({
@@ -473,131 +980,893 @@ def save_editor_content():
         })
 
     except Exception as e:
-        print(f"Error saving editor content: {str(e)}")
+        logger.exception('Saving editor content failed')
+        return jsonify({'success': False, 'error': str(e)})
+
+def run_analysis_job(job, file_path, doc_type, name=None, near_copies=(), previous=None):
+    """Analyze a document on the job queue.
+
+    ``previous`` (the session's last analysis) and ``near_copies`` (the
+    near-duplicates found at upload time) are earlier versions of the
+    document: only the elements whose sections changed since one of them are
+    re-checked, and a close enough near-copy without section fingerprints
+    has its analysis reused as a whole.
+    """
+    doc_info = KNOWLEDGE_TYPES[doc_type]
+
+    # Text was extracted at upload time; this only reads the stored artifact
+    job.publish('progress', {'stage': 'loading', 'message': 'Loading document content...'})
+    artifact = load_document(file_path)
+    content = artifact['text']
+
+    if not content or len(content.strip()) < 50:
+        raise ValueError('Could not extract sufficient content from the document')
+
+    outline = artifact.get('sections')
+    fingerprints = section_fingerprints(content, doc_info.get('elements', []), outline)
+    started = time.perf_counter()
+    analysis = None
+    if app.config['INCREMENTAL_ANALYSIS']:
+        analysis = reanalyze_changes(
+            job, content, doc_type, doc_info, outline, fingerprints,
+            previous_versions(previous, near_copies, doc_type)
+        )
+    if analysis is None:
+        analysis = reuse_near_duplicate(near_copies, doc_type)
+        if analysis is not None:
+            metrics.NEAR_DUPLICATES.inc(result='reused')
+            # 'name' is a reserved LogRecord attribute, so the reused document's fields are renamed
+            logger.info('Reusing the analysis of a near-copy', extra={
+                'job_id': job.id,
+                'reused_doc_id': analysis['reused_from']['doc_id'],
+                'similarity': analysis['reused_from']['similarity']
+            })
+            for element in analysis['elements']:
+                job.publish('element', element)
+    if analysis is None:
+        logger.info('Analysis started', extra={'job_id': job.id, 'doc_type': doc_type, 'chars': len(content)})
+        job.publish('progress', {'stage': 'analyzing', 'message': 'Analyzing your document with ChatGPT...'})
+        analysis = analyze_document_content(
+            content, doc_type, doc_info,
+            on_element=lambda element: job.publish('element', element),
+            on_progress=lambda message: job.publish('progress', {'stage': 'analyzing', 'message': message}),
+            outline=outline
+        )
+
+        if analysis is None:
+            raise RuntimeError('ChatGPT analysis failed. Please check your API key and try again.')
+
+    seconds = time.perf_counter() - started
+    metrics.ANALYSIS_SECONDS.observe(seconds, mode=app.config['ANALYSIS_MODE'])
+    logger.info('Analysis finished', extra={
+        'job_id': job.id, 'seconds': round(seconds, 3), 'incremental': 'incremental' in analysis
+    })
+
+    # Analysis is now returned as a structured dictionary
+    # Add timestamp and the section fingerprints the next version is diffed against
+    analysis['analyzed_at'] = datetime.now().isoformat()
+    analysis['fingerprints'] = fingerprints
+
+    # Fallback analyses say nothing about the document; keep the last real one
+    if not analysis.get('fallback'):
+        try:
+            knowledge_base.add(artifact['content_hash'], content, name or os.path.basename(file_path), doc_type, analysis)
+        except Exception as e:
+            logger.warning('Indexing the document failed', extra={'job_id': job.id, 'error': str(e)})
+    return analysis
+
+def analyze_batch_file(file_path, doc_type, artifact_dir=None):
+    """Extract (or reuse the artifact of) one batch document and analyze it.
+
+    ``artifact_dir`` keeps the artifact out of folders the app does not own.
+    """
+    artifact = load_document(file_path, artifact_dir)
+    content = artifact['text']
+    if not content or len(content.strip()) < 50:
+        raise ValueError('Could not extract sufficient content from the document')
+
+    analysis = analyze_document_content(
+        content, doc_type, KNOWLEDGE_TYPES[doc_type], outline=artifact.get('sections')
+    )
+    if analysis is None:
+        raise RuntimeError('ChatGPT analysis failed')
+    analysis['analyzed_at'] = datetime.now().isoformat()
+    return analysis
+
+def batch_dir(batch_id):
+    return os.path.join(app.config['BATCH_FOLDER'], batch_id)
+
+def load_batch(batch_id):
+    """Return the stored batch description, or None for unknown ids."""
+    if not re.fullmatch(r'[0-9a-f]{32}', batch_id):
+        return None
+    try:
+        with open(os.path.join(batch_dir(batch_id), 'batch.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_batch(batch):
+    with open(os.path.join(batch_dir(batch['batch_id']), 'batch.json'), 'w', encoding='utf-8') as f:
+        json.dump(batch, f)
+
+def batch_running(batch_id):
+    """True while a batch's job is queued or running; its files must not be swept."""
+    batch = load_batch(batch_id)
+    job = job_queue.get(batch.get('job_id')) if batch else None
+    return job is not None and not job.finished
+
+def run_batch_job(job, batch_id, resume=False):
+    """Analyze every document of a batch on the job queue."""
+    batch = load_batch(batch_id)
+    directory = batch_dir(batch_id)
+    inputs = os.path.join(directory, 'inputs')
+    documents = collect_inputs(
+        [os.path.join(inputs, name) for name in sorted(os.listdir(inputs))
+         if allowed_file(name) or name.endswith('.zip')],
+        os.path.join(directory, 'unpacked')
+    )
+    job.publish('progress', {'stage': 'analyzing', 'total': len(documents)})
+
+    def on_result(record, stats):
+        job.publish('result', {'file': os.path.basename(record['file']), 'status': record['status'], **stats})
+
+    stats = run_batch(
+        documents,
+        attached(lambda path: analyze_batch_file(path, batch['doc_type'])),
+        os.path.join(directory, 'results.jsonl'),
+        max_workers=app.config['BATCH_WORKERS'],
+        resume=resume,
+        on_result=on_result
+    )
+    logger.info('Batch finished', extra={'batch_id': batch_id, 'stats': stats})
+    return stats
+
+def submit_batch_job(batch, resume=False):
+    job = job_queue.submit('batch', profiled(run_batch_job), batch['batch_id'], resume=resume)
+    batch['job_id'] = job.id
+    save_batch(batch)
+    return jsonify({
+        'success': True,
+        'batch_id': batch['batch_id'],
+        'job_id': job.id,
+        'status_url': url_for('batch_status', batch_id=batch['batch_id']),
+        'events_url': url_for('batch_events', batch_id=batch['batch_id']),
+        'results_url': url_for('batch_results', batch_id=batch['batch_id'])
+    }), 202
+
+@app.route('/api/batch', methods=['POST'])
+def create_batch():
+    """Queue analysis of several uploaded documents or zip archives."""
+    doc_type = request.form.get('doc_type')
+    if doc_type not in KNOWLEDGE_TYPES:
+        return jsonify({'success': False, 'error': 'Invalid document type'})
+
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files:
+        return jsonify({'success': False, 'error': 'No files provided'})
+    for file in files:
+        if not (allowed_file(file.filename) or file.filename.lower().endswith('.zip')):
+            return jsonify({'success': False, 'error': f'Invalid file type: {file.filename}'})
+
+    offline = app.config['ANALYSIS_MODE'] == 'offline'
+    if not offline and not analysis_backend.configured:
+        return jsonify({'success': False, 'error': analysis_backend.missing_config_message})
+
+    try:
+        batch_id = uuid.uuid4().hex
+        inputs = os.path.join(batch_dir(batch_id), 'inputs')
+        os.makedirs(inputs)
+        for index, file in enumerate(files):
+            # Prefix keeps same-named files from different folders apart
+            file.save(os.path.join(inputs, f"{index:04d}_{secure_filename(file.filename)}"))
+
+        batch = {
+            'batch_id': batch_id,
+            'doc_type': doc_type,
+            'created_at': datetime.now().isoformat(),
+            'uploads': len(files)
+        }
+        return submit_batch_job(batch)
+
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/batch/<batch_id>/resume', methods=['POST'])
+def resume_batch(batch_id):
+    """Re-run a batch, skipping documents that already have a result."""
+    batch = load_batch(batch_id)
+    if batch is None:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    job = job_queue.get(batch.get('job_id'))
+    if job is not None and not job.finished:
+        return jsonify({'success': False, 'error': 'Batch is still running'}), 409
+    try:
+        return submit_batch_job(batch, resume=True)
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+@app.route('/api/batch/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    """Report batch progress and throughput."""
+    batch = load_batch(batch_id)
+    if batch is None:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+
+    response = {'success': True, **batch}
+    job = job_queue.get(batch.get('job_id'))
+    if job is not None:
+        response.update(status=job.status, finished_at=job.finished_at)
+        if job.error:
+            response['error'] = job.error
+        results = [data for event, data in job.events if event == 'result']
+        if job.status == 'done':
+            response['stats'] = job.result
+        elif results:
+            response['stats'] = {k: v for k, v in results[-1].items() if k not in ('file', 'status')}
+    else:
+        # The job has expired from memory; the results file is still there
+        response['status'] = 'unknown'
+    return jsonify(response)
+
+@app.route('/api/batch/<batch_id>/events', methods=['GET'])
+def batch_events(batch_id):
+    """Stream per-document batch results as Server-Sent Events."""
+    batch = load_batch(batch_id)
+    job = job_queue.get(batch.get('job_id')) if batch else None
+    if job is None:
+        return jsonify({'success': False, 'error': 'Batch job not found'}), 404
+
+    return job_events_response(job)
+
+@app.route('/api/batch/<batch_id>/results', methods=['GET'])
+def batch_results(batch_id):
+    """Download the JSONL results written so far."""
+    if load_batch(batch_id) is None:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    results = os.path.join(batch_dir(batch_id), 'results.jsonl')
+    if not os.path.exists(results):
+        return jsonify({'success': False, 'error': 'No results yet'}), 404
+    return send_file(os.path.abspath(results), mimetype='application/x-ndjson',
+                     as_attachment=True, download_name=f'batch_{batch_id}.jsonl')
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_document():
-    """Analyze the uploaded document using ChatGPT API."""
+    """Queue analysis of the uploaded document and return the job id."""
     if 'file_path' not in session:
         return jsonify({'success': False, 'error': 'No file uploaded'})
+    if not os.path.exists(session['file_path']):
+        return jsonify({'success': False, 'error': 'The uploaded document has expired. Please upload it again.'})
+    upload_store.touch(session['file_path'])
 
     try:
-        # Load environment variables (force reload)
-        load_dotenv(override=True)
-        api_key = os.getenv('OPENAI_API_KEY')
-        print(f"API Key loaded: {'Yes' if api_key else 'No'}")
-        print(f"API Key length: {len(api_key) if api_key else 0}")
-        print(f"API Key starts with: {api_key[:10] if api_key else 'None'}...")
-        
-        if not api_key or api_key == 'your-openai-api-key-here':
-            return jsonify({'success': False, 'error': 'OpenAI API key not configured. Please set OPENAI_API_KEY in .env file'})
-        
-        print("Starting ChatGPT analysis...")
-        
-        # Get document info
-        file_path = session['file_path']
-        doc_type = session['doc_type']
-        doc_info = KNOWLEDGE_TYPES[doc_type]
-        
-        # Extract text content
-        print("Extracting document content...")
-        content = ''
-        file_info = session.get('file_info', {})
-        
-        if file_info.get('source') == 'editor':
-            # Content from rich text editor
-            content = session.get('file_content', '')
-            if not content:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-        elif file_path.endswith('.pdf'):
-            content = extract_text_from_pdf(file_path)
-        else:
-            content = extract_text_from_docx(file_path)
-        
-        if not content or len(content.strip()) < 50:
-            return jsonify({'success': False, 'error': 'Could not extract sufficient content from the document'})
-        
-        print(f"Extracted {len(content)} characters from document")
+        # Configuration is loaded once; POST /api/llm/reload picks up .env changes
+        offline = app.config['ANALYSIS_MODE'] == 'offline'
+        if not offline and not analysis_backend.configured:
+            return jsonify({'success': False, 'error': analysis_backend.missing_config_message})
         
-        # Analyze with ChatGPT
-        print("Calling ChatGPT API...")
-        analysis = analyze_with_chatgpt(content, doc_type, doc_info)
-        
-        if analysis is None:
-            return jsonify({'success': False, 'error': 'ChatGPT analysis failed. Please check your API key and try again.'})
-        
-        print("Analysis completed successfully")
-        
-        # Analysis is now returned as a structured dictionary
-        # Add timestamp
-        analysis['analyzed_at'] = datetime.now().isoformat()
-        
-        # Store in session and return
-        session['analysis'] = analysis
+        job = job_queue.submit(
+            'analysis',
+            profiled(run_analysis_job),
+            session['file_path'],
+            session['doc_type'],
+            session.get('file_info', {}).get('name'),
+            session.get('file_info', {}).get('near_duplicates', []),
+            session.get('analysis')
+        )
+
+        # Only the session that started a job may read its result
+        session['analysis_job_id'] = job.id
         return jsonify({
             'success': True,
-            'next_step': 4,
-            'analysis': analysis
-        })
-        
+            'job_id': job.id,
+            'status_url': url_for('analysis_status', job_id=job.id),
+            'events_url': url_for('analysis_events', job_id=job.id)
+        }), 202
+
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
-        print(f"Analysis failed: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Queueing analysis failed')
         return jsonify({
             'success': False,
             'error': f'Analysis failed: {str(e)}'
         })
 
+def job_events_response(job):
+    """A job's events as a Server-Sent Events stream, resuming after the client's Last-Event-ID."""
+    last = request.headers.get('Last-Event-ID', '')
+    since = int(last) + 1 if last.isdigit() else 0
+    if job.finished and not job.wait_for_events(since, timeout=0):
+        # Nothing left to send; 204 stops the browser from reconnecting
+        return Response(status=204)
+    return Response(sse_stream(job, since=since, window=app.config['JOB_EVENTS_WINDOW']),
+                    mimetype='text/event-stream', headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+def get_session_job(job_id, key='analysis_job_id', jobs=None):
+    """Return the job if it belongs to the current session, else None."""
+    if session.get(key) != job_id:
+        return None
+    return (jobs or job_queue).get(job_id)
+
+@app.route('/api/analyze/<job_id>', methods=['GET'])
+def analysis_status(job_id):
+    """Report the status of an analysis job; stores the result once done."""
+    job = get_session_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Analysis job not found'}), 404
+
+    response = {'success': True, **job.to_dict()}
+    if job.status == 'done':
+        session['analysis'] = job.result
+        response['analysis'] = job.result
+        response['next_step'] = 4
+    elif job.status == 'failed':
+        response['success'] = False
+    return jsonify(response)
+
+@app.route('/api/analyze/<job_id>/events', methods=['GET'])
+def analysis_events(job_id):
+    """Stream analysis progress as Server-Sent Events."""
+    job = get_session_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Analysis job not found'}), 404
+
+    return job_events_response(job)
+
+@app.route('/api/search', methods=['GET'])
+def search_knowledge_base():
+    """Search every analysed document: ``q``, optional ``type``, ``mode`` (text, vector, hybrid) and ``limit``."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'Missing search query'}), 400
+    mode = request.args.get('mode', 'text')
+    if mode not in SEARCH_MODES:
+        return jsonify({'success': False, 'error': f"Unknown search mode: {mode}"}), 400
+    doc_type = request.args.get('type') or None
+    if doc_type and doc_type not in KNOWLEDGE_TYPES:
+        return jsonify({'success': False, 'error': 'Invalid document type'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), app.config['SEARCH_MAX_RESULTS']))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+
+    started = time.perf_counter()
+    try:
+        results = knowledge_base.search(query, limit=limit, doc_type=doc_type, mode=mode)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    seconds = time.perf_counter() - started
+    metrics.SEARCH_SECONDS.observe(seconds, mode=mode)
+    return jsonify({
+        'success': True,
+        'query': query,
+        'mode': mode,
+        'results': results,
+        'took_ms': round(1000 * seconds, 3)
+    })
+
+@app.route('/api/knowledge/stats', methods=['GET'])
+def knowledge_stats():
+    """Report knowledge base size, which indexes are available and near-duplicate counters."""
+    return jsonify({
+        'success': True,
+        'knowledge_base': knowledge_base.stats(),
+        'near_duplicates': near_duplicates.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage latency histograms and counters in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def profiling_unavailable():
+    if profiler is None:
+        return jsonify({'success': False, 'error': 'Profiling is disabled; set PROFILING_ENABLED=1'}), 404
+    if not app.config['PROFILING_TOKEN']:
+        return jsonify({'success': False, 'error': 'Profiles are not readable; set PROFILING_TOKEN'}), 403
+    if not profiler.authorized(request.headers):
+        return jsonify({'success': False, 'error': 'Invalid profiling token'}), 403
+    return None
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List stored request and job profiles, newest first."""
+    error = profiling_unavailable()
+    if error:
+        return error
+    return jsonify({'success': True, 'profiles': profiler.list()})
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def export_profile(profile_id):
+    """Export a profile as ``?format=speedscope`` (default), ``collapsed`` or ``pstats``."""
+    error = profiling_unavailable()
+    if error:
+        return error
+    record = profiler.load(profile_id)
+    if record is None:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+
+    fmt = request.args.get('format', 'speedscope' if record['mode'] == 'sample' else 'pstats')
+    if fmt == 'pstats' and record['mode'] == 'cprofile':
+        return Response(record['pstats'], mimetype='text/plain')
+    if record['mode'] != 'sample' or fmt not in ('speedscope', 'collapsed'):
+        return jsonify({'success': False, 'error': f"Format {fmt} is not available for {record['mode']} profiles"}), 400
+    if fmt == 'collapsed':
+        return Response(to_collapsed(record), mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename={profile_id}.collapsed.txt'
+        })
+    return Response(json.dumps(to_speedscope(record)), mimetype='application/json', headers={
+        'Content-Disposition': f'attachment; filename={profile_id}.speedscope.json'
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report analysis and enhancement cache hit/miss counters."""
+    return jsonify({'success': True, 'cache': analysis_cache.stats(), 'enhancement_cache': enhancement_cache.stats()})
+
+@app.route('/api/uploads/stats', methods=['GET'])
+def upload_stats():
+    """Report upload dedup, retention and eviction counters and disk usage."""
+    return jsonify({'success': True, 'uploads': upload_store.stats()})
+
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    """Report backend latency/token counters and OpenAI retry and concurrency-wait counters."""
+    return jsonify({'success': True, 'backend': analysis_backend.stats(), 'llm': llm_clients.stats()})
+
+def admin_unauthorized():
+    """An error response unless the request carries the configured admin (profiling) token."""
+    token = app.config['PROFILING_TOKEN']
+    if not token:
+        return jsonify({'success': False, 'error': 'Admin routes are disabled; set PROFILING_TOKEN'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Profile-Token', ''), token):
+        return jsonify({'success': False, 'error': 'Invalid admin token'}), 403
+    return None
+
+@app.route('/api/llm/reload', methods=['POST'])
+def llm_reload():
+    """Re-read .env so a new API key takes effect without a restart."""
+    error = admin_unauthorized()
+    if error:
+        return error
+    llm_clients.reload()
+    return jsonify({'success': True, 'configured': analysis_backend.configured})
+
+def run_enhancement_job(job, file_path, doc_type, analysis):
+    """Rewrite or draft the sections the analysis marked PARTIAL or MISSING."""
+    doc_info = KNOWLEDGE_TYPES[doc_type]
+    job.publish('progress', {'stage': 'loading', 'message': 'Loading document content...'})
+    artifact = load_document(file_path)
+    content = artifact['text']
+    outline = artifact.get('sections')
+    offline = app.config['ANALYSIS_MODE'] == 'offline'
+    budget = app.config['ENHANCEMENT_PROMPT_BUDGET']
+    model = analysis_backend.model
+
+    targets = enhancement_targets(analysis)
+    current = {}
+    for target in targets:
+        section = find_section(content, target['name'], outline) if target['kind'] == 'rewrite' else None
+        if section is None:
+            # Mentioned without a section of its own: draft one like a missing element
+            target['kind'] = 'generate'
+        else:
+            current[target['name']] = section
+    # Every prompt gets the same background excerpt, so it is packed once
+    context = '' if offline or not targets else pack_document(content, budget, outline, model)
+
+    def enhance_target(target):
+        if offline:
+            return {**target, 'text': local_draft(target), 'source': 'local'}
+        key = make_enhancement_key(
+            artifact['content_hash'], target, f"{analysis_backend.cache_id}:{budget}"
+        )
+        cached = enhancement_cache.get(key)
+        metrics.ENHANCEMENT_CACHE.inc(result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return {**target, 'text': cached['text'], 'cached': True}
+
+        prompt = build_section_prompt(doc_info, target, current.get(target['name']), context, budget, model)
+        text = analysis_backend.complete(
+            ENHANCEMENT_SYSTEM_PROMPT, prompt,
+            max_tokens=app.config['ENHANCEMENT_MAX_TOKENS'],
+            temperature=0.4
+        ).text.strip()
+        if not text:
+            raise ValueError('Empty response from the analysis backend')
+        enhancement_cache.set(key, {'text': text})
+        return {**target, 'text': text, 'cached': False}
+
+    def section_done(section, finished, total):
+        job.publish('section', section)
+        job.publish('progress', {'stage': 'enhancing', 'message': f"Enhanced section {finished} of {total}..."})
+
+    logger.info('Enhancement started', extra={'job_id': job.id, 'doc_type': doc_type, 'sections': len(targets)})
+    started = time.perf_counter()
+    job.publish('progress', {'stage': 'enhancing', 'message': f"Enhancing {len(targets)} sections..."})
+    sections = enhance_sections(
+        targets, attached(enhance_target),
+        max_workers=app.config['ENHANCEMENT_PARALLELISM'],
+        on_section=section_done
+    )
+    if targets and all(section.get('error') for section in sections):
+        raise RuntimeError('Enhancement failed. Please check your API key and try again.')
+
+    seconds = time.perf_counter() - started
+    metrics.ENHANCEMENT_SECONDS.observe(seconds)
+    logger.info('Enhancement finished', extra={'job_id': job.id, 'seconds': round(seconds, 3)})
+
+    return {
+        'sections': sections,
+        'improvements': summarize_improvements(sections) or ['All expected sections are already present'],
+        'content_hash': artifact['content_hash'],
+        'enhanced_at': datetime.now().isoformat()
+    }
+
 @app.route('/api/enhance', methods=['POST'])
 def enhance_document():
+    """Queue enhancement of the analysed document and return the job id."""
     if 'analysis' not in session:
         return jsonify({'success': False, 'error': 'Document not analyzed'})
+    if not os.path.exists(session['file_path']):
+        return jsonify({'success': False, 'error': 'The uploaded document has expired. Please upload it again.'})
+    upload_store.touch(session['file_path'])
 
     try:
-        enhanced_content = {
-            'original_text': session.get('file_content', ''),
-            'improvements': [
-                'Added executive summary',
-                'Enhanced technical specifications',
-                'Included reference standards',
-                'Added data visualizations'
-            ],
-            'enhanced_at': datetime.now().isoformat()
-        }
+        offline = app.config['ANALYSIS_MODE'] == 'offline'
+        if not offline and not analysis_backend.configured:
+            return jsonify({'success': False, 'error': analysis_backend.missing_config_message})
+
+        job = job_queue.submit(
+            'enhancement',
+            profiled(run_enhancement_job),
+            session['file_path'],
+            session['doc_type'],
+            session['analysis']
+        )
 
-        session['enhanced_content'] = enhanced_content
+        session['enhancement_job_id'] = job.id
         return jsonify({
             'success': True,
-            'next_step': 5,
-            'enhanced_content': enhanced_content
-        })
+            'job_id': job.id,
+            'status_url': url_for('enhancement_status', job_id=job.id),
+            'events_url': url_for('enhancement_events', job_id=job.id)
+        }), 202
 
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
+        logger.exception('Queueing enhancement failed')
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/enhance/<job_id>', methods=['GET'])
+def enhancement_status(job_id):
+    """Report the status of an enhancement job; stores the result once done."""
+    job = get_session_job(job_id, 'enhancement_job_id')
+    if job is None:
+        return jsonify({'success': False, 'error': 'Enhancement job not found'}), 404
+
+    response = {'success': True, **job.to_dict()}
+    if job.status == 'done':
+        session['enhanced_content'] = job.result
+        response['enhanced_content'] = job.result
+        response['next_step'] = 5
+    elif job.status == 'failed':
+        response['success'] = False
+    return jsonify(response)
+
+@app.route('/api/enhance/<job_id>/events', methods=['GET'])
+def enhancement_events(job_id):
+    """Stream enhanced sections as Server-Sent Events as they are written."""
+    job = get_session_job(job_id, 'enhancement_job_id')
+    if job is None:
+        return jsonify({'success': False, 'error': 'Enhancement job not found'}), 404
+
+    return job_events_response(job)
+
+# Artifact file and content type of each shared format
+SHARE_ARTIFACTS = {
+    'html': ('index.html', 'text/html'),  # send_file adds the charset
+    'json': ('share.json', 'application/json')
+}
+
+def share_payload():
+    """The parts of the session's analysis and enhancement a share link shows."""
+    analysis = session['analysis']
+    enhanced = session['enhanced_content']
+    return {
+        'name': session.get('file_info', {}).get('name') or 'Shared document',
+        'doc_type': session['doc_type'],
+        'doc_title': KNOWLEDGE_TYPES[session['doc_type']]['title'],
+        'analysis': {
+            key: analysis.get(key) for key in ('elements', 'quality_score', 'recommendations', 'summary', 'analyzed_at')
+        },
+        'enhanced': {
+            'sections': [
+                {key: section.get(key) for key in ('name', 'status', 'kind', 'text')}
+                for section in enhanced.get('sections', []) if not section.get('error')
+            ],
+            'improvements': enhanced.get('improvements', []),
+            'enhanced_at': enhanced.get('enhanced_at')
+        }
+    }
+
+def share_response(share, created=False):
+    expires_at = datetime.fromtimestamp(share.expires_at)
+    return jsonify({
+        'success': True,
+        'share_info': {
+            'share_id': share.share_id,
+            'shared_at': datetime.fromtimestamp(share.created_at).isoformat(),
+            'share_url': url_for('shared_document', share_id=share.share_id, _external=True),
+            'json_url': url_for('shared_document_json', share_id=share.share_id, _external=True),
+            'expires_at': expires_at.isoformat(),
+            'expiry': f"{max(1, round((share.expires_at - time.time()) / 3600))} hours"
+        }
+    }), 201 if created else 200
+
 @app.route('/api/share', methods=['POST'])
 def share_document():
+    """Create a share link for the enhanced document, or return the session's existing one."""
     if 'enhanced_content' not in session:
         return jsonify({'success': False, 'error': 'Document not enhanced'})
 
     try:
-        # Here you would implement sharing functionality
-        share_info = {
-            'shared_at': datetime.now().isoformat(),
-            'share_url': 'https://example.com/share/123',
-            'expiry': '24 hours'
+        payload = share_payload()
+        content_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+        existing = share_store.find(session.sid, content_hash)
+        if existing:
+            return share_response(existing)
+
+        # Rendered now and never again: opening the link only sends these files
+        share_id = share_store.new_id()
+        created_at = time.time()
+        expires_at = created_at + share_store.ttl
+        document = {
+            'share_id': share_id,
+            **payload,
+            'shared_at': datetime.fromtimestamp(created_at).isoformat(),
+            'expires_at': datetime.fromtimestamp(expires_at).isoformat()
         }
+        html = render_template(
+            'share.html', **payload,
+            shared_at=datetime.fromtimestamp(created_at).strftime('%d %b %Y %H:%M'),
+            expires_at=datetime.fromtimestamp(expires_at).strftime('%d %b %Y %H:%M'),
+            json_url=url_for('shared_document_json', share_id=share_id)
+        )
+        share = share_store.create(
+            share_id,
+            {
+                SHARE_ARTIFACTS['html'][0]: html.encode('utf-8'),
+                SHARE_ARTIFACTS['json'][0]: json.dumps(document).encode('utf-8')
+            },
+            content_hash,
+            owner=session.sid,
+            name=payload['name'],
+            created_at=created_at
+        )
+        logger.info('Share link created', extra={'share_id': share.share_id, 'doc_type': payload['doc_type']})
+        return share_response(share, created=True)
 
+    except Exception as e:
+        logger.exception('Creating the share link failed')
+        return jsonify({'success': False, 'error': str(e)})
+
+def send_share_artifact(share_id, fmt):
+    """Send a stored share artifact, precompressed to the client's preference, with validators."""
+    share = share_store.get(share_id)
+    if share is None:
+        metrics.SHARE_REQUESTS.inc(format=fmt, status='404')
+        return Response('This share link does not exist or has expired.\n', status=404, mimetype='text/plain')
+
+    artifact, mimetype = SHARE_ARTIFACTS[fmt]
+    encoding = request.accept_encodings.best_match(share_store.encodings)
+    # A strong validator must differ between encodings of the same artifact
+    etag = f"{share.etags[artifact]}-{encoding}" if encoding else share.etags[artifact]
+    # send_file resolves relative paths against the app folder, not the working directory
+    response = send_file(
+        os.path.abspath(share_store.path(share_id, artifact, encoding)),
+        mimetype=mimetype,
+        # Named after the artifact, not the precompressed .gz/.br file on disk
+        download_name=artifact,
+        conditional=True,
+        etag=etag,
+        last_modified=share.created_at,
+        max_age=max(0, min(app.config['SHARE_MAX_AGE'], int(share.expires_at - time.time())))
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    metrics.SHARE_REQUESTS.inc(format=fmt, status=str(response.status_code))
+    return response
+
+@app.route('/s/<share_id>', methods=['GET'])
+def shared_document(share_id):
+    return send_share_artifact(share_id, 'html')
+
+@app.route('/s/<share_id>.json', methods=['GET'])
+def shared_document_json(share_id):
+    return send_share_artifact(share_id, 'json')
+
+@app.route('/api/shares/stats', methods=['GET'])
+def share_stats():
+    return jsonify({'success': True, 'shares': share_store.stats()})
+
+def export_path(key, fmt):
+    return os.path.join(app.config['EXPORT_FOLDER'], f"{key}.{fmt}")
+
+def export_request(fmt):
+    """Cache key, title and subtitle of the session's document exported as ``fmt``."""
+    doc_type = session['doc_type']
+    enhanced = session['enhanced_content']
+    name = session.get('file_info', {}).get('name') or 'Enhanced document'
+    title = os.path.splitext(name)[0]
+    enhanced_at = enhanced.get('enhanced_at', '')[:10]
+    subtitle = f"{KNOWLEDGE_TYPES[doc_type]['title']} · enhanced {enhanced_at}" if enhanced_at \
+        else KNOWLEDGE_TYPES[doc_type]['title']
+    key = make_export_key(fmt, doc_type, KNOWLEDGE_TYPES[doc_type]['templateFile'],
+                          enhanced.get('content_hash'), enhanced, title, subtitle)
+    return key, title, subtitle
+
+def prune_exports():
+    """Delete the least recently used exports beyond EXPORT_MAX_BYTES."""
+    entries = sorted(
+        (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+        for entry in os.scandir(app.config['EXPORT_FOLDER'])
+        if entry.is_file() and not entry.name.startswith('.tmp-')
+    )
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= app.config['EXPORT_MAX_BYTES']:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def run_export_job(job, fmt, key, file_path, doc_type, enhanced, title, subtitle):
+    """Build the enhanced document as DOCX or PDF into the export cache."""
+    doc_info = KNOWLEDGE_TYPES[doc_type]
+    job.publish('progress', {'stage': 'loading', 'message': 'Loading document content...'})
+    artifact = load_document(file_path)
+    sections = export_sections(artifact['text'], doc_info['elements'], enhanced, artifact.get('sections'))
+
+    job.publish('progress', {'stage': 'exporting', 'message': f"Writing {fmt.upper()} with {len(sections)} sections..."})
+    started = time.perf_counter()
+    path = export_path(key, fmt)
+    os.makedirs(app.config['EXPORT_FOLDER'], exist_ok=True)
+    # Built under a temporary name so a download never sees a half-written file
+    staging = os.path.join(app.config['EXPORT_FOLDER'], f".tmp-{job.id}.{fmt}")
+    try:
+        build_export(fmt, staging, doc_info['templateFile'], title, subtitle, sections)
+        os.replace(staging, path)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    size = os.path.getsize(path)
+    try:
+        prune_exports()
+    except OSError:
+        # Another worker pruned at the same time; the next export tries again
+        logger.warning('Pruning the export cache failed', exc_info=True)
+
+    seconds = time.perf_counter() - started
+    metrics.EXPORT_SECONDS.observe(seconds, format=fmt)
+    logger.info('Export finished', extra={
+        'job_id': job.id, 'format': fmt, 'sections': len(sections), 'bytes': size, 'seconds': round(seconds, 3)
+    })
+    return {'format': fmt, 'bytes': size, 'sections': len(sections)}
+
+def export_response(fmt, job=None):
+    response = {'success': True, 'format': fmt}
+    if job is None:
+        response.update(status='done', cached=True)
+    else:
+        response.update(job.to_dict(), cached=False)
+        if job.status == 'done':
+            response.update(job.result)
+        elif job.status == 'failed':
+            response['success'] = False
+    if response['status'] == 'done':
+        response['download_url'] = url_for('download_export', fmt=fmt)
+    return response
+
+@app.route('/api/export', methods=['POST'])
+def export_document():
+    """Export the enhanced document as DOCX or PDF: a download URL when cached, else a job id."""
+    if 'enhanced_content' not in session:
+        return jsonify({'success': False, 'error': 'Document not enhanced'})
+    fmt = (request.get_json(silent=True) or request.form).get('format', 'docx')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"Unsupported export format: {fmt}"}), 400
+    if not os.path.exists(session['file_path']):
+        return jsonify({'success': False, 'error': 'The uploaded document has expired. Please upload it again.'})
+
+    try:
+        key, title, subtitle = export_request(fmt)
+        path = export_path(key, fmt)
+        if os.path.exists(path):
+            metrics.EXPORT_CACHE.inc(result='hit', format=fmt)
+            # Recently used exports are the last to be pruned
+            os.utime(path)
+            return jsonify(export_response(fmt))
+
+        metrics.EXPORT_CACHE.inc(result='miss', format=fmt)
+        upload_store.touch(session['file_path'])
+        job = export_queue.submit(
+            'export',
+            profiled(run_export_job),
+            fmt,
+            key,
+            session['file_path'],
+            session['doc_type'],
+            session['enhanced_content'],
+            title,
+            subtitle
+        )
+
+        session[f'export_{fmt}_job_id'] = job.id
         return jsonify({
             'success': True,
-            'share_info': share_info
-        })
+            'format': fmt,
+            'job_id': job.id,
+            'status_url': url_for('export_status', fmt=fmt, job_id=job.id)
+        }), 202
 
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
+        logger.exception('Queueing the export failed')
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/export/<fmt>/<job_id>', methods=['GET'])
+def export_status(fmt, job_id):
+    """Report the status of an export job, with the download URL once done."""
+    job = get_session_job(job_id, f'export_{fmt}_job_id', export_queue)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+    return jsonify(export_response(fmt, job))
+
+@app.route('/api/export/<fmt>/download', methods=['GET'])
+def download_export(fmt):
+    """Stream the session's cached export from disk."""
+    if fmt not in EXPORT_FORMATS or 'enhanced_content' not in session:
+        return jsonify({'success': False, 'error': 'Export not found'}), 404
+    key, title, _ = export_request(fmt)
+    path = export_path(key, fmt)
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Export not found, please export the document again'}), 404
+
+    # send_file streams the file in blocks; the key is a hash of everything the export is built from
+    return send_file(
+        os.path.abspath(path),
+        mimetype=EXPORT_FORMATS[fmt],
+        as_attachment=True,
+        download_name=f"{secure_filename(title) or 'document'}_enhanced.{fmt}",
+        conditional=True,
+        etag=key[:32]
+    )
+
+@app.route('/api/exports/stats', methods=['GET'])
+def export_stats():
+    files = [entry for entry in os.scandir(app.config['EXPORT_FOLDER']) if entry.is_file()] \
+        if os.path.isdir(app.config['EXPORT_FOLDER']) else []
+    return jsonify({
+        'success': True,
+        'exports': {
+            'files': len(files),
+            'bytes': sum(entry.stat().st_size for entry in files),
+            'max_bytes': app.config['EXPORT_MAX_BYTES'],
+            'queue': export_queue.stats()
+        }
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5002)
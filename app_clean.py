@@ -2,15 +2,17 @@ from flask import Flask, render_template, request, jsonify, send_file, redirect,
 from werkzeug.utils import secure_filename
 import os
 import json
-import re
 import threading
 import queue
 from datetime import datetime
 from docx import Document
 import PyPDF2
 import markdown
-import google.generativeai as genai
 from dotenv import load_dotenv
+from heuristics import quality_score, summarize
+from prompts import build_prompt
+from providers import create_backend
+from stream_parser import parse_analysis, validate_analysis
 
 app = Flask(__name__)
 app.secret_key = 'replace_with_a_secret_key'
@@ -22,31 +24,85 @@ app.config['ALLOWED_EXTENSIONS'] = {'pdf', 'docx'}
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
 app.config['SESSION_TYPE'] = 'filesystem'
 
+# Analysis backend: 'gemini', 'openai', or 'mock' (offline, deterministic, for load tests)
+load_dotenv()
+app.config['ANALYSIS_BACKEND'] = os.getenv('ANALYSIS_BACKEND', 'gemini')
+app.config['GEMINI_MODEL'] = os.getenv('GEMINI_MODEL', 'gemini-pro')
+app.config['OPENAI_MODEL'] = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+app.config['MOCK_LATENCY'] = float(os.getenv('MOCK_LATENCY', 0.2))
+app.config['PROMPT_TOKEN_BUDGET'] = int(os.getenv('PROMPT_TOKEN_BUDGET', 16000))  # max prompt tokens per analysis
+analysis_backend = create_backend(app)
+
 # Document types
 KNOWLEDGE_TYPES = {
     'bestPractices': {
         'title': 'Best Practices',
         'description': 'Document proven methods and techniques that deliver superior results.',
         'templateFile': 'templates/best_practices_template.docx',
-        'sampleFile': 'samples/best_practices_sample.docx'
+        'sampleFile': 'samples/best_practices_sample.docx',
+        'elements': [
+            'Executive Summary',
+            'Introduction',
+            'Scope and Context',
+            'Best Practice Description',
+            'Implementation Guidelines',
+            'Benefits and Outcomes',
+            'Supporting Evidence',
+            'Recommendations',
+            'Conclusion'
+        ]
     },
     'lessonsLearned': {
         'title': 'Lessons Learned',
         'description': 'Capture insights from projects and experiences for future reference.',
         'templateFile': 'templates/lessons_learned_template.docx',
-        'sampleFile': 'samples/lessons_learned_sample.docx'
+        'sampleFile': 'samples/lessons_learned_sample.docx',
+        'elements': [
+            'Executive Summary',
+            'Project Background',
+            'Problem Statement',
+            'What Went Well',
+            'What Went Wrong',
+            'Root Cause Analysis',
+            'Lessons Learned',
+            'Recommendations',
+            'Action Items'
+        ]
     },
     'engineeringReport': {
         'title': 'Engineering Report',
         'description': 'Create formal technical reports with comprehensive analysis.',
         'templateFile': 'templates/engineering_report_template.docx',
-        'sampleFile': 'samples/engineering_report_sample.docx'
+        'sampleFile': 'samples/engineering_report_sample.docx',
+        'elements': [
+            'Title Page',
+            'Abstract',
+            'Table of Contents',
+            'Introduction',
+            'Methodology',
+            'Results and Analysis',
+            'Discussion',
+            'Conclusions',
+            'Recommendations',
+            'References'
+        ]
     },
     'engineeringStandards': {
         'title': 'Engineering Standards',
         'description': 'Authoritative documents for technical criteria, methods, and practices in engineering.',
         'templateFile': 'templates/engineering_standards_template.docx',
-        'sampleFile': 'samples/engineering_standards_sample.docx'
+        'sampleFile': 'samples/engineering_standards_sample.docx',
+        'elements': [
+            'Title and Identification',
+            'Scope',
+            'Normative References',
+            'Terms and Definitions',
+            'Technical Requirements',
+            'Test Methods',
+            'Compliance Criteria',
+            'Quality Assurance',
+            'Documentation Requirements'
+        ]
     }
 }
 
@@ -76,77 +132,51 @@ def extract_text_from_docx(file_path):
         print(f"Error extracting text from DOCX: {str(e)}")
     return text
 
-def analyze_with_gemini(content, doc_type, doc_info):
-    """Analyze document content using Gemini API."""
+def analyze_with_backend(content, doc_type, doc_info):
+    """Analyze document content using the configured analysis backend."""
     try:
-        prompt = f"""
-        Analyze this {doc_info['title']} and provide exactly:
-        1. Five-point document structure (use numbers)
-        2. Four specific improvement suggestions (use bullets)
-        3. A quality score (0-100)
-        
-        Content excerpt:
-        {content[:1000]}
-        """
-
-        model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content(
-            prompt,
-            generation_config={
-                'max_output_tokens': 500,
-                'temperature': 0.4,
-                'top_p': 0.8,
-            }
+        # Same prompt as the main app: cached instructions and element list, document packed into the budget
+        system, prompt = build_prompt(
+            doc_info, doc_info['elements'], content,
+            budget=app.config['PROMPT_TOKEN_BUDGET'],
+            model=analysis_backend.model
         )
+        response = analysis_backend.complete(system, prompt, max_tokens=1500, temperature=0.3)
         return response.text
     except Exception as e:
-        print(f"Gemini analysis error: {str(e)}")
+        print(f"{analysis_backend.name} analysis error: {str(e)}")
         return None
 
-def parse_analysis_response(analysis):
-    """Parse Gemini's response into structured data."""
-    structure = ['Executive Summary', 'Introduction', 'Main Content', 'Analysis', 'Conclusion']
-    suggestions = ['Add more detail', 'Include examples', 'Enhance formatting', 'Add references']
-    quality_score = 75
-
-    if not analysis:
-        return structure, suggestions, quality_score
-
-    lines = analysis.split('\n')
-    struct_points = []
-    suggest_points = []
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Structure points (numbered)
-        if line and line[0].isdigit() and '.' in line:
-            point = line.split('.', 1)[1].strip()
-            if len(struct_points) < 5:
-                struct_points.append(point)
-        
-        # Suggestions (bulleted)
-        elif line and line[0] in '•-*':
-            suggestion = line.strip('•-* ')
-            if len(suggest_points) < 4:
-                suggest_points.append(suggestion)
-        
-        # Quality score
-        elif 'score' in line.lower():
-            score_match = re.search(r'\d+', line)
-            if score_match:
-                score = int(score_match.group())
-                if 0 <= score <= 100:
-                    quality_score = score
-
-    if len(struct_points) >= 3:
-        structure = struct_points
-    if len(suggest_points) >= 2:
-        suggestions = suggest_points
-
-    return structure, suggestions, quality_score
+def parse_analysis_response(analysis, expected_elements):
+    """Parse the backend's JSON response with the shared parser, filling what it could not recover."""
+    data, _ = validate_analysis(parse_analysis(analysis or ''), expected_elements)
+    if all('status' not in e for e in data['elements']):
+        data = {
+            'elements': [
+                {
+                    'name': name,
+                    'status': 'PARTIAL',
+                    'description': 'Unable to analyze - please try again',
+                    'action': 'Re-run the analysis to get detailed feedback'
+                }
+                for name in expected_elements
+            ],
+            'fallback': True,
+            'recommendations': [
+                'Ensure all required sections are present',
+                'Add more detailed content to each section',
+                'Include supporting evidence and examples'
+            ]
+        }
+    for element in data['elements']:
+        element.setdefault('status', 'PARTIAL')
+        element.setdefault('description', 'This element could not be assessed automatically; please review it.')
+        element.setdefault('action', '' if element['status'] == 'EXISTS' else f"Review the {element['name']} section.")
+    data.setdefault('quality_score', quality_score(data['elements']))
+    data.setdefault('recommendations', [e['action'] for e in data['elements'] if e['action']][:5]
+                    or ['Review the document against the template'])
+    data['summary'] = summarize(data['elements'])
+    return data
 
 @app.route('/')
 def index():
@@ -302,18 +332,13 @@ def upload_document():
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_document():
-    """Analyze the uploaded document using Gemini API."""
+    """Analyze the uploaded document using the configured analysis backend."""
     if 'file_path' not in session:
         return jsonify({'success': False, 'error': 'No file uploaded'})
 
     try:
-        # Configure Gemini
-        load_dotenv()
-        api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key:
-            return jsonify({'success': False, 'error': 'API key not configured'})
-            
-        genai.configure(api_key=api_key)
+        if not analysis_backend.configured:
+            return jsonify({'success': False, 'error': analysis_backend.missing_config_message})
         
         # Get document info
         file_path = session['file_path']
@@ -330,7 +355,7 @@ def analyze_document():
                 else:
                     content = extract_text_from_docx(file_path)
 
-                return analyze_with_gemini(content, doc_type, doc_info)
+                return analyze_with_backend(content, doc_type, doc_info)
             except Exception as e:
                 print(f"Analysis error: {str(e)}")
                 return None
@@ -344,18 +369,11 @@ def analyze_document():
         
         if analysis_thread.is_alive():
             print("Analysis timed out")
-            structure, suggestions, quality_score = parse_analysis_response(None)
+            analysis_result = parse_analysis_response(None, doc_info['elements'])
         else:
             analysis = result_queue.get()
-            structure, suggestions, quality_score = parse_analysis_response(analysis)
-        
-        # Prepare the final result
-        analysis_result = {
-            'structure': structure,
-            'suggestions': suggestions,
-            'quality_score': quality_score,
-            'analyzed_at': datetime.now().isoformat()
-        }
+            analysis_result = parse_analysis_response(analysis, doc_info['elements'])
+        analysis_result['analyzed_at'] = datetime.now().isoformat()
         
         # Store in session and return
         session['analysis'] = analysis_result
@@ -0,0 +1,106 @@
+"""Extraction artifacts stored next to each upload.
+
+A document is parsed once, when it is uploaded.  The extracted text, the
+offsets of each page (PDF) or paragraph (DOCX, editor text) and a hash of the
+text are written to ``<upload>.extract.json``; analysis, enhancement and
+sharing read that file instead of running PyPDF2 or python-docx again.
+
+Documents the app does not own (batch CLI inputs in the user's folders)
+pass ``directory`` to keep their artifacts in a directory of the app's own,
+named by a hash of the document's absolute path.
+"""
+import os
+import json
+import hashlib
+import tempfile
+from datetime import datetime
+
+
+ARTIFACT_SUFFIX = '.extract.json'
+ARTIFACT_VERSION = 2
+
+
+def artifact_path(file_path, directory=None):
+    """Artifact file of ``file_path``: next to it, or in ``directory`` when given."""
+    if directory is None:
+        return file_path + ARTIFACT_SUFFIX
+    key = hashlib.sha256(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(directory, f"{key}-{os.path.basename(file_path)}{ARTIFACT_SUFFIX}")
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def build_artifact(segments, unit, headings=None):
+    """Join extracted segments into one text and record where each one starts and ends.
+
+    ``headings`` is a list of ``(segment_index, level, title)``; when given,
+    the artifact also gets a flat, document-ordered ``sections`` outline whose
+    ``start``/``end`` are character offsets running up to the next heading.
+    """
+    offsets = []
+    position = 0
+    for segment in segments:
+        offsets.append([position, position + len(segment)])
+        position += len(segment) + 1
+    text = '\n'.join(list(segments) + [''])
+    artifact = {
+        'version': ARTIFACT_VERSION,
+        'text': text,
+        'content_hash': content_hash(text),
+        'unit': unit,
+        'offsets': offsets,
+        'extracted_at': datetime.now().isoformat()
+    }
+    if headings is not None:
+        sections = []
+        for i, (segment_index, level, title) in enumerate(headings):
+            end = offsets[headings[i + 1][0]][0] if i + 1 < len(headings) else len(text)
+            sections.append({'title': title, 'level': level, 'start': offsets[segment_index][0], 'end': end})
+        artifact['sections'] = sections
+    return artifact
+
+
+def save_artifact(file_path, segments, unit, headings=None, directory=None):
+    """Build the artifact for ``file_path`` and write it next to the file (or to ``directory``)."""
+    artifact = build_artifact(segments, unit, headings)
+    stat = os.stat(file_path)
+    artifact['source'] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    target = artifact_path(file_path, directory)
+    target_dir = os.path.dirname(target) or '.'
+    os.makedirs(target_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(artifact, f)
+        os.replace(tmp_path, target)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return artifact
+
+
+def load_artifact(file_path, directory=None):
+    """Return the stored artifact, or None if missing or the file changed since."""
+    try:
+        with open(artifact_path(file_path, directory), 'r', encoding='utf-8') as f:
+            artifact = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+
+    source = artifact.get('source', {})
+    if (artifact.get('version') != ARTIFACT_VERSION
+            or source.get('size') != stat.st_size
+            or source.get('mtime_ns') != stat.st_mtime_ns):
+        return None
+    return artifact
+
+
+def segment_text(artifact, index):
+    """Return the text of one page or paragraph of an artifact."""
+    start, end = artifact['offsets'][index]
+    return artifact['text'][start:end]
@@ -0,0 +1,224 @@
+"""Batch analysis of many documents at once.
+
+Inputs can be files, folders (searched recursively) or zip archives.  Each
+document is extracted and analysed on a bounded thread pool and its result
+is appended to a JSONL file the moment it finishes, so an interrupted batch
+loses at most the documents that were in flight.  Re-running with
+``resume=True`` skips every document whose content hash already has a
+successful line in the output.
+
+Command line usage (the same code path as ``POST /api/batch``):
+
+    python batch.py --type lessonsLearned --output audit.jsonl reports/ old_reports.zip
+    python batch.py --type lessonsLearned --output audit.jsonl --resume reports/ old_reports.zip
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_EXTENSIONS = ('.pdf', '.docx')
+
+
+def file_hash(path):
+    """sha256 of a file's bytes; identifies a document across resumed runs."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_zip(zip_path, dest_dir):
+    """Unpack the supported documents of a zip, refusing paths that escape ``dest_dir``."""
+    extracted = []
+    dest_dir = os.path.realpath(dest_dir)
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or not member.filename.lower().endswith(BATCH_EXTENSIONS):
+                continue
+            target = os.path.realpath(os.path.join(dest_dir, member.filename))
+            if not target.startswith(dest_dir + os.sep):
+                logger.warning('Skipping unsafe zip entry', extra={'entry': member.filename})
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.open(member) as src, open(target, 'wb') as dst:
+                while True:
+                    block = src.read(1024 * 1024)
+                    if not block:
+                        break
+                    dst.write(block)
+            extracted.append(target)
+    return extracted
+
+
+def collect_inputs(paths, work_dir):
+    """Expand files, folders and zips into a sorted list of document paths."""
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                documents.extend(os.path.join(root, n) for n in names if n.lower().endswith(BATCH_EXTENSIONS))
+        elif path.lower().endswith('.zip'):
+            name = os.path.splitext(os.path.basename(path))[0]
+            documents.extend(extract_zip(path, os.path.join(work_dir, name)))
+        elif path.lower().endswith(BATCH_EXTENSIONS):
+            documents.append(path)
+        else:
+            logger.warning('Skipping unsupported input', extra={'path': path})
+    return sorted(set(documents))
+
+
+def load_completed(output_path):
+    """Content hashes that already have a successful result in ``output_path``."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; that document is simply redone
+                continue
+            if record.get('status') == 'done':
+                completed.add(record.get('sha256'))
+    return completed
+
+
+def ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+class BatchStats:
+    """Counters for a running batch, including throughput in documents/minute."""
+
+    def __init__(self, total, skipped):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, status):
+        with self._lock:
+            if status == 'done':
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def to_dict(self):
+        with self._lock:
+            processed = self.done + self.failed
+            elapsed = time.time() - self.started_at
+            return {
+                'total': self.total,
+                'skipped': self.skipped,
+                'done': self.done,
+                'failed': self.failed,
+                'remaining': self.total - self.skipped - processed,
+                'elapsed_seconds': round(elapsed, 2),
+                'docs_per_minute': round(60 * processed / elapsed, 2) if elapsed > 0 else 0.0
+            }
+
+
+def run_batch(documents, analyze_file, output_path, max_workers=4, resume=False, on_result=None):
+    """Analyse ``documents`` with ``analyze_file(path)`` and append results to ``output_path``.
+
+    ``analyze_file`` returns the analysis dict or raises.  ``on_result`` is
+    called with each JSONL record and the current stats after it is written.
+    Returns the final stats dict.
+    """
+    completed = load_completed(output_path) if resume else set()
+    hashes = {path: file_hash(path) for path in documents}
+    pending = [path for path in documents if hashes[path] not in completed]
+    stats = BatchStats(len(documents), len(documents) - len(pending))
+    if stats.skipped:
+        logger.info('Resuming batch', extra={'skipped': stats.skipped, 'documents': len(documents)})
+
+    def process(path):
+        start = time.perf_counter()
+        record = {'file': path, 'sha256': hashes[path]}
+        try:
+            analysis = analyze_file(path)
+            record.update(status='done', analysis=analysis)
+        except Exception as e:
+            logger.warning('Batch document analysis failed', extra={'path': path, 'error': str(e)})
+            record.update(status='failed', error=str(e))
+        record['seconds'] = round(time.perf_counter() - start, 3)
+        return record
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'a' if resume else 'w', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch') as executor:
+        if out.tell() and not ends_with_newline(output_path):
+            out.write('\n')  # terminate a line cut short by a crash
+        futures = [executor.submit(process, path) for path in pending]
+        # Only this thread writes, so lines never interleave
+        for future in as_completed(futures):
+            record = future.result()
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            stats.record(record['status'])
+            if on_result:
+                on_result(record, stats.to_dict())
+
+    return stats.to_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse many documents and write results as JSONL')
+    parser.add_argument('inputs', nargs='+', help='PDF/DOCX files, folders or zip archives')
+    parser.add_argument('--type', required=True, help='knowledge type, e.g. lessonsLearned')
+    parser.add_argument('--output', required=True, help='JSONL file to write results to')
+    parser.add_argument('--resume', action='store_true', help='skip documents already in the output')
+    parser.add_argument('--workers', type=int, default=4, help='documents analysed at the same time')
+    parser.add_argument('--work-dir', default=os.path.join('uploads', 'batches', 'cli'),
+                        help='where zip archives are unpacked and extraction artifacts are kept')
+    args = parser.parse_args()
+
+    # Imported here so that importing batch.py does not start the web app's services
+    from app import KNOWLEDGE_TYPES, analyze_batch_file
+
+    if args.type not in KNOWLEDGE_TYPES:
+        parser.error(f"unknown type {args.type!r}; choose from {', '.join(KNOWLEDGE_TYPES)}")
+
+    documents = collect_inputs(args.inputs, args.work_dir)
+    # Never write next to the inputs: they may live on a read-only share
+    artifact_dir = os.path.join(args.work_dir, 'artifacts')
+    if not documents:
+        print("No PDF or DOCX documents found")
+        return 1
+
+    def report(record, stats):
+        finished = stats['done'] + stats['failed']
+        print(f"[{finished}/{stats['total'] - stats['skipped']}] {record['status']:<6} {record['file']} "
+              f"({record['seconds']}s, {stats['docs_per_minute']} docs/min)")
+
+    stats = run_batch(
+        documents,
+        lambda path: analyze_batch_file(path, args.type, artifact_dir),
+        args.output,
+        max_workers=args.workers,
+        resume=args.resume,
+        on_result=report
+    )
+    print(f"Analysed {stats['done']} documents ({stats['failed']} failed, {stats['skipped']} skipped) "
+          f"in {stats['elapsed_seconds']}s: {stats['docs_per_minute']} docs/min")
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
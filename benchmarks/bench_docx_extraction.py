@@ -0,0 +1,120 @@
+"""Benchmark DOCX extraction: python-docx paragraph loop vs. single-pass streaming.
+
+Synthetic reports with headings, body paragraphs and tables are generated
+with python-docx.  Wall-clock time is the best of ``--repeat`` runs; peak
+memory is the growth in peak RSS during one run in a forked child process
+(tracemalloc would miss lxml's C allocations in python-docx).
+
+    python benchmarks/bench_docx_extraction.py --paragraphs 1000 10000 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import multiprocessing
+import resource
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+
+from extraction import extract_docx_structure
+
+WORDS = ('load pressure valve flow design test sample result measure system '
+         'analysis failure margin stress thermal report data model').split()
+
+
+def make_docx(path, paragraphs, seed=0, title='Synthetic Engineering Report'):
+    """Write a report with a heading every 20 paragraphs and a table every 100."""
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading(title, 0)
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            doc.add_heading(f'Section {i // 20 + 1}', 1 + (i // 20) % 2)
+        doc.add_paragraph(' '.join(rng.choice(WORDS) for _ in range(30)))
+        if i % 100 == 99:
+            table = doc.add_table(rows=3, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = rng.choice(WORDS)
+    doc.save(path)
+
+
+def legacy_extract(file_path):
+    """The original extract_text_from_docx loop from app.py."""
+    text = ""
+    doc = Document(file_path)
+    for paragraph in doc.paragraphs:
+        text += paragraph.text + "\n"
+    return text
+
+
+def streaming_extract(file_path):
+    segments, headings = extract_docx_structure(file_path)
+    segments.append('')
+    return '\n'.join(segments), headings
+
+
+def _peak_rss_growth(fn, conn):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    fn()
+    conn.send((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024)
+    conn.close()
+
+
+def measure(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.get_context('fork').Process(target=_peak_rss_growth, args=(fn, child))
+    process.start()
+    peak = parent.recv()
+    process.join()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--paragraphs', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.paragraphs:
+            path = os.path.join(tmp, f'synthetic_{count}.docx')
+            make_docx(path, count)
+
+            legacy_time, legacy_peak = measure(lambda: legacy_extract(path), args.repeat)
+            stream_time, stream_peak = measure(lambda: streaming_extract(path), args.repeat)
+            _, headings = streaming_extract(path)
+            results.append({
+                'paragraphs': count,
+                'file_bytes': os.path.getsize(path),
+                'legacy_seconds': round(legacy_time, 4),
+                'streaming_seconds': round(stream_time, 4),
+                'legacy_peak_bytes': legacy_peak,
+                'streaming_peak_bytes': stream_peak,
+                'headings_found': len(headings)
+            })
+            print(f"{count:>6} paragraphs  legacy {legacy_time:7.3f}s {legacy_peak / 1e6:7.1f}MB  "
+                  f"streaming {stream_time:7.3f}s {stream_peak / 1e6:7.1f}MB  "
+                  f"({len(headings)} headings)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
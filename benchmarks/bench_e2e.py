@@ -0,0 +1,387 @@
+"""End-to-end benchmark of the wizard flow against the mock analysis backend.
+
+Virtual users drive the real HTTP flow on a threaded werkzeug server:
+select-type -> upload -> analyze and enhance (queue, then poll until done) ->
+share, uploading generated PDF and DOCX documents of several sizes.  Every
+upload gets a unique title line, so neither upload dedup nor the analysis
+cache can answer for the pipeline, and the app runs in a fresh temporary
+working directory so nothing carries over from earlier runs.
+
+Per corpus and stage it reports p50/p95/p99 latency, response size, the
+server-side session size and the session cookie size; per corpus the
+throughput and peak RSS.  ``--json`` saves the results together with the git
+commit they were measured on, and ``--compare`` checks a run against such a
+file, exiting non-zero when a stage's p95 got more than ``--threshold`` slower:
+
+    python benchmarks/bench_e2e.py --corpora pdf:10 pdf:100 docx:50 docx:500 --json e2e.json
+    python benchmarks/bench_e2e.py --compare e2e.json
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import zipfile
+from datetime import datetime
+from http.cookiejar import CookieJar
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from bench_docx_extraction import make_docx
+from bench_pdf_extraction import make_pdf
+from load_test import percentile
+
+STAGES = ['select_type', 'upload', 'analyze', 'enhance', 'share']
+TITLE = 'BENCH-00000000'  # replaced by a tag of the same length in every upload
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
+
+
+def current_rss():
+    """Resident set size of this process in bytes (Linux), or None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return None
+
+
+def peak_rss():
+    """High-water RSS of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Corpus:
+    """A generated document that can be re-issued with a unique title."""
+
+    def __init__(self, spec, directory):
+        self.spec = spec
+        self.format, size = spec.split(':')
+        self.size = int(size)
+        path = os.path.join(directory, f"corpus_{self.format}_{self.size}.{self.format}")
+        if self.format == 'pdf':
+            make_pdf(path, self.size, title=TITLE)
+        elif self.format == 'docx':
+            make_docx(path, self.size, title=TITLE)
+        else:
+            raise ValueError(f"Unknown corpus format: {self.format} (use pdf:<pages> or docx:<paragraphs>)")
+        with open(path, 'rb') as f:
+            self.data = f.read()
+
+    def unique(self, rng):
+        tag = f"BENCH-{rng.getrandbits(32):08x}".encode()
+        if self.format == 'pdf':
+            # Same length as the placeholder, so stream lengths and xref offsets stay valid
+            return self.data.replace(TITLE.encode(), tag, 1)
+        source = zipfile.ZipFile(io.BytesIO(self.data))
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as target:
+            for item in source.infolist():
+                content = source.read(item.filename)
+                if item.filename == 'word/document.xml':
+                    content = content.replace(TITLE.encode(), tag, 1)
+                target.writestr(item, content)
+        return out.getvalue()
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for name, value in fields.items():
+        body += f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+    for name, (filename, data, content_type) in files.items():
+        body += (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                 f'Content-Type: {content_type}\r\n\r\n').encode()
+        body += data + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode()
+    return bytes(body), f'multipart/form-data; boundary={boundary}'
+
+
+class VirtualUser:
+    """One browser session walking through the whole wizard."""
+
+    def __init__(self, base_url, session_interface, seed):
+        self.base_url = base_url
+        self.session_interface = session_interface
+        self.rng = random.Random(seed)
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def request(self, method, path, data=None, content_type=None):
+        """Return (status, parsed JSON body, response bytes)."""
+        headers = {'Content-Type': content_type} if content_type else {}
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with self.opener.open(req, timeout=300) as resp:
+                raw = resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            raw, status = e.read(), e.code
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            body = {}
+        return status, body, len(raw)
+
+    def session_sizes(self):
+        """(cookie bytes, server-side session bytes) for this user's session."""
+        for cookie in self.cookies:
+            if cookie.name == 'session':
+                payload = self.session_interface.store.load(cookie.value, self.session_interface.lifetime)
+                return len(f"{cookie.name}={cookie.value}"), len(payload or b'')
+        return 0, 0
+
+    def stage(self, name, record, fn):
+        start = time.perf_counter()
+        ok, response_bytes = fn()
+        elapsed = time.perf_counter() - start
+        cookie_bytes, session_bytes = self.session_sizes()
+        entry = record.setdefault(name, {'seconds': [], 'response_bytes': [], 'session_bytes': [],
+                                         'cookie_bytes': [], 'rss': [], 'failures': 0})
+        entry['seconds'].append(elapsed)
+        entry['response_bytes'].append(response_bytes)
+        entry['session_bytes'].append(session_bytes)
+        entry['cookie_bytes'].append(cookie_bytes)
+        rss = current_rss()
+        if rss is not None:
+            entry['rss'].append(rss)
+        if not ok:
+            entry['failures'] += 1
+        return ok
+
+    def run_flow(self, corpus, record, poll_interval):
+        document = corpus.unique(self.rng)
+
+        def select_type():
+            status, body, size = self.request('POST', '/api/select-type', b'type=engineeringReport',
+                                              'application/x-www-form-urlencoded')
+            return body.get('success', False), size
+
+        def upload():
+            data, content_type = multipart({}, {
+                'file': (f"report.{corpus.format}", document, CONTENT_TYPES[corpus.format])
+            })
+            status, body, size = self.request('POST', '/api/upload', data, content_type)
+            return body.get('success', False), size
+
+        def run_job(path):
+            status, queued, size = self.request('POST', path, b'{}', 'application/json')
+            if not queued.get('success'):
+                return False, size
+            while True:
+                status, body, size = self.request('GET', queued['status_url'])
+                if body.get('status') in ('done', 'failed') or status >= 400:
+                    return body.get('status') == 'done', size
+                time.sleep(poll_interval)
+
+        def analyze():
+            return run_job('/api/analyze')
+
+        def enhance():
+            return run_job('/api/enhance')
+
+        def share():
+            status, body, size = self.request('POST', '/api/share', b'{}', 'application/json')
+            return body.get('success', False), size
+
+        for name, fn in zip(STAGES, [select_type, upload, analyze, enhance, share]):
+            if not self.stage(name, record, fn):
+                return False
+        return True
+
+
+def run_corpus(base_url, session_interface, corpus, users, iterations, poll_interval, seed):
+    records = []
+    flows = {'done': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def worker(index):
+        user = VirtualUser(base_url, session_interface, seed * 1000 + index)
+        record = {}
+        for _ in range(iterations):
+            ok = user.run_flow(corpus, record, poll_interval)
+            with lock:
+                flows['done' if ok else 'failed'] += 1
+        with lock:
+            records.append(record)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(users)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    stages = {}
+    requests_made = 0
+    for name in STAGES:
+        merged = {}
+        for record in records:
+            for key, values in record.get(name, {}).items():
+                if key == 'failures':
+                    merged[key] = merged.get(key, 0) + values
+                else:
+                    merged.setdefault(key, []).extend(values)
+        if not merged.get('seconds'):
+            continue
+        seconds = merged['seconds']
+        requests_made += len(seconds)
+        stages[name] = {
+            'count': len(seconds),
+            'failures': merged.get('failures', 0),
+            'p50_ms': round(1000 * percentile(seconds, 50), 2),
+            'p95_ms': round(1000 * percentile(seconds, 95), 2),
+            'p99_ms': round(1000 * percentile(seconds, 99), 2),
+            'mean_ms': round(1000 * statistics.mean(seconds), 2),
+            'response_bytes': round(statistics.mean(merged['response_bytes'])),
+            'session_bytes_max': max(merged['session_bytes']),
+            'cookie_bytes_max': max(merged['cookie_bytes']),
+            'rss_mb_max': round(max(merged['rss']) / 1e6, 1) if merged['rss'] else None
+        }
+    return {
+        'corpus': corpus.spec,
+        'file_bytes': len(corpus.data),
+        'users': users,
+        'iterations': iterations,
+        'seconds': round(elapsed, 3),
+        'flows': flows,
+        'flows_per_second': round(flows['done'] / elapsed, 3),
+        'stage_requests_per_second': round(requests_made / elapsed, 2),
+        'peak_rss_mb': round(peak_rss() / 1e6, 1),
+        'stages': stages
+    }
+
+
+def print_result(result):
+    print(f"\n{result['corpus']} ({result['file_bytes'] / 1e3:.0f} kB): {result['flows']['done']} flows in "
+          f"{result['seconds']:.1f}s, {result['flows_per_second']:.2f} flows/s, peak RSS {result['peak_rss_mb']} MB")
+    print(f"  {'stage':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'resp B':>9} {'session B':>10} "
+          f"{'cookie B':>9} {'RSS MB':>7} {'fail':>5}")
+    for name, s in result['stages'].items():
+        print(f"  {name:<12} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['response_bytes']:>9} "
+              f"{s['session_bytes_max']:>10} {s['cookie_bytes_max']:>9} {s['rss_mb_max'] or '-':>7} {s['failures']:>5}")
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Print p95 changes against ``baseline``; return the regressed (corpus, stage) pairs."""
+    previous = {(r['corpus'], name): stage for r in baseline['results'] for name, stage in r['stages'].items()}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at', '?')}):")
+    for result in results:
+        for name, stage in result['stages'].items():
+            before = previous.get((result['corpus'], name))
+            if not before or not before['p95_ms']:
+                continue
+            change = (stage['p95_ms'] - before['p95_ms']) / before['p95_ms']
+            # Stages that take a few milliseconds jitter by more than any sane threshold
+            slower = change > threshold and stage['p95_ms'] - before['p95_ms'] > min_delta_ms
+            flag = 'REGRESSION' if slower else ''
+            print(f"  {result['corpus']:<10} {name:<12} p95 {before['p95_ms']:>9.1f} -> {stage['p95_ms']:>9.1f} ms "
+                  f"({100 * change:+6.1f}%) {flag}")
+            if flag:
+                regressions.append((result['corpus'], name))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpora', nargs='+', default=['pdf:10', 'pdf:100', 'docx:50', 'docx:500'],
+                        help='documents as pdf:<pages> or docx:<paragraphs>')
+    parser.add_argument('--users', type=int, default=4, help='concurrent virtual users')
+    parser.add_argument('--iterations', type=int, default=5, help='flows per user and corpus')
+    parser.add_argument('--warmup', type=int, default=1, help='unrecorded flows per corpus before measuring')
+    parser.add_argument('--mock-latency', type=float, default=0.05, help='seconds per mock backend call')
+    parser.add_argument('--mode', default='hybrid', help='ANALYSIS_MODE: hybrid, llm or offline')
+    parser.add_argument('--workers', type=int, default=8, help='analysis job workers')
+    parser.add_argument('--poll-interval', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --json run')
+    parser.add_argument('--threshold', type=float, default=0.10, help='p95 slowdown counted as a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=10, help='ignore p95 slowdowns smaller than this')
+    args = parser.parse_args()
+    output = os.path.abspath(args.json) if args.json else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as corpus_dir, tempfile.TemporaryDirectory() as work_dir:
+        corpora = [Corpus(spec, corpus_dir) for spec in args.corpora]
+
+        # The app keeps uploads, caches and sessions relative to the working directory
+        os.chdir(work_dir)
+        os.environ.update({
+            'ANALYSIS_BACKEND': 'mock',
+            'ANALYSIS_MODE': args.mode,
+            'ANALYSIS_WORKERS': str(args.workers),
+            'MOCK_LATENCY': str(args.mock_latency),
+            'LOG_LEVEL': 'WARNING'
+        })
+        from werkzeug.serving import make_server
+        import app as webapp
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, webapp.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+        results = []
+        for index, corpus in enumerate(corpora):
+            if args.warmup:
+                run_corpus(base_url, webapp.app.session_interface, corpus, 1, args.warmup,
+                           args.poll_interval, seed=args.seed + 10000 + index)
+            result = run_corpus(base_url, webapp.app.session_interface, corpus, args.users, args.iterations,
+                                args.poll_interval, seed=args.seed + index)
+            results.append(result)
+            print_result(result)
+        server.shutdown()
+        webapp.upload_store.stop()
+        webapp.app.session_interface.stop()
+        os.chdir(cwd)
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('json', 'compare')},
+        'results': results
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""DOCX and PDF export time, file size and peak memory vs. document length.
+
+Builds an export of a synthetic enhanced document of each ``--pages``
+length (about 500 words a page, split over the engineering report's
+elements) with the type's template, as the export workers do.  Peak memory
+is measured with tracemalloc in a second, untimed build; it does not see
+lxml's own allocations, so DOCX peaks are a lower bound.
+
+    python benchmarks/bench_export.py --pages 10 100 500
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export import EXPORT_FORMATS, build_export
+
+ELEMENTS = ['Abstract', 'Introduction', 'Background', 'Methodology', 'Results', 'Discussion',
+            'Conclusions', 'Recommendations', 'References', 'Appendices']
+PARAGRAPH = ('The pump seal failed under **cyclic thermal load** after the coolant supply was throttled. '
+             'Inspection found hardened elastomer and scoring on the shaft sleeve. ') * 4
+
+
+def make_sections(pages):
+    """Sections totalling about ``pages`` pages: paragraphs with a few bullets each."""
+    paragraphs = max(1, pages * 500 // len(PARAGRAPH.split()) // len(ELEMENTS))
+    text = '\n\n'.join(PARAGRAPH + '\n- Replace the seal\n- Monitor the coolant flow' for _ in range(paragraphs))
+    return [{'name': element, 'text': text} for element in ELEMENTS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--template', default='templates/engineering_report_template.docx')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for pages in args.pages:
+            sections = make_sections(pages)
+            for fmt in EXPORT_FORMATS:
+                path = os.path.join(work_dir, f"export.{fmt}")
+                start = time.perf_counter()
+                build_export(fmt, path, args.template, 'Pump seal failure', 'Engineering Report', sections)
+                seconds = time.perf_counter() - start
+                tracemalloc.start()
+                build_export(fmt, path, args.template, 'Pump seal failure', 'Engineering Report', sections)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                result = {
+                    'pages': pages,
+                    'format': fmt,
+                    'seconds': round(seconds, 3),
+                    'bytes': os.path.getsize(path),
+                    'peak_mb': round(peak / 1024 / 1024, 1)
+                }
+                results.append(result)
+                print(f"{pages:>4} pages  {fmt:<4}  {result['seconds']:7.3f}s  "
+                      f"{result['bytes'] / 1024:9.0f} KiB  peak {result['peak_mb']:6.1f} MiB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Re-analysis of a small edit to a long report: incremental vs. from scratch.
+
+For every ``--pages`` size a report with one section per expected element is
+analysed, one paragraph of one section is rewritten and the edited version
+analysed again four ways against the mock backend:
+
+  incremental  - only the element whose section changed is re-checked
+  near-copy    - incremental analysis off: the original's analysis is reused as is
+  full (warm)  - whole document, analysis cache still holding the original's chunks
+  full (cold)  - whole document, empty analysis cache
+
+reporting LLM calls, prompt tokens and wall-clock time of each.  The app runs
+in a temporary working directory so nothing carries over between runs.
+
+    python benchmarks/bench_incremental.py --pages 2 20 100 --latency 0.5
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ('load pressure valve flow design test sample result measure system analysis failure margin '
+         'stress thermal report data model pump seal bearing vibration corrective action').split()
+CHARS_PER_PAGE = 3000
+
+
+def make_sections(rng, elements, pages):
+    per_section = max(1, pages * CHARS_PER_PAGE // len(elements))
+    sections = {}
+    for element in elements:
+        paragraphs, written = [], 0
+        while written < per_section:
+            paragraph = ' '.join(rng.choice(WORDS) for _ in range(40)).capitalize() + '.'
+            paragraphs.append(paragraph)
+            written += len(paragraph) + 1
+        sections[element] = paragraphs
+    return sections
+
+
+def render(sections):
+    return '\n\n'.join(f"{element}\n" + '\n'.join(paragraphs) for element, paragraphs in sections.items())
+
+
+def analyze(webapp, client, text):
+    """Upload ``text`` through the editor endpoint and analyze it; returns calls, tokens and seconds."""
+    client.post('/api/save-editor-content', json={'text': text, 'content': text})
+    before = webapp.analysis_backend.stats()
+    start = time.perf_counter()
+    job = client.post('/api/analyze').get_json()
+    while True:
+        status = client.get(job['status_url']).get_json()
+        if status['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    after = webapp.analysis_backend.stats()
+    if status['status'] != 'done':
+        raise RuntimeError(status.get('error'))
+    return {
+        'calls': after['calls'] - before['calls'],
+        'prompt_tokens': after['prompt_tokens'] - before['prompt_tokens'],
+        'seconds': round(elapsed, 3),
+        'reanalyzed': (status['analysis'].get('incremental') or {}).get('reanalyzed'),
+        'reused': 'reused_from' in status['analysis']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[2, 20, 100])
+    parser.add_argument('--doc-type', default='engineeringReport')
+    parser.add_argument('--mode', default='llm', choices=['llm', 'hybrid'], help='ANALYSIS_MODE')
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per mock LLM call')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    results = {'mode': args.mode, 'latency': args.latency, 'sizes': []}
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The app keeps uploads, caches and the knowledge base relative to the working directory
+        os.chdir(work_dir)
+        os.environ.update({
+            'ANALYSIS_BACKEND': 'mock',
+            'ANALYSIS_MODE': args.mode,
+            'MOCK_LATENCY': str(args.latency),
+            'LOG_LEVEL': 'WARNING'
+        })
+        import app as webapp
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        reuse = webapp.app.config['NEAR_DUPLICATE_REUSE']
+        elements = webapp.KNOWLEDGE_TYPES[args.doc_type]['elements']
+        rng = random.Random(args.seed)
+
+        for pages in args.pages:
+            client = webapp.app.test_client()
+            client.post('/api/select-type', data={'type': args.doc_type})
+            sections = make_sections(rng, elements, pages)
+            original = analyze(webapp, client, render(sections))
+
+            edited = {element: list(paragraphs) for element, paragraphs in sections.items()}
+            element = rng.choice(elements)
+            paragraph = rng.randrange(len(edited[element]))
+            edited[element][paragraph] = ' '.join(rng.choice(WORDS) for _ in range(40)).capitalize() + '.'
+            text = render(edited)
+
+            webapp.app.config['INCREMENTAL_ANALYSIS'] = True
+            incremental = analyze(webapp, client, text)
+            webapp.app.config['INCREMENTAL_ANALYSIS'] = False
+            # Reuse any flagged near-copy, however small the document and so the similarity
+            webapp.app.config['NEAR_DUPLICATE_REUSE'] = 0.0
+            # At INFO the reuse log record is really built, as in production
+            webapp.logger.setLevel(logging.INFO)
+            near_copy = analyze(webapp, client, text)
+            webapp.logger.setLevel(logging.NOTSET)
+            if not near_copy['reused']:
+                raise RuntimeError('The near-copy was analysed again instead of reusing the original analysis')
+            # The baselines must really analyse
+            webapp.app.config['NEAR_DUPLICATE_REUSE'] = 1.1
+            warm = analyze(webapp, client, text)
+            webapp.analysis_cache.clear()
+            cold = analyze(webapp, client, text)
+            webapp.app.config['NEAR_DUPLICATE_REUSE'] = reuse
+
+            size = {'pages': pages, 'chars': len(text), 'original': original, 'incremental': incremental,
+                    'near_copy': near_copy, 'full_warm': warm, 'full_cold': cold}
+            results['sizes'].append(size)
+            print(f"{pages:>4} pages, edited {element!r}")
+            for label, run in [('incremental', incremental), ('near-copy', near_copy),
+                               ('full (warm)', warm), ('full (cold)', cold)]:
+                print(f"    {label:<12} {run['calls']:>3} calls  {run['prompt_tokens']:>7} prompt tokens  "
+                      f"{run['seconds']:6.2f}s")
+        os.chdir(cwd)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Measure per-call overhead of the pooled LLM client against a fresh client per call.
+
+Both variants talk to the local OpenAI stub, so the numbers are pure client
+overhead (client construction, connection set-up, retries) rather than model
+latency.  A second run with ``--fail-every`` shows the retry policy at work.
+
+    python benchmarks/bench_llm_client.py --calls 200 --fail-every 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import openai
+
+from llm_client import LLMClientManager
+from stub_openai import start_stub_server
+
+MESSAGES = [{'role': 'user', 'content': 'Required Elements to Check:\n- Introduction\n- Conclusion'}]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(name, timings):
+    ms = [t * 1000 for t in timings]
+    result = {
+        'variant': name,
+        'calls': len(ms),
+        'mean_ms': round(statistics.mean(ms), 3),
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3)
+    }
+    print(f"{name:<22} mean {result['mean_ms']:8.3f}ms  p50 {result['p50_ms']:8.3f}ms  p95 {result['p95_ms']:8.3f}ms")
+    return result
+
+
+def fresh_client_call(base_url):
+    client = openai.OpenAI(api_key='stub', base_url=base_url, max_retries=0)
+    return client.chat.completions.create(model='stub', messages=MESSAGES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--fail-every', type=int, default=5, help='stub returns 429 on every Nth call in the retry run')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    os.environ['OPENAI_API_KEY'] = 'stub'
+    os.environ['OPENAI_BASE_URL'] = base_url
+    results = []
+
+    timings = []
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        fresh_client_call(base_url)
+        timings.append(time.perf_counter() - start)
+    results.append(summarize('fresh client per call', timings))
+
+    manager = LLMClientManager()
+    manager.chat_completion(model='stub', messages=MESSAGES)  # warm the pool
+    timings = []
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        manager.chat_completion(model='stub', messages=MESSAGES)
+        timings.append(time.perf_counter() - start)
+    results.append(summarize('pooled manager', timings))
+
+    server.fail_every = args.fail_every
+    retry_manager = LLMClientManager(base_delay=0.01)
+    timings = []
+    for _ in range(args.calls):
+        start = time.perf_counter()
+        retry_manager.chat_completion(model='stub', messages=MESSAGES)
+        timings.append(time.perf_counter() - start)
+    retry_result = summarize(f'pooled, 429 every {args.fail_every}', timings)
+    retry_result.update(retry_manager.stats())
+    results.append(retry_result)
+    print(f"retries: {retry_result['retries']}, failures: {retry_result['failures']}")
+
+    server.shutdown()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
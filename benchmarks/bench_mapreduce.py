@@ -0,0 +1,117 @@
+"""Benchmark chunked map-reduce analysis: wall-clock time against document length.
+
+The LLM is replaced by a stub that sleeps for a fixed latency plus a per-token
+cost, so the numbers show how chunking and the parallelism cap scale rather
+than how fast OpenAI is on a given day.  Chunks are sized and budgeted as the
+app does it: ``--prompt-tokens`` per call, instructions included, and
+``--token-budget`` prompt tokens for the whole analysis.
+
+    python benchmarks/bench_mapreduce.py --pages 2 10 60 200 --parallelism 1 4 8
+
+Each ``--prompt-tokens`` size is run in turn, so the default compares the
+old 1100-token prompts with the current 16000-token default.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import split_into_chunks, apply_token_budget, analyze_in_chunks
+from prompts import count_tokens, document_budget
+
+ELEMENTS = [
+    'Title Page', 'Abstract', 'Table of Contents', 'Introduction', 'Methodology',
+    'Results and Analysis', 'Discussion', 'Conclusions', 'Recommendations', 'References'
+]
+WORDS = ('load pressure valve flow design test sample result measure system '
+         'analysis failure margin stress thermal report data model').split()
+CHARS_PER_PAGE = 3000
+
+
+def synthetic_report(pages, seed=0):
+    """Build an engineering report of roughly ``pages`` pages with real headings."""
+    rng = random.Random(seed)
+    lines = []
+    per_section = max(1, pages * CHARS_PER_PAGE // len(ELEMENTS))
+    for heading in ELEMENTS:
+        lines.append(heading)
+        written = 0
+        while written < per_section:
+            sentence = ' '.join(rng.choice(WORDS) for _ in range(12)).capitalize() + '.'
+            lines.append(sentence)
+            written += len(sentence) + 1
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def stub_analyzer(latency, per_token):
+    def analyze_chunk(chunk, index, total):
+        time.sleep(latency + count_tokens(chunk) * per_token)
+        found = [e for e in ELEMENTS if e in chunk]
+        return {
+            'elements': [
+                {'name': e, 'status': 'EXISTS' if e in found else 'MISSING', 'description': '', 'action': ''}
+                for e in ELEMENTS
+            ],
+            'quality_score': 70,
+            'recommendations': []
+        }
+    return analyze_chunk
+
+
+def run(pages_list, parallelism_list, prompt_tokens, token_budget, latency, per_token):
+    # Room for the document in a part prompt; the rest are the instructions every call repeats
+    chunk_tokens = document_budget({'title': 'Engineering Report'}, ELEMENTS, prompt_tokens, part=(998, 999))
+    overhead = prompt_tokens - chunk_tokens
+    print(f"{prompt_tokens} prompt tokens per call, {overhead} of them instructions")
+    results = []
+    for pages in pages_list:
+        text = synthetic_report(pages)
+        chunks = apply_token_budget(split_into_chunks(text, chunk_tokens), token_budget,
+                                    overhead=overhead, max_tokens=chunk_tokens)
+        sent = sum(count_tokens(c) + overhead for c in chunks)
+        for parallelism in parallelism_list:
+            start = time.perf_counter()
+            analysis = analyze_in_chunks(chunks, stub_analyzer(latency, per_token), ELEMENTS, max_workers=parallelism)
+            elapsed = time.perf_counter() - start
+            results.append({
+                'prompt_tokens_per_call': prompt_tokens,
+                'pages': pages,
+                'chars': len(text),
+                'chunks': len(chunks),
+                'prompt_tokens': sent,
+                'parallelism': parallelism,
+                'seconds': round(elapsed, 3),
+                'exists': analysis['summary']['exists']
+            })
+            print(f"{pages:>5} pages  {len(chunks):>4} calls  {sent:>7} prompt tokens  parallelism {parallelism:>2}  "
+                  f"{elapsed:7.3f}s  {analysis['summary']['exists']}/{len(ELEMENTS)} elements found")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[2, 10, 60, 200])
+    parser.add_argument('--parallelism', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--prompt-tokens', type=int, nargs='+', default=[1100, 16000],
+                        help='prompt tokens per call (PROMPT_TOKEN_BUDGET)')
+    parser.add_argument('--token-budget', type=int, default=60000, help='prompt tokens per analysis (ANALYSIS_TOKEN_BUDGET)')
+    parser.add_argument('--latency', type=float, default=0.2, help='stub LLM latency per call (s)')
+    parser.add_argument('--per-token', type=float, default=0.00005, help='stub LLM cost per prompt token (s)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for prompt_tokens in args.prompt_tokens:
+        results.extend(run(args.pages, args.parallelism, prompt_tokens, args.token_budget, args.latency, args.per_token))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
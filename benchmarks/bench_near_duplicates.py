@@ -0,0 +1,130 @@
+"""Near-duplicate lookup time and accuracy as the corpus grows.
+
+Fills a MinHash LSH index with ``--documents`` synthetic reports (Zipf word
+distribution) and, at every checkpoint size, times lookups of edited copies
+of stored documents and of unrelated new documents.  Lookup time should
+stay roughly flat while the corpus grows by orders of magnitude.  Recall is
+reported per edit rate (share of words replaced), together with the true
+Jaccard similarity of the copies at that rate.
+
+    python benchmarks/bench_near_duplicates.py --documents 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import make_vocabulary
+from load_test import percentile
+from near_duplicates import NearDuplicateIndex, shingle_hashes
+
+EDIT_RATES = [0.01, 0.03, 0.05, 0.1, 0.2]
+
+
+def make_words(rng, vocabulary, count):
+    words, cumulative = vocabulary
+    return rng.choices(words, cum_weights=cumulative, k=count)
+
+
+def edit(rng, vocabulary, words, rate):
+    """Replace ``rate`` of the words with random ones."""
+    edited = list(words)
+    for i in rng.sample(range(len(edited)), max(1, int(rate * len(edited)))):
+        edited[i] = make_words(rng, vocabulary, 1)[0]
+    return edited
+
+
+def jaccard(a, b):
+    a, b = shingle_hashes(a), shingle_hashes(b)
+    return len(a & b) / len(a | b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=400, help='words per document')
+    parser.add_argument('--vocabulary', type=int, default=30000)
+    parser.add_argument('--queries', type=int, default=100, help='lookups per edit rate and checkpoint')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    checkpoints = sorted({n for n in (1000, 10000, 100000, args.documents) if n <= args.documents})
+    results = {'documents': args.documents, 'words': args.words, 'checkpoints': []}
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(os.path.join(directory, 'near_duplicates.sqlite3'))
+        stored = []  # word lists of a sample of stored documents, to make copies of
+        signature_seconds = 0.0
+        insert_seconds = 0.0
+        count = 0
+        for checkpoint in checkpoints:
+            batch = []
+            while count < checkpoint:
+                words = make_words(rng, vocabulary, args.words)
+                if len(stored) < 2000 or rng.random() < 0.01:
+                    stored.append(words)
+                start = time.perf_counter()
+                batch.append((f"doc-{count}", index.signature(' '.join(words))))
+                signature_seconds += time.perf_counter() - start
+                count += 1
+            start = time.perf_counter()
+            index.add_many(batch)
+            insert_seconds += time.perf_counter() - start
+
+            point = {'documents': checkpoint, 'edit_rates': {}}
+            for rate in EDIT_RATES:
+                timings, found, similarity = [], 0, []
+                for _ in range(args.queries):
+                    original = rng.choice(stored)
+                    copy = ' '.join(edit(rng, vocabulary, original, rate))
+                    signature = index.signature(copy)
+                    start = time.perf_counter()
+                    matches = index.query(signature)
+                    timings.append(time.perf_counter() - start)
+                    found += bool(matches)
+                    similarity.append(jaccard(' '.join(original), copy))
+                point['edit_rates'][rate] = {
+                    'recall': found / args.queries,
+                    'jaccard': round(sum(similarity) / len(similarity), 3),
+                    'p50_ms': round(1000 * percentile(timings, 50), 3),
+                    'p95_ms': round(1000 * percentile(timings, 95), 3)
+                }
+
+            timings, false_positives = [], 0
+            for _ in range(args.queries):
+                signature = index.signature(' '.join(make_words(rng, vocabulary, args.words)))
+                start = time.perf_counter()
+                false_positives += bool(index.query(signature))
+                timings.append(time.perf_counter() - start)
+            point['unrelated'] = {
+                'false_positives': false_positives,
+                'p50_ms': round(1000 * percentile(timings, 50), 3),
+                'p95_ms': round(1000 * percentile(timings, 95), 3)
+            }
+            results['checkpoints'].append(point)
+
+            print(f"{checkpoint:>7} documents  unrelated lookup p50 {point['unrelated']['p50_ms']:.2f}ms "
+                  f"p95 {point['unrelated']['p95_ms']:.2f}ms  false positives {false_positives}/{args.queries}")
+            for rate, r in point['edit_rates'].items():
+                print(f"          {rate:>4.0%} edited (Jaccard {r['jaccard']:.2f}): recall {r['recall']:.2f}  "
+                      f"lookup p50 {r['p50_ms']:.2f}ms p95 {r['p95_ms']:.2f}ms")
+
+        results['signature_ms'] = round(1000 * signature_seconds / count, 3)
+        results['insert_ms'] = round(1000 * insert_seconds / count, 3)
+        print(f"signature {results['signature_ms']:.2f}ms/document, insert {results['insert_ms']:.3f}ms/document")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark PDF text extraction: the original page loop vs. the extraction engine.
+
+Synthetic PDFs of 10/100/500 pages are generated on the fly (plain text pages
+in Helvetica), so the benchmark needs nothing beyond PyPDF2.
+
+    python benchmarks/bench_pdf_extraction.py --pages 10 100 500 --repeat 3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PyPDF2
+
+from extraction import extract_pdf_text, get_pool, shutdown_pool
+
+WORDS = ('load pressure valve flow design test sample result measure system '
+         'analysis failure margin stress thermal report data model').split()
+
+
+def make_pdf(path, pages, lines_per_page=45, seed=0, title=None):
+    """Write a minimal, valid PDF with ``pages`` pages of random text, optionally headed by ``title``."""
+    rng = random.Random(seed)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once the page ids are known
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    page_ids = []
+    for _ in range(pages):
+        lines = [' '.join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+        if title and not page_ids:
+            lines[0] = title
+        body = 'BT /F1 10 Tf 12 TL 50 780 Td ' + ' '.join(f'({line}) Tj T*' for line in lines) + ' ET'
+        stream = body.encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b' '.join(b'%d 0 R' % i for i in page_ids)
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, pages)
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, obj)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def legacy_extract(file_path):
+    """The original extract_text_from_pdf loop from app.py."""
+    text = ""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in pdf_reader.pages:
+            text += page.extract_text() + "\n"
+    return text
+
+
+def best_of(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--early-stop-chars', type=int, default=60000,
+                        help='max_chars used for the early-stop measurement')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    get_pool()  # start workers up front so pool start-up is not timed
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f'synthetic_{pages}.pdf')
+            make_pdf(path, pages)
+
+            legacy, legacy_text = best_of(lambda: legacy_extract(path), args.repeat)
+            engine, engine_text = best_of(lambda: extract_pdf_text(path), args.repeat)
+            early, _ = best_of(lambda: extract_pdf_text(path, max_chars=args.early_stop_chars), args.repeat)
+
+            assert engine_text == legacy_text, 'engine output differs from the original loop'
+            results.append({
+                'pages': pages,
+                'legacy_seconds': round(legacy, 4),
+                'engine_seconds': round(engine, 4),
+                'early_stop_seconds': round(early, 4),
+                'speedup': round(legacy / engine, 2) if engine else None
+            })
+            print(f"{pages:>4} pages  legacy {legacy:7.3f}s  engine {engine:7.3f}s  "
+                  f"early-stop {early:7.3f}s  speedup x{legacy / engine:.2f}")
+    shutdown_pool()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Compare the legacy f-string prompt with the compiled, token-budgeted prompt.
+
+For a synthetic long report this prints, per builder: build time, prompt
+tokens, how many section headings the document excerpt keeps, and the
+prefix (in tokens) that two requests share, which is the part that
+provider-side prompt caching can reuse.
+
+    python benchmarks/bench_prompt_builder.py --sections 40
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import is_heading
+from prompts import build_prompt, compile_template, count_tokens
+
+WORDS = ('load pressure valve flow design test sample result measure system '
+         'analysis failure margin stress thermal report data model').split()
+TYPES = {
+    'Lessons Learned': ['Project Background', 'Problem Statement', 'What Went Well', 'What Went Wrong',
+                        'Root Cause Analysis', 'Lessons Learned', 'Action Items'],
+    'Engineering Report': ['Title Page', 'Abstract', 'Introduction', 'Methodology', 'Results and Analysis',
+                           'Discussion', 'Conclusions', 'Recommendations', 'References'],
+}
+
+
+def make_report(sections, seed):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(1, sections + 1):
+        lines.append(f"{i}. Section {i} {rng.choice(WORDS).title()}")
+        for _ in range(rng.randint(3, 8)):
+            lines.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))) + '.')
+    return '\n'.join(lines)
+
+
+def legacy_prompt(title, elements, content, part=None):
+    """The prompt as analyze_with_chatgpt used to build it."""
+    part_note = ''
+    if part is not None:
+        part_note = (f"The content below is part {part[0] + 1} of {part[1]} of the document. "
+                     "Judge each element only on this part; mark elements not covered here as MISSING.")
+    prompt = f"""
+        Analyze this {title} document and evaluate the following required elements.
+        {part_note}
+        For each element, determine its status: EXISTS (complete and well-documented), PARTIAL (present but needs improvement), or MISSING (completely absent).
+
+        Required Elements to Check:
+        {chr(10).join([f"- {elem}" for elem in elements])}
+
+        For each element, provide:
+        1. Status (EXISTS, PARTIAL, or MISSING)
+        2. Brief description of what you found (or what's missing)
+        3. Specific action needed to improve (if PARTIAL or MISSING)
+
+        Also provide:
+        - Overall quality score (0-100)
+        - 3-5 overall recommendations for the document
+
+        Format your response as JSON:
+        {{
+            "elements": [
+                {{
+                    "name": "Element Name",
+                    "status": "EXISTS|PARTIAL|MISSING",
+                    "description": "What was found or what's missing",
+                    "action": "What needs to be done (if applicable)"
+                }}
+            ],
+            "quality_score": 75,
+            "recommendations": ["Recommendation 1", "Recommendation 2"]
+        }}
+
+        Document Content:
+        {content[:4000]}
+        """
+    system = ("You are a technical document analyst. Analyze documents by evaluating the presence and "
+              "quality of required elements. Always respond with valid JSON.")
+    return system, prompt
+
+
+def compiled_prompt(title, elements, content, part=None, budget=1100):
+    return build_prompt({'title': title}, elements, content, budget, part=part)
+
+
+def shared_prefix_tokens(a, b):
+    """Tokens in the common prefix of two (system, user) prompts sent as one message sequence."""
+    a, b = a[0] + '\n' + a[1], b[0] + '\n' + b[1]
+    n = 0
+    limit = min(len(a), len(b))
+    while n < limit and a[n] == b[n]:
+        n += 1
+    return count_tokens(a[:n])
+
+
+def headings_kept(text, prompt):
+    headings = [line.strip() for line in text.split('\n') if is_heading(line)]
+    kept = set(line.strip() for line in prompt.split('\n'))
+    return sum(1 for h in headings if h in kept), len(headings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=40)
+    parser.add_argument('--budget', type=int, default=1100, help='prompt token budget for the compiled builder')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    doc_a, doc_b = make_report(args.sections, 1), make_report(args.sections, 2)
+    (title, elements), (other_title, other_elements) = TYPES.items()
+    builders = {
+        'legacy': legacy_prompt,
+        'compiled': lambda *a, **kw: compiled_prompt(*a, budget=args.budget, **kw)
+    }
+
+    results = []
+    print(f"document: {args.sections} sections, {count_tokens(doc_a)} tokens")
+    for name, build in builders.items():
+        compile_template.cache_clear()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            prompt = build(title, elements, doc_a)
+        build_us = 1e6 * (time.perf_counter() - start) / args.repeat
+        kept, total = headings_kept(doc_a, prompt[1])
+        result = {
+            'builder': name,
+            'build_us': round(build_us, 1),
+            'prompt_tokens': count_tokens(prompt[0] + prompt[1]),
+            'headings_kept': kept,
+            'headings_total': total,
+            'shared_prefix_same_type': shared_prefix_tokens(prompt, build(title, elements, doc_b)),
+            'shared_prefix_other_part': shared_prefix_tokens(
+                build(title, elements, doc_a, part=(0, 3)), build(title, elements, doc_a, part=(1, 3))),
+            'shared_prefix_other_type': shared_prefix_tokens(prompt, build(other_title, other_elements, doc_a))
+        }
+        results.append(result)
+        print(f"{name:<9} build {result['build_us']:8.1f}us  {result['prompt_tokens']:5} tokens  "
+              f"headings {kept}/{total}  shared prefix: same type {result['shared_prefix_same_type']}, "
+              f"other part {result['shared_prefix_other_part']}, other type {result['shared_prefix_other_type']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
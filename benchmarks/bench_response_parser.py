@@ -0,0 +1,117 @@
+"""Benchmark response parsing on a corpus of malformed analysis responses.
+
+``malformed_responses.jsonl`` holds responses in the shapes the model
+actually produces when it goes wrong: markdown fences and prose around the
+JSON, output cut off at max_tokens, trailing commas, Python literals, loose
+statuses and scores, missing fields and elements, refusals.  For every case
+the legacy fence-splitting + ``json.loads`` path is compared with the
+tolerant parser: whether the response was usable, how many element fields
+were recovered (the rest would go to a repair request), parse time, and how
+early the first element comes out of the streaming parser.
+
+    python benchmarks/bench_response_parser.py
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stream_parser import ElementStreamParser, parse_analysis, validate_analysis
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'malformed_responses.jsonl')
+
+
+def legacy_parse(result):
+    """The original fence splitting from analyze_with_chatgpt."""
+    if '```json' in result:
+        result = result.split('```json')[1].split('```')[0].strip()
+    elif '```' in result:
+        result = result.split('```')[1].split('```')[0].strip()
+    data = json.loads(result)
+    # The summary computation that followed needs every element to have a status
+    [e['status'].upper() for e in data['elements']]
+    return data
+
+
+def legacy_usable(response):
+    try:
+        legacy_parse(response)
+        return True
+    except Exception:
+        return False
+
+
+def tolerant_parse(response, elements):
+    return validate_analysis(parse_analysis(response), elements)
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def first_element_chunk(response, chunk_size):
+    """Index of the chunk that completes the first element, and the chunk count."""
+    parser = ElementStreamParser()
+    chunks = [response[i:i + chunk_size] for i in range(0, len(response), chunk_size)]
+    for index, chunk in enumerate(chunks):
+        if parser.feed(chunk):
+            return index + 1, len(chunks)
+    return None, len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=16, help='characters per simulated stream chunk')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with open(CORPUS, 'r', encoding='utf-8') as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    results = []
+    print(f"{'case':<28} {'legacy':>6} {'fields':>9} {'repair':>6} {'legacy us':>10} {'tolerant us':>12} {'1st element':>12}")
+    for case in cases:
+        response, elements = case['response'], case['elements']
+        _, missing = tolerant_parse(response, elements)
+        total_fields = 3 * len(elements) + 2
+        to_repair = sum(len(fields) for fields in missing.values())
+        first, chunks = first_element_chunk(response, args.chunk_size)
+        result = {
+            'case': case['name'],
+            'legacy_usable': legacy_usable(response),
+            'fields_recovered': total_fields - to_repair,
+            'fields_total': total_fields,
+            'fields_to_repair': to_repair,
+            'legacy_us': round(1e6 * time_per_call(lambda: legacy_usable(response), args.repeat), 1),
+            'tolerant_us': round(1e6 * time_per_call(lambda: tolerant_parse(response, elements), args.repeat), 1),
+            'first_element_chunk': first,
+            'chunks': chunks
+        }
+        results.append(result)
+        print(f"{result['case']:<28} {'ok' if result['legacy_usable'] else 'FAIL':>6} "
+              f"{result['fields_recovered']:>4}/{result['fields_total']:<4} {to_repair:>6} "
+              f"{result['legacy_us']:>10} {result['tolerant_us']:>12} "
+              f"{f'{first}/{chunks}' if first else '-':>12}")
+
+    usable = sum(r['legacy_usable'] for r in results)
+    recovered = sum(r['fields_recovered'] for r in results)
+    total = sum(r['fields_total'] for r in results)
+    print(f"\nlegacy: {usable}/{len(results)} responses usable (the rest fell back to the default analysis)")
+    print(f"tolerant: {recovered}/{total} fields recovered without a new request "
+          f"({sum(1 for r in results if r['fields_to_repair'] == 0)}/{len(results)} responses complete, "
+          f"the others need a repair request for the missing fields only)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
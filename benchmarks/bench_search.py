@@ -0,0 +1,127 @@
+"""Index and search a synthetic knowledge base of analysed documents.
+
+Builds a knowledge base of ``--documents`` generated reports in a temporary
+directory, then reports the indexing rate, the database size and, per search
+mode, p50/p95 query latency over a mix of one-word, multi-word and
+prefix queries.  Words follow a Zipf distribution over ``--vocabulary``
+words, as in real text; query words skip the most frequent ranks, which in
+real documents are stopwords nobody searches for.
+
+    python benchmarks/bench_search.py --documents 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_base import SEARCH_MODES, KnowledgeBase, local_embedder
+from load_test import percentile
+
+WORDS = ('load pressure valve flow design test sample result measure system analysis failure margin '
+         'stress thermal report data model pump impeller cavitation seal bearing vibration corrosion '
+         'weld fatigue crack inspection torque shaft coupling alignment lubricant gasket flange '
+         'turbine compressor nozzle heat exchanger fouling scaling calibration sensor').split()
+SYLLABLES = 'ka lo mi ne ru sa te vo pi da gu ber tan dor mel fis'.split()
+ELEMENTS = ['Abstract', 'Introduction', 'Methodology', 'Results and Analysis', 'Discussion',
+            'Conclusions', 'Recommendations', 'References']
+
+
+def make_vocabulary(rng, size):
+    """Domain words first, then made-up words, with Zipf weights by rank."""
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    rng.shuffle(words)
+    cumulative = []
+    total = 0.0
+    for rank in range(1, size + 1):
+        total += 1 / rank
+        cumulative.append(total)
+    return words, cumulative
+
+
+def make_document(rng, vocabulary, paragraphs):
+    words, cumulative = vocabulary
+    lines = []
+    for i, element in enumerate(ELEMENTS[:paragraphs], start=1):
+        lines.append(f"{i}. {element}")
+        lines.append(' '.join(rng.choices(words, cum_weights=cumulative, k=rng.randint(60, 180))) + '.')
+    return '\n'.join(lines)
+
+
+def make_analysis(rng):
+    elements = [{'name': e, 'status': rng.choice(['EXISTS', 'PARTIAL', 'MISSING'])} for e in ELEMENTS]
+    return {'elements': elements, 'quality_score': rng.randint(30, 95), 'summary': {}, 'analyzed_at': None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument('--vocabulary', type=int, default=30000, help='distinct words in the corpus')
+    parser.add_argument('--queries', type=int, default=200, help='queries per search mode')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    embedder = local_embedder()
+    modes = SEARCH_MODES if embedder else ('text',)
+    results = {'documents': args.documents, 'vectors': embedder is not None, 'modes': {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        kb = KnowledgeBase(os.path.join(directory, 'knowledge.sqlite3'), embedder=embedder)
+        start = time.perf_counter()
+        for i in range(args.documents):
+            doc_type = rng.choice(['engineeringReport', 'lessonsLearned'])
+            kb.add(f"{i:064x}", make_document(rng, vocabulary, rng.randint(3, 8)), f"report-{i}.pdf",
+                   doc_type, make_analysis(rng))
+        elapsed = time.perf_counter() - start
+        stats = kb.stats()
+        results.update(index_seconds=round(elapsed, 3), docs_per_second=round(args.documents / elapsed, 1),
+                       bytes=stats['bytes'])
+        print(f"indexed {args.documents} documents in {elapsed:.1f}s "
+              f"({args.documents / elapsed:.0f}/s), {stats['bytes'] / 1e6:.1f} MB")
+
+        queries = []
+        for _ in range(args.queries):
+            words = rng.sample(vocabulary[0][50:2000], rng.choice([1, 2, 3]))
+            if rng.random() < 0.3:
+                words[-1] = words[-1][:4]  # typed so far
+            queries.append(' '.join(words))
+
+        for mode in modes:
+            kb.search(queries[0], limit=args.limit, mode=mode)  # loads the vector index
+            timings = []
+            hits = 0
+            for query in queries:
+                start = time.perf_counter()
+                found = kb.search(query, limit=args.limit, mode=mode)
+                timings.append(time.perf_counter() - start)
+                hits += bool(found)
+            result = {
+                'p50_ms': round(1000 * percentile(timings, 50), 3),
+                'p95_ms': round(1000 * percentile(timings, 95), 3),
+                'queries_with_hits': hits
+            }
+            results['modes'][mode] = result
+            print(f"{mode:<7} p50 {result['p50_ms']:7.2f}ms  p95 {result['p95_ms']:7.2f}ms  "
+                  f"hits {hits}/{len(queries)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Serving a share link: precomputed artifacts vs. rendering per request.
+
+Runs the wizard once against the mock backend (in a temporary working
+directory), creates a share link and then opens it ``--requests`` times
+from ``--users`` concurrent threads per variant: plain, gzip and brotli
+(when installed) downloads, revalidations answered with 304, and, for
+comparison, rendering and gzipping the page on every request as a share
+view without artifacts would.
+
+    python benchmarks/bench_share.py --requests 2000 --users 8
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import percentile
+
+
+def hammer(request, requests, users):
+    """Call ``request()`` ``requests`` times from ``users`` threads; return timings and elapsed seconds."""
+    timings = []
+    lock = threading.Lock()
+    per_user = requests // users
+
+    def user():
+        local = []
+        for _ in range(per_user):
+            start = time.perf_counter()
+            request()
+            local.append(time.perf_counter() - start)
+        with lock:
+            timings.extend(local)
+
+    threads = [threading.Thread(target=user) for _ in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='requests per variant')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    results = {'requests': args.requests, 'users': args.users, 'variants': {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        os.environ.update({'ANALYSIS_BACKEND': 'mock', 'ANALYSIS_MODE': 'llm', 'MOCK_LATENCY': '0',
+                           'LOG_LEVEL': 'WARNING'})
+        import app as webapp
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+        @webapp.app.route('/bench/render/<share_id>')
+        def render_share(share_id):
+            # What a share view without artifacts costs: template rendering and compression per request
+            with open(webapp.share_store.path(share_id, 'share.json'), 'r', encoding='utf-8') as f:
+                document = json.load(f)
+            page = webapp.render_template('share.html', **document, json_url='')
+            return webapp.Response(gzip.compress(page.encode('utf-8')), mimetype='text/html',
+                                   headers={'Content-Encoding': 'gzip'})
+
+        client = webapp.app.test_client()
+        client.post('/api/select-type', data={'type': 'engineeringReport'})
+        text = '\n\n'.join(f"{element}\n" + 'The pump seal failed under cyclic thermal load. ' * 40
+                           for element in webapp.KNOWLEDGE_TYPES['engineeringReport']['elements'][:5])
+        client.post('/api/save-editor-content', json={'text': text, 'content': text})
+        for path in ('/api/analyze', '/api/enhance'):
+            job = client.post(path).get_json()
+            while client.get(job['status_url']).get_json()['status'] not in ('done', 'failed'):
+                time.sleep(0.01)
+        share_id = client.post('/api/share').get_json()['share_info']['share_id']
+        url = f"/s/{share_id}"
+
+        # Colleagues opening the link have no session
+        viewer = webapp.app.test_client(use_cookies=False)
+        etag = viewer.get(url, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+        variants = {
+            'plain': lambda: viewer.get(url),
+            'gzip': lambda: viewer.get(url, headers={'Accept-Encoding': 'gzip'}),
+            'revalidate (304)': lambda: viewer.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}),
+            'render per request': lambda: viewer.get(f"/bench/render/{share_id}")
+        }
+        if 'br' in webapp.share_store.encodings:
+            variants['brotli'] = lambda: viewer.get(url, headers={'Accept-Encoding': 'br'})
+
+        for name, request in variants.items():
+            request()
+            timings, elapsed = hammer(request, args.requests, args.users)
+            result = {
+                'requests_per_second': round(len(timings) / elapsed, 1),
+                'p50_ms': round(1000 * percentile(timings, 50), 3),
+                'p95_ms': round(1000 * percentile(timings, 95), 3)
+            }
+            results['variants'][name] = result
+            print(f"{name:<20} {result['requests_per_second']:>8.0f} req/s  "
+                  f"p50 {result['p50_ms']:6.2f}ms  p95 {result['p95_ms']:6.2f}ms")
+        results['bytes'] = {
+            'plain': len(viewer.get(url).data),
+            'gzip': len(viewer.get(url, headers={'Accept-Encoding': 'gzip'}).data)
+        }
+        print(f"page {results['bytes']['plain']} bytes, {results['bytes']['gzip']} gzipped")
+        os.chdir(cwd)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Load-test the Flask app end to end and compare analysis backends.
+
+The app is served by a threaded werkzeug server on a free local port.  Each
+virtual user runs the wizard flow (select type, save editor content, queue
+an analysis, poll until it finishes) in a loop with its own session cookie.
+Every document is unique, so the analysis cache never answers for the
+backend.  With the mock backend this runs fully offline; real providers can
+be compared on latency and tokens with small request counts:
+
+    python benchmarks/load_test.py --backends mock --users 50 --duration 20
+    python benchmarks/load_test.py --backends mock openai gemini --users 2 --duration 30
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import logging
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ('load pressure valve flow design test sample result measure system '
+         'analysis failure margin stress thermal report data model lesson').split()
+HEADINGS = ['Project Background', 'What Went Well', 'What Went Wrong', 'Lessons Learned', 'Action Items']
+
+
+def make_document(rng):
+    sections = []
+    for heading in rng.sample(HEADINGS, 3):
+        sections.append(heading)
+        sections.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))))
+    return '\n'.join(sections)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+class VirtualUser:
+    """One browser session walking through the wizard."""
+
+    def __init__(self, base_url, seed):
+        self.base_url = base_url
+        self.rng = random.Random(seed)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def call(self, method, path, payload=None, timings=None, form=None, label=None):
+        if form is not None:
+            data, content_type = urllib.parse.urlencode(form).encode(), 'application/x-www-form-urlencoded'
+        else:
+            data, content_type = json.dumps(payload).encode() if payload is not None else None, 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': content_type})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=120) as resp:
+                body = json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            body = json.loads(e.read() or b'{}')
+            body['http_status'] = e.code
+        if timings is not None:
+            timings.setdefault(label or path, []).append(time.perf_counter() - start)
+        return body
+
+    def run_flow(self, timings, poll_interval):
+        text = make_document(self.rng)
+        self.call('POST', '/api/select-type', timings=timings, form={'type': 'lessonsLearned'})
+        self.call('POST', '/api/save-editor-content', {'content': text, 'text': text}, timings)
+        queued = self.call('POST', '/api/analyze', {}, timings)
+        if not queued.get('success'):
+            return 'rejected' if queued.get('http_status') == 503 else 'failed'
+        while True:
+            status = self.call('GET', queued['status_url'], timings=timings, label='/api/analyze/<job_id>')
+            if status.get('status') == 'done':
+                return 'done'
+            if status.get('status') == 'failed' or 'http_status' in status:
+                return 'failed'
+            time.sleep(poll_interval)
+
+
+def run_load(base_url, users, duration, poll_interval):
+    timings = {}
+    flows = []
+    outcomes = {'done': 0, 'failed': 0, 'rejected': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        user = VirtualUser(base_url, index)
+        local_timings = {}
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            outcome = user.run_flow(local_timings, poll_interval)
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == 'done':
+                    flows.append(time.perf_counter() - start)
+        with lock:
+            for name, values in local_timings.items():
+                timings.setdefault(name, []).extend(values)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(users)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return timings, flows, outcomes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', nargs='+', default=['mock'], help='mock, openai and/or gemini')
+    parser.add_argument('--users', type=int, default=50, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per backend')
+    parser.add_argument('--mock-latency', type=float, default=0.2, help='seconds per mock backend call')
+    parser.add_argument('--workers', type=int, default=32, help='analysis job workers')
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    os.environ['ANALYSIS_MODE'] = 'llm'  # every element goes to the backend under test
+    os.environ['ANALYSIS_WORKERS'] = str(args.workers)
+    os.environ['MOCK_LATENCY'] = str(args.mock_latency)
+
+    from werkzeug.serving import make_server
+    import app as webapp
+    from providers import create_backend
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, webapp.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = []
+    for name in args.backends:
+        webapp.app.config['ANALYSIS_BACKEND'] = name
+        webapp.analysis_backend = create_backend(webapp.app, webapp.llm_clients)
+        if not webapp.analysis_backend.configured:
+            print(f"{name}: skipped ({webapp.analysis_backend.missing_config_message})")
+            continue
+
+        timings, flows, outcomes, elapsed = run_load(base_url, args.users, args.duration, args.poll_interval)
+        requests_made = sum(len(v) for v in timings.values())
+        backend = webapp.analysis_backend.stats()
+        calls = backend['calls'] or 1
+        result = {
+            'backend': name,
+            'model': backend['model'],
+            'users': args.users,
+            'seconds': round(elapsed, 2),
+            'requests_per_second': round(requests_made / elapsed, 1),
+            'analyses_per_second': round(outcomes['done'] / elapsed, 2),
+            'outcomes': outcomes,
+            'flow_p50_ms': round(1000 * percentile(flows, 50), 1),
+            'flow_p95_ms': round(1000 * percentile(flows, 95), 1),
+            'flow_p99_ms': round(1000 * percentile(flows, 99), 1),
+            'endpoint_p95_ms': {k: round(1000 * percentile(v, 95), 1) for k, v in sorted(timings.items())},
+            'backend_avg_latency_ms': backend['avg_latency_ms'],
+            'prompt_tokens_per_call': round(backend['prompt_tokens'] / calls),
+            'completion_tokens_per_call': round(backend['completion_tokens'] / calls)
+        }
+        results.append(result)
+        print(f"{name:<7} {result['requests_per_second']:7.1f} req/s  {result['analyses_per_second']:6.2f} analyses/s  "
+              f"flow p50 {result['flow_p50_ms']:.0f}ms p95 {result['flow_p95_ms']:.0f}ms p99 {result['flow_p99_ms']:.0f}ms  "
+              f"backend {result['backend_avg_latency_ms']:.0f}ms  "
+              f"tokens {result['prompt_tokens_per_call']}+{result['completion_tokens_per_call']}  {outcomes}")
+        if flows:
+            print(f"        mean flow {1000 * statistics.mean(flows):.0f}ms, endpoint p95: {result['endpoint_p95_ms']}")
+
+    server.shutdown()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Answers ``POST /v1/chat/completions`` (plain and streamed) with a valid
+analysis JSON built from the "Required Elements to Check" list of the prompt, after an
+optional artificial latency.  Every ``--fail-every``-th request gets a 429 so
+retry handling can be exercised.  Point the app at it with:
+
+    python benchmarks/stub_openai.py --port 8900
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8900/v1 python app.py
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ELEMENT_BLOCK = re.compile(r'Required Elements to Check:\s*\n(.*?)(?:\n\s*\n|$)', re.DOTALL)
+ELEMENT_LINE = re.compile(r'^\s*- (.+)$', re.MULTILINE)
+STATUSES = ['EXISTS', 'PARTIAL', 'MISSING']
+
+
+def build_answer(prompt, seed):
+    rng = random.Random(seed)
+    block = ELEMENT_BLOCK.search(prompt)
+    elements = [
+        {
+            'name': name.strip(),
+            'status': rng.choice(STATUSES),
+            'description': f'Stub assessment of {name.strip()}.',
+            'action': f'Review the {name.strip()} section.'
+        }
+        for name in ELEMENT_LINE.findall(block.group(1) if block else '')
+    ]
+    return json.dumps({
+        'elements': elements,
+        'quality_score': rng.randint(40, 95),
+        'recommendations': ['Add supporting evidence', 'Tighten the summary', 'Cite standards']
+    })
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection pooling is visible
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json', chunks=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if status == 429:
+            self.send_header('Retry-After', '0.01')
+        self.end_headers()
+        if chunks is None:
+            self.wfile.write(body)
+            return
+        for chunk in chunks:
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(self.server.chunk_delay)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        number = next(self.server.counter)
+        self.server.requests += 1
+
+        if self.server.fail_every and number % self.server.fail_every == self.server.fail_every - 1:
+            self._send(429, json.dumps({'error': {'message': 'Rate limit (stub)', 'type': 'rate_limit'}}).encode())
+            return
+
+        time.sleep(self.server.latency)
+        prompt = '\n'.join(str(m.get('content', '')) for m in request.get('messages', []))
+        answer = build_answer(prompt, number)
+        base = {'id': f'stub-{number}', 'created': int(time.time()), 'model': request.get('model', 'stub')}
+        usage = {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(answer) // 4,
+                 'total_tokens': (len(prompt) + len(answer)) // 4}
+
+        if not request.get('stream'):
+            body = {**base, 'object': 'chat.completion', 'usage': usage, 'choices': [
+                {'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': answer}}
+            ]}
+            self._send(200, json.dumps(body).encode())
+            return
+
+        events = []
+        for i in range(0, len(answer), 40):
+            chunk = {**base, 'object': 'chat.completion.chunk', 'choices': [
+                {'index': 0, 'finish_reason': None, 'delta': {'content': answer[i:i + 40]}}
+            ]}
+            events.append(f'data: {json.dumps(chunk)}\n\n'.encode())
+        events.append(b'data: [DONE]\n\n')
+        self._send(200, b''.join(events), content_type='text/event-stream', chunks=events)
+
+
+def start_stub_server(port=0, latency=0.0, chunk_delay=0.0, fail_every=0):
+    """Start the stub in a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.chunk_delay = chunk_delay
+    server.fail_every = fail_every
+    server.counter = itertools.count()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local OpenAI chat completions stub')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before answering')
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help='seconds between streamed chunks')
+    parser.add_argument('--fail-every', type=int, default=0, help='answer every Nth request with 429')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.port, args.latency, args.chunk_delay, args.fail_every)
+    print(f"OpenAI stub listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Chunked map-reduce analysis for long documents.
+
+A single prompt only has room for the first few thousand characters of a
+document, so anything after page two used to be reported as MISSING.  Long
+documents are instead split into section-aware chunks that are analysed
+concurrently; the per-chunk element statuses are then merged, keeping the
+best status seen for every element.
+"""
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+logger = logging.getLogger(__name__)
+
+# Best status wins when the same element is judged in several chunks
+STATUS_RANK = {'MISSING': 0, 'PARTIAL': 1, 'EXISTS': 2}
+
+HEADING_PATTERN = re.compile(
+    r'^(\d+(\.\d+)*\.?\s+\S.*'        # numbered headings: "3.1 Methodology"
+    r'|[A-Z][A-Z0-9 &/,\-]{2,}'       # ALL CAPS headings
+    r'|[A-Z][\w\-/&]*(\s+(and|of|the|for|to|in|on|&|[A-Z][\w\-/&]*)){0,7})$'  # short Title Case lines
+)
+
+
+def is_heading(line):
+    """Return True if a line of extracted text looks like a section heading."""
+    line = line.strip()
+    if not line or len(line) > 80 or line.endswith(('.', ',', ';', ':')):
+        return False
+    return bool(HEADING_PATTERN.match(line))
+
+
+def split_sections(text):
+    """Split text into sections that each start at a heading-like line."""
+    sections = []
+    current = []
+    for line in text.splitlines():
+        if is_heading(line) and any(l.strip() for l in current):
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        sections.append('\n'.join(current))
+    return sections
+
+
+def _pieces(parts, max_tokens, count_tokens):
+    """Yield ``(text, tokens)`` for parts, cutting any still over ``max_tokens`` (one huge word) by characters."""
+    for part, tokens in parts:
+        tokens = count_tokens(part) if tokens is None else tokens
+        if tokens <= max_tokens:
+            yield part, tokens
+            continue
+        step = max(1, len(part) * max_tokens // (2 * tokens))
+        for i in range(0, len(part), step):
+            yield part[i:i + step], count_tokens(part[i:i + step])
+
+
+def _split_long_section(section, max_tokens, count_tokens):
+    """Split an oversized section on paragraph, then line, then word boundaries."""
+    pieces = []
+    current, current_tokens = '', 0
+    for paragraph in re.split(r'\n\s*\n|\n', section):
+        tokens = count_tokens(paragraph)
+        parts = [(paragraph, tokens)]
+        if tokens > max_tokens:
+            # Words vary in length, so aim for half-size pieces to keep every piece under the limit
+            words = paragraph.split(' ')
+            step = max(1, len(words) * max_tokens // (2 * tokens))
+            parts = [(' '.join(words[i:i + step]), None) for i in range(0, len(words), step)]
+        for part, tokens in _pieces(parts, max_tokens, count_tokens):
+            if current and current_tokens + tokens + 1 > max_tokens:
+                pieces.append(current)
+                current, current_tokens = '', 0
+            current = f"{current}\n{part}" if current else part
+            current_tokens += tokens + 1
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def sections_from_outline(text, outline):
+    """Cut text into sections using a stored heading outline (see artifacts.py)."""
+    if not outline:
+        return split_sections(text)
+    sections = []
+    if text[:outline[0]['start']].strip():
+        sections.append(text[:outline[0]['start']])
+    sections.extend(text[s['start']:s['end']] for s in outline)
+    return sections
+
+
+def split_into_chunks(text, max_tokens=1000, outline=None, model='gpt-4o-mini'):
+    """Group whole sections into chunks of at most ``max_tokens`` tokens.
+
+    Section boundaries come from ``outline`` (real DOCX headings) when
+    available and are guessed from heading-like lines otherwise.  Tokens are
+    counted with ``prompts.count_tokens``, the counter the prompt builder
+    packs with, so a chunk sized to a prompt's room is never cut down.
+    """
+    from prompts import count_tokens  # prompts imports this module
+
+    def count(piece):
+        return count_tokens(piece, model)
+
+    chunks = []
+    current, current_tokens = '', 0
+    sections = sections_from_outline(text, outline) if outline else split_sections(text)
+    for section in sections:
+        tokens = count(section)
+        pieces = [section] if tokens <= max_tokens else _split_long_section(section, max_tokens, count)
+        for piece in pieces:
+            tokens = tokens if len(pieces) == 1 else count(piece)
+            if current and current_tokens + tokens + 1 > max_tokens:
+                chunks.append(current)
+                current, current_tokens = '', 0
+            current = f"{current}\n{piece}" if current else piece
+            current_tokens += tokens + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def apply_token_budget(chunks, token_budget, overhead=0, max_tokens=None, model='gpt-4o-mini'):
+    """Fit chunked prompts into ``token_budget`` prompt tokens for the whole analysis.
+
+    Every chunk costs its own tokens plus ``overhead``, the instructions its
+    prompt repeats.  When they do not all fit, consecutive chunks are merged
+    into as many calls as the budget pays for (each at most ``max_tokens``
+    document tokens) and every merged call is packed with
+    ``prompts.pack_document``: all section headings and openings stay in,
+    cut on line and sentence boundaries, so the whole document stays covered
+    and no section loses just its tail.
+    """
+    from prompts import count_tokens, pack_document  # prompts imports this module
+
+    tokens = [count_tokens(c, model) for c in chunks]
+    if not token_budget or sum(tokens) + overhead * len(chunks) <= token_budget:
+        return chunks
+    max_tokens = max_tokens or max(tokens)
+    calls = max(1, min(len(chunks), token_budget // (max_tokens + overhead)))
+    room = min(max_tokens, token_budget // calls - overhead)
+    if room <= 0:
+        raise ValueError(f"A token budget of {token_budget} does not cover the {overhead} tokens of instructions")
+    return [
+        pack_document('\n'.join(chunks[i * len(chunks) // calls:(i + 1) * len(chunks) // calls]), room, model=model)
+        for i in range(calls)
+    ]
+
+
+def merge_chunk_analyses(analyses, expected_elements, weights=None):
+    """Reduce per-chunk analyses into one result with the best status per element.
+
+    The quality score is the mean of the chunk scores weighted by
+    ``weights`` (chunk lengths), so one strong chunk does not hide weak ones.
+    """
+    weights = weights or [1] * len(analyses)
+    usable = [(a, w) for a, w in zip(analyses, weights) if a and not a.get('fallback')]
+    if not usable:
+        return None
+
+    merged = {}
+    for analysis, _ in usable:
+        for element in analysis.get('elements', []):
+            name = element.get('name')
+            status = str(element.get('status', 'MISSING')).upper()
+            if name not in merged or STATUS_RANK.get(status, 0) > STATUS_RANK.get(merged[name]['status'], 0):
+                merged[name] = {**element, 'status': status}
+
+    # Keep the document type's element order; unknown names go last
+    order = {name: i for i, name in enumerate(expected_elements)}
+    elements = sorted(merged.values(), key=lambda e: order.get(e['name'], len(order)))
+
+    scores = [(a['quality_score'], w) for a, w in usable if isinstance(a.get('quality_score'), (int, float))]
+    recommendations = []
+    for analysis, _ in usable:
+        for rec in analysis.get('recommendations', []):
+            if rec not in recommendations:
+                recommendations.append(rec)
+
+    return {
+        'elements': elements,
+        'quality_score': round(sum(s * w for s, w in scores) / (sum(w for _, w in scores) or 1)) if scores else 0,
+        'recommendations': recommendations[:5],
+        'summary': {
+            'exists': sum(1 for e in elements if e['status'] == 'EXISTS'),
+            'partial': sum(1 for e in elements if e['status'] == 'PARTIAL'),
+            'missing': sum(1 for e in elements if e['status'] == 'MISSING')
+        },
+        'chunks': {'total': len(analyses), 'analyzed': len(usable)}
+    }
+
+
+def analyze_in_chunks(chunks, analyze_chunk, expected_elements, max_workers=4, on_chunk_done=None):
+    """Map ``analyze_chunk(text, index, total)`` over chunks and merge the results.
+
+    At most ``max_workers`` chunks are analysed at once.  ``on_chunk_done`` is
+    called with (finished_count, total) after every chunk.
+    """
+    total = len(chunks)
+    results = [None] * total
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+        futures = {executor.submit(analyze_chunk, chunk, i, total): i for i, chunk in enumerate(chunks)}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                logger.warning('Chunk analysis failed', extra={'chunk': futures[future] + 1, 'chunks': total, 'error': str(e)})
+            if on_chunk_done:
+                on_chunk_done(finished, total)
+    return merge_chunk_analyses(results, expected_elements, weights=[len(c) for c in chunks])
@@ -0,0 +1,141 @@
+"""AI enhancement of the sections an analysis found lacking.
+
+Only elements the analysis marked PARTIAL or MISSING are touched: a PARTIAL
+element whose section can be found is rewritten, everything else gets a new
+section drafted from the rest of the document.  Sections are independent,
+so they are requested concurrently (at most ``max_workers`` at a time) and
+handed to ``on_section`` as each one finishes.
+
+Generated sections are cached by document hash, element, the action asked
+for and the backend, so enhancing the same analysed document again only
+costs cache lookups.
+"""
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from heuristics import find_headings, match_score
+from prompts import count_tokens, pack_document
+
+
+logger = logging.getLogger(__name__)
+
+ENHANCEMENT_PROMPT_VERSION = '1'
+
+SYSTEM_PROMPT = """You are a technical writer improving knowledge documents. You write one section at a time, in the document's own voice and terminology.
+
+Write only the body of the requested section in Markdown: no section heading, no preamble and no notes about what you changed. Use facts from the document; where it lacks a fact the section needs, write a short [placeholder] for the author to fill in instead of inventing one."""
+
+# How a section is enhanced, by analysis status
+ENHANCE_KINDS = {'PARTIAL': 'rewrite', 'MISSING': 'generate'}
+SECTION_MATCH = 0.75  # same heading similarity the local detector accepts
+
+
+def enhancement_targets(analysis):
+    """The elements of ``analysis`` that need work, in report order."""
+    targets = []
+    for element in analysis.get('elements', []):
+        status = str(element.get('status', '')).upper()
+        if status in ENHANCE_KINDS:
+            targets.append({
+                'name': element['name'],
+                'status': status,
+                'kind': ENHANCE_KINDS[status],
+                'instruction': element.get('action') or ''
+            })
+    return targets
+
+
+def find_section(text, element, outline=None):
+    """Return the text of the section headed most like ``element``, or None."""
+    best_score, best = 0.0, None
+    for title, start, end in find_headings(text, outline):
+        score = match_score(title, element)
+        if score > best_score:
+            best_score, best = score, (start, end)
+    if best is None or best_score < SECTION_MATCH:
+        return None
+    return text[best[0]:best[1]].strip()
+
+
+def make_enhancement_key(content_hash, target, backend_id):
+    """Cache key for one enhanced section of one document."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([
+        content_hash, target['name'], target['kind'], target['instruction'],
+        backend_id, ENHANCEMENT_PROMPT_VERSION
+    ]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_section_prompt(doc_info, target, section, context, budget, model='gpt-4o-mini'):
+    """Return the user prompt for one section; ``section`` is None when generating."""
+    lines = [
+        f"Document type: {doc_info['title']}",
+        f"Section: {target['name']}"
+    ]
+    if target['instruction']:
+        lines.append(f"Reviewer's note: {target['instruction']}")
+    if section is not None:
+        lines.append('Rewrite the current section below so it fully covers the reviewer\'s note. '
+                     'Keep every fact it already states.')
+    else:
+        lines.append('The document has no such section. Draft it from the document below.')
+    header = '\n'.join(lines) + '\n\n'
+
+    available = budget - count_tokens(header, model)
+    if section is not None:
+        # The section itself matters most; the rest of the document is background
+        section_budget = max(available * 2 // 3, available - count_tokens(section, model))
+        current = pack_document(section, section_budget, model=model)
+        background = pack_document(context, available - count_tokens(current, model) - 20, model=model)
+        return f"{header}Current section:\n{current}\n\nRest of the document:\n{background}"
+    return f"{header}Document:\n{pack_document(context, available - 5, model=model)}"
+
+
+def local_draft(target):
+    """Placeholder section for when no analysis backend may be called."""
+    note = target['instruction'] or f"Describe the {target['name'].lower()} of this work."
+    return f"[{note}]"
+
+
+def enhance_sections(targets, enhance_target, max_workers=4, on_section=None):
+    """Map ``enhance_target(target)`` over targets concurrently.
+
+    Returns one section dict per target, in target order.  A target whose
+    call raises gets an empty ``text`` and an ``error``.  ``on_section`` is
+    called with (section, finished_count, total) as each one completes.
+    """
+    total = len(targets)
+    sections = [None] * total
+    if not total:
+        return sections
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+        futures = {executor.submit(enhance_target, target): i for i, target in enumerate(targets)}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            target = targets[index]
+            try:
+                section = future.result()
+            except Exception as e:
+                logger.warning('Section enhancement failed', extra={'element': target['name'], 'error': str(e)})
+                section = {**target, 'text': '', 'error': 'This section could not be enhanced; please try again.'}
+            sections[index] = section
+            if on_section:
+                on_section(section, finished, total)
+    return sections
+
+
+def summarize_improvements(sections):
+    """One line per enhanced section for the step 4 summary."""
+    improvements = []
+    for section in sections:
+        if section.get('error'):
+            continue
+        if section.get('source') == 'local':
+            verb = 'Outlined'
+        else:
+            verb = 'Rewrote' if section['kind'] == 'rewrite' else 'Added'
+        improvements.append(f"{verb} {section['name']}")
+    return improvements
@@ -0,0 +1,343 @@
+"""DOCX and PDF export of enhanced documents.
+
+The finished document follows the document type's order of elements: the
+enhanced text of every section the enhancement rewrote or drafted, and the
+original text of every other section found in the upload.
+
+DOCX exports start from the type's ``templateFile``, so its styles, page
+setup, headers and footers carry over.  A template heading that matches an
+element gets that element's text in place of the template's guidance;
+elements the template has no heading for are appended.  A missing or
+invalid template gives a plain document.
+
+PDF exports are written by a small built-in writer (Helvetica on US Letter
+pages) that needs no PDF library and writes page by page.  Its standard
+fonts only cover Windows-1252, so a document with other characters (CJK,
+Greek, most symbols) fails with a message pointing to the DOCX export
+instead of printing them as "?".
+
+Both are written to a file, never built in memory as one response body, and
+are cached by ``make_export_key`` so an unchanged document is built once.
+"""
+import hashlib
+import json
+import os
+import re
+import textwrap
+import zipfile
+
+from docx import Document
+from docx.opc.exceptions import PackageNotFoundError
+from docx.oxml.ns import qn
+
+from enhancement import SECTION_MATCH, find_section
+from heuristics import match_score
+
+
+EXPORT_VERSION = '2'
+
+EXPORT_FORMATS = {
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'pdf': 'application/pdf'
+}
+
+BULLET = re.compile(r'^\s*[-*•]\s+')
+MARKDOWN_HEADING = re.compile(r'^#{1,6}\s+')
+BOLD = re.compile(r'\*\*(.+?)\*\*')
+
+
+def export_sections(text, elements, enhanced, outline=None):
+    """Return ``[{'name', 'text', 'source'}]`` in element order.
+
+    ``source`` is 'enhanced' or 'original'; elements with neither an enhanced
+    nor an original section are left out.
+    """
+    rewritten = {s['name']: s['text'] for s in enhanced.get('sections', []) if s.get('text') and not s.get('error')}
+    sections = []
+    for element in elements:
+        if element in rewritten:
+            sections.append({'name': element, 'text': rewritten[element], 'source': 'enhanced'})
+            continue
+        section = find_section(text, element, outline)
+        if section:
+            # The section starts with its own heading line
+            body = section.split('\n', 1)[1].strip() if '\n' in section else ''
+            if body:
+                sections.append({'name': element, 'text': body, 'source': 'original'})
+    return sections
+
+
+def template_signature(template_path):
+    """Identifies a template file's version in export cache keys."""
+    try:
+        stat = os.stat(template_path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def make_export_key(fmt, doc_type, template_path, content_hash, enhanced, title, subtitle):
+    """Cache key of one export: the format, the template and everything the document is built from."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([
+        fmt, doc_type, template_signature(template_path), content_hash, title, subtitle,
+        [[s.get('name'), s.get('text'), s.get('error')] for s in enhanced.get('sections', [])],
+        EXPORT_VERSION
+    ]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def markdown_blocks(text):
+    """Split section text into ``(kind, text)`` blocks: 'heading', 'bullet' or 'paragraph'."""
+    blocks = []
+    paragraph = []
+    for line in text.split('\n'):
+        if not line.strip() or BULLET.match(line) or MARKDOWN_HEADING.match(line):
+            if paragraph:
+                blocks.append(('paragraph', ' '.join(paragraph)))
+                paragraph = []
+            if BULLET.match(line):
+                blocks.append(('bullet', BULLET.sub('', line).strip()))
+            elif MARKDOWN_HEADING.match(line):
+                blocks.append(('heading', MARKDOWN_HEADING.sub('', line).strip()))
+        else:
+            paragraph.append(line.strip())
+    if paragraph:
+        blocks.append(('paragraph', ' '.join(paragraph)))
+    return blocks
+
+
+def load_template(template_path):
+    """The type's template document, or a blank document when it is missing or not a valid DOCX."""
+    try:
+        return Document(template_path)
+    except (PackageNotFoundError, zipfile.BadZipFile, KeyError, OSError):
+        return Document()
+
+
+def _style(document, name):
+    try:
+        return document.styles[name]
+    except KeyError:
+        return None
+
+
+def _is_heading(paragraph):
+    return paragraph.style is not None and paragraph.style.name.startswith(('Heading', 'Title'))
+
+
+def _add_blocks(document, anchor, blocks, style_ids):
+    """Insert paragraphs for ``blocks`` after ``anchor`` (or at the end when None); return the last one.
+
+    ``style_ids`` maps block kinds to paragraph style ids, resolved once per
+    document since python-docx looks styles up by scanning the style part.
+    """
+    for kind, text in blocks:
+        paragraph = document.add_paragraph()
+        style_id = style_ids.get(kind)
+        if style_id:
+            paragraph._p.style = style_id
+        elif kind == 'bullet':
+            text = f"• {text}"
+        # **bold** spans become bold runs
+        for i, part in enumerate(BOLD.split(text)):
+            if part:
+                paragraph.add_run(part).bold = bool(i % 2) or None
+        if anchor is not None:
+            anchor._p.addnext(paragraph._p)
+        anchor = paragraph
+    return anchor
+
+
+def _clear_section(heading):
+    """Remove the body elements between ``heading`` and the next heading."""
+    element = heading._p.getnext()
+    while element is not None and element.tag != qn('w:sectPr'):
+        if element.tag == qn('w:p'):
+            style = element.find(f"{qn('w:pPr')}/{qn('w:pStyle')}")
+            if style is not None and style.get(qn('w:val'), '').startswith(('Heading', 'Title')):
+                break
+        following = element.getnext()
+        element.getparent().remove(element)
+        element = following
+
+
+def build_docx(path, template_path, title, subtitle, sections):
+    """Write the finished document to ``path`` from the template and ``sections``."""
+    document = load_template(template_path)
+    document.core_properties.title = title
+    headings = [p for p in document.paragraphs if _is_heading(p) and not p.style.name.startswith('Title')]
+
+    titles = [p for p in document.paragraphs if p.style.name.startswith('Title')]
+    if titles:
+        for run in titles[0].runs[1:]:
+            run.text = ''
+        if titles[0].runs:
+            titles[0].runs[0].text = title
+        else:
+            titles[0].add_run(title)
+    else:
+        # A blank document starts with the title; a template keeps its own opening
+        heading = document.add_heading(title, level=0) if _style(document, 'Title') else document.add_paragraph(title)
+        if document.paragraphs[0]._p is not heading._p:
+            document.paragraphs[0]._p.addprevious(heading._p)
+        subtitle_paragraph = document.add_paragraph(subtitle)
+        heading._p.addnext(subtitle_paragraph._p)
+
+    style_ids = {kind: style.style_id for kind, style in (
+        ('heading', _style(document, 'Heading 3')), ('bullet', _style(document, 'List Bullet'))
+    ) if style is not None}
+    used = set()
+    for section in sections:
+        best_score, best = 0.0, None
+        for i, heading in enumerate(headings):
+            if i in used:
+                continue
+            score = match_score(heading.text, section['name'])
+            if score > best_score:
+                best_score, best = score, i
+        blocks = markdown_blocks(section['text'])
+        if best is not None and best_score >= SECTION_MATCH:
+            used.add(best)
+            _clear_section(headings[best])
+            _add_blocks(document, headings[best], blocks, style_ids)
+        else:
+            document.add_heading(section['name'], level=1) if _style(document, 'Heading 1') \
+                else document.add_paragraph(section['name'])
+            _add_blocks(document, None, blocks, style_ids)
+    document.save(path)
+
+
+# Built-in PDF writer: US Letter, Helvetica; sizes in points
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 56
+FONTS = {'regular': 'F1', 'bold': 'F2'}
+PDF_STYLES = {
+    'title': ('bold', 20, 10),
+    'subtitle': ('regular', 11, 18),
+    'section': ('bold', 14, 8),
+    'heading': ('bold', 11, 4),
+    'paragraph': ('regular', 10, 6),
+    'bullet': ('regular', 10, 2)
+}
+
+
+def check_pdf_text(title, subtitle, sections):
+    """Raise ValueError if the document has characters the PDF fonts cannot show."""
+    unsupported = []
+    for text in [title, subtitle] + [part for s in sections for part in (s['name'], s['text'])]:
+        try:
+            text.encode('cp1252')
+            continue
+        except UnicodeEncodeError:
+            pass
+        for char in text:
+            if char not in unsupported:
+                try:
+                    char.encode('cp1252')
+                except UnicodeEncodeError:
+                    unsupported.append(char)
+    if unsupported:
+        sample = ' '.join(unsupported[:5]) + (' ...' if len(unsupported) > 5 else '')
+        raise ValueError(
+            f"The PDF export only supports Western European characters and this document "
+            f"contains others ({sample}). Export it as DOCX instead."
+        )
+
+
+def _pdf_text(text):
+    """Escape a line for a PDF string in WinAnsi (cp1252) encoding."""
+    data = BOLD.sub(r'\1', text).encode('cp1252')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _pdf_lines(title, subtitle, sections):
+    """Yield ``(font, size, indent, text, space_after)`` for every line of the document."""
+    blocks = [('title', title), ('subtitle', subtitle)]
+    for section in sections:
+        blocks.append(('section', section['name']))
+        blocks.extend(markdown_blocks(section['text']))
+    for kind, text in blocks:
+        font, size, space_after = PDF_STYLES[kind]
+        indent = 14 if kind == 'bullet' else 0
+        # Helvetica averages about half an em per character
+        width = int((PAGE_WIDTH - 2 * MARGIN - indent) / (size * 0.5))
+        lines = textwrap.wrap(text, width) or ['']
+        for i, line in enumerate(lines):
+            if kind == 'bullet' and i == 0:
+                line = f"• {line}"
+            yield font, size, indent, line, space_after if i == len(lines) - 1 else 0
+
+
+class _PdfFile:
+    """Writes numbered objects to a file and remembers their offsets for the xref table."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        f.write(b'%PDF-1.4\n')
+
+    def write(self, number, body):
+        self.offsets[number] = self.f.tell()
+        self.f.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def finish(self, root):
+        xref = self.f.tell()
+        count = max(self.offsets) + 1
+        self.f.write(b'xref\n0 %d\n0000000000 65535 f \n' % count)
+        for number in range(1, count):
+            self.f.write(b'%010d 00000 n \n' % self.offsets[number])
+        self.f.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (count, root, xref))
+
+
+def build_pdf(path, title, subtitle, sections):
+    """Write the finished document to ``path`` as a PDF, one page at a time."""
+    check_pdf_text(title, subtitle, sections)
+    with open(path, 'wb') as f:
+        pdf = _PdfFile(f)
+        # 1: catalog, 2: page tree (written last), 3 and 4: fonts; pages follow
+        pdf.write(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        pdf.write(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+        pdf.write(4, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+        pages = []
+        next_number = 5
+
+        def write_page(commands):
+            nonlocal next_number
+            stream = b'\n'.join(commands)
+            pdf.write(next_number, b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+            pdf.write(next_number + 1, (
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+                % (PAGE_WIDTH, PAGE_HEIGHT, next_number)
+            ))
+            pages.append(next_number + 1)
+            next_number += 2
+
+        commands = []
+        y = PAGE_HEIGHT - MARGIN
+        for font, size, indent, line, space_after in _pdf_lines(title, subtitle, sections):
+            leading = size * 1.35
+            if y - leading < MARGIN:
+                write_page(commands)
+                commands, y = [], PAGE_HEIGHT - MARGIN
+            y -= leading
+            commands.append(b'BT /%s %d Tf %d %.1f Td (%s) Tj ET' % (
+                FONTS[font].encode('ascii'), size, MARGIN + indent, y, _pdf_text(line)
+            ))
+            y -= space_after
+        write_page(commands)
+
+        kids = b' '.join(b'%d 0 R' % number for number in pages)
+        pdf.write(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(pages)))
+        pdf.finish(root=1)
+
+
+def build_export(fmt, path, template_path, title, subtitle, sections):
+    """Write an export of ``sections`` in ``fmt`` ('docx' or 'pdf') to ``path``."""
+    if fmt == 'docx':
+        build_docx(path, template_path, title, subtitle, sections)
+    elif fmt == 'pdf':
+        build_pdf(path, title, subtitle, sections)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
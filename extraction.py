@@ -0,0 +1,242 @@
+"""Text extraction engine for uploaded documents.
+
+PDF pages are extracted in contiguous batches on a shared process pool so a
+large report uses every core, and the text is collected in a list instead of
+being concatenated page by page.  Pages are yielded in order, which lets the
+caller stop as soon as it has gathered enough text.
+
+DOCX files are streamed straight from ``word/document.xml`` in one pass:
+paragraphs and table rows come out in document order together with the
+heading level of each paragraph, without building python-docx's object model.
+"""
+import os
+import re
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+
+# PDFs with fewer pages than this are cheaper to extract in-process
+PARALLEL_MIN_PAGES = 32
+PAGE_BATCH_SIZE = 16
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers=None):
+    """Return the process pool shared by all extractions, creating it on first use."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = workers or os.cpu_count() or 2
+            _pool = ProcessPoolExecutor(max_workers=_pool_workers)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _extract_page_range(file_path, start, stop):
+    """Extract pages [start, stop) of a PDF; runs inside a pool worker."""
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return [(reader.pages[i].extract_text() or '') for i in range(start, stop)]
+
+
+def iter_pdf_pages(file_path, max_pages=None, parallel=True):
+    """Yield the text of each PDF page in order.
+
+    Batches of pages are extracted on the process pool, a few batches ahead of
+    the consumer; closing the generator early cancels the batches not yet run.
+    """
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        page_count = len(reader.pages)
+        if max_pages:
+            page_count = min(page_count, max_pages)
+
+        workers = os.cpu_count() or 1
+        if not parallel or workers < 2 or page_count < PARALLEL_MIN_PAGES:
+            for i in range(page_count):
+                yield reader.pages[i].extract_text() or ''
+            return
+
+    pool = get_pool()
+    # Every batch re-opens the PDF in its worker, so use few, large batches
+    # (about four per worker) while keeping them small enough to stop early
+    batch_size = max(PAGE_BATCH_SIZE, -(-page_count // (_pool_workers * 4)))
+    batches = [(start, min(start + batch_size, page_count))
+               for start in range(0, page_count, batch_size)]
+    # Keep a couple of batches per worker in flight ahead of the consumer
+    window = max(2, _pool_workers * 2)
+    pending = []
+    try:
+        for start, stop in batches[:window]:
+            pending.append(pool.submit(_extract_page_range, file_path, start, stop))
+        next_batch = len(pending)
+        while pending:
+            pages = pending.pop(0).result()
+            if next_batch < len(batches):
+                start, stop = batches[next_batch]
+                pending.append(pool.submit(_extract_page_range, file_path, start, stop))
+                next_batch += 1
+            yield from pages
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def extract_pdf_pages(file_path, max_pages=None, max_chars=None, parallel=True):
+    """Return the list of page texts, stopping after ``max_pages`` or ``max_chars``."""
+    pages = []
+    total = 0
+    page_iter = iter_pdf_pages(file_path, max_pages=max_pages, parallel=parallel)
+    try:
+        for text in page_iter:
+            pages.append(text)
+            total += len(text) + 1
+            if max_chars and total >= max_chars:
+                break
+    finally:
+        page_iter.close()
+    return pages
+
+
+def extract_pdf_text(file_path, max_pages=None, max_chars=None, parallel=True):
+    """Extract the text of a PDF, stopping after ``max_pages`` or ``max_chars``."""
+    pages = extract_pdf_pages(file_path, max_pages=max_pages, max_chars=max_chars, parallel=parallel)
+    pages.append('')
+    return '\n'.join(pages)
+
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_P = W_NS + 'p'
+W_TBL = W_NS + 'tbl'
+W_TR = W_NS + 'tr'
+W_TC = W_NS + 'tc'
+W_T = W_NS + 't'
+W_TAB = W_NS + 'tab'
+W_BR = W_NS + 'br'
+W_VAL = W_NS + 'val'
+
+HEADING_STYLE_NAME = re.compile(r'^heading\s*(\d)$', re.IGNORECASE)
+
+
+def _docx_heading_styles(archive):
+    """Map paragraph style ids to heading levels (0 for Title, 1-9 for headings)."""
+    levels = {}
+    try:
+        root = ET.fromstring(archive.read('word/styles.xml'))
+    except KeyError:
+        return levels
+    for style in root.iter(W_NS + 'style'):
+        if style.get(W_NS + 'type') != 'paragraph':
+            continue
+        style_id = style.get(W_NS + 'styleId')
+        name = style.find(W_NS + 'name')
+        name = name.get(W_VAL, '') if name is not None else ''
+        outline = style.find(f'{W_NS}pPr/{W_NS}outlineLvl')
+        match = HEADING_STYLE_NAME.match(name)
+        if name.lower() == 'title':
+            levels[style_id] = 0
+        elif match:
+            levels[style_id] = int(match.group(1))
+        elif outline is not None and outline.get(W_VAL, '').isdigit() and int(outline.get(W_VAL)) < 9:
+            levels[style_id] = int(outline.get(W_VAL)) + 1
+    return levels
+
+
+def _paragraph_text(paragraph):
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == W_T:
+            parts.append(node.text or '')
+        elif node.tag == W_TAB:
+            parts.append('\t')
+        elif node.tag == W_BR:
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def _paragraph_level(paragraph, heading_styles):
+    ppr = paragraph.find(W_NS + 'pPr')
+    if ppr is None:
+        return None
+    outline = ppr.find(W_NS + 'outlineLvl')
+    if outline is not None and outline.get(W_VAL, '').isdigit() and int(outline.get(W_VAL)) < 9:
+        return int(outline.get(W_VAL)) + 1
+    style = ppr.find(W_NS + 'pStyle')
+    if style is not None:
+        return heading_styles.get(style.get(W_VAL))
+    return None
+
+
+def extract_docx_structure(file_path):
+    """Stream a DOCX body in one pass.
+
+    Returns ``(segments, headings)``: ``segments`` holds every paragraph and
+    table row (cells joined with " | ") in document order, and ``headings``
+    lists ``(segment_index, level, title)`` for each heading paragraph.
+    """
+    segments = []
+    headings = []
+    with zipfile.ZipFile(file_path) as archive:
+        heading_styles = _docx_heading_styles(archive)
+        with archive.open('word/document.xml') as xml_file:
+            table_depth = 0
+            row_cells = []
+            cell_parts = []
+            for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+                tag = elem.tag
+                if event == 'start':
+                    if tag == W_TBL:
+                        table_depth += 1
+                    elif tag == W_TR and table_depth == 1:
+                        row_cells = []
+                    elif tag == W_TC and table_depth == 1:
+                        cell_parts = []
+                    continue
+
+                if tag == W_P:
+                    text = _paragraph_text(elem)
+                    if table_depth:
+                        cell_parts.append(text)
+                    else:
+                        level = _paragraph_level(elem, heading_styles)
+                        if level is not None and text.strip():
+                            headings.append((len(segments), level, text.strip()))
+                        segments.append(text)
+                        elem.clear()
+                elif tag == W_TC and table_depth == 1:
+                    row_cells.append(' '.join(p for p in cell_parts if p).strip())
+                elif tag == W_TR and table_depth == 1:
+                    segments.append(' | '.join(row_cells))
+                    elem.clear()
+                elif tag == W_TBL:
+                    table_depth -= 1
+                    if not table_depth:
+                        elem.clear()
+    return segments, headings
+
+
+def build_section_tree(sections):
+    """Nest a flat, document-ordered list of sections by heading level."""
+    root = {'title': None, 'level': -1, 'children': []}
+    stack = [root]
+    for section in sections:
+        node = {**section, 'children': []}
+        while stack[-1]['level'] >= node['level']:
+            stack.pop()
+        stack[-1]['children'].append(node)
+        stack.append(node)
+    return root['children']
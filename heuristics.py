@@ -0,0 +1,253 @@
+"""Local, deterministic detection of document elements.
+
+Most elements ("Executive Summary", "References", ...) can be recognised from
+the document's headings alone.  Each expected element is fuzzy-matched
+against the headings and a few synonyms, and the matched section's length
+and keyword density decide between EXISTS and PARTIAL.  Only elements the
+detector is unsure about need to go to the LLM; in offline mode its best
+guess is used for those as well.
+"""
+import re
+from difflib import SequenceMatcher
+
+from chunking import is_heading
+from extraction import build_section_tree
+
+
+# Confidence at or above which a local verdict is trusted without the LLM
+CONFIDENCE_THRESHOLD = 0.8
+
+# Sections shorter than this are reported as PARTIAL
+MIN_SECTION_CHARS = 300
+
+SYNONYMS = {
+    'Executive Summary': ['summary', 'overview', 'executive overview', 'synopsis'],
+    'Introduction': ['background', 'purpose', 'overview'],
+    'Scope and Context': ['scope', 'context', 'applicability'],
+    'Scope': ['scope and applicability', 'applicability', 'field of application'],
+    'Best Practice Description': ['practice description', 'description of practice', 'the practice'],
+    'Implementation Guidelines': ['implementation', 'how to implement', 'guidelines', 'procedure'],
+    'Benefits and Outcomes': ['benefits', 'outcomes', 'results achieved', 'value'],
+    'Supporting Evidence': ['evidence', 'case studies', 'supporting data', 'examples'],
+    'Recommendations': ['recommendation', 'suggestions', 'proposed actions', 'next steps'],
+    'Conclusion': ['conclusions', 'closing remarks', 'summary and conclusion'],
+    'Conclusions': ['conclusion', 'closing remarks', 'summary and conclusions'],
+    'Project Background': ['background', 'project overview', 'project context'],
+    'Problem Statement': ['problem', 'issue description', 'problem description', 'challenge'],
+    'What Went Well': ['successes', 'what worked', 'positives', 'strengths'],
+    'What Went Wrong': ['challenges', 'what did not work', 'issues encountered', 'problems encountered'],
+    'Root Cause Analysis': ['root causes', 'rca', 'causal analysis', 'root cause'],
+    'Lessons Learned': ['lessons', 'key learnings', 'learnings', 'key takeaways'],
+    'Action Items': ['actions', 'action plan', 'follow-up actions', 'next steps'],
+    'Title Page': ['title'],
+    'Abstract': ['summary', 'executive summary'],
+    'Table of Contents': ['contents', 'toc'],
+    'Methodology': ['methods', 'method', 'approach', 'materials and methods'],
+    'Results and Analysis': ['results', 'analysis', 'findings', 'results and discussion'],
+    'Discussion': ['discussion of results', 'interpretation'],
+    'References': ['bibliography', 'sources', 'works cited', 'citations'],
+    'Title and Identification': ['title', 'identification', 'document identification'],
+    'Normative References': ['references', 'referenced standards', 'normative documents'],
+    'Terms and Definitions': ['definitions', 'terminology', 'glossary', 'abbreviations'],
+    'Technical Requirements': ['requirements', 'specifications', 'technical specifications'],
+    'Test Methods': ['testing', 'test procedures', 'verification methods'],
+    'Compliance Criteria': ['compliance', 'acceptance criteria', 'conformance'],
+    'Quality Assurance': ['qa', 'quality control', 'quality management'],
+    'Documentation Requirements': ['documentation', 'records', 'record keeping']
+}
+
+STOPWORDS = {'and', 'of', 'the', 'a', 'an', 'to', 'for', 'in', 'on'}
+HEADING_NUMBER = re.compile(r'^(\d+(\.\d+)*\.?|[ivxlc]+\.|[a-z]\))\s+', re.IGNORECASE)
+WORD = re.compile(r'[a-z]+')
+
+
+def normalize(text):
+    """Lowercase, drop heading numbers and punctuation."""
+    text = HEADING_NUMBER.sub('', text.strip().lower())
+    return ' '.join(WORD.findall(text))
+
+
+def stem(word):
+    """Crude stemming so that "recommend" and "recommendations" match."""
+    return word[:6]
+
+
+def content_words(text):
+    return {stem(w) for w in WORD.findall(text.lower()) if w not in STOPWORDS}
+
+
+def keywords(element):
+    words = set()
+    for phrase in [element] + SYNONYMS.get(element, []):
+        words.update(content_words(phrase))
+    return words
+
+
+def _section_spans(nodes):
+    """``(title, start, end)`` for every node of a section tree, in document order.
+
+    A section's span runs to the end of its last subsection, so "3 Results"
+    followed only by "3.1 ..." and "3.2 ..." is not judged as an empty section.
+    """
+    spans = []
+    for node in nodes:
+        children = _section_spans(node['children'])
+        end = max([node['end']] + [c[2] for c in children])
+        # The document title (level 0) names the document, not a section
+        if node['level'] > 0:
+            spans.append((node['title'], node['start'], end))
+        spans.extend(children)
+    return spans
+
+
+def find_headings(text, outline=None):
+    """Return ``(title, start, end)`` for every heading and the section under it."""
+    if outline:
+        return _section_spans(build_section_tree(outline))
+
+    headings = []
+    position = 0
+    for line in text.split('\n'):
+        if is_heading(line):
+            headings.append([line.strip(), position])
+        position += len(line) + 1
+    return [(title, start, headings[i + 1][1] if i + 1 < len(headings) else len(text))
+            for i, (title, start) in enumerate(headings)]
+
+
+def match_score(heading, element):
+    """Similarity in [0, 1] between a heading and an element or its synonyms."""
+    heading = normalize(heading)
+    if not heading:
+        return 0.0
+    best = 0.0
+    for candidate in [element] + SYNONYMS.get(element, []):
+        candidate = normalize(candidate)
+        if heading == candidate:
+            return 1.0
+        # Character similarity tolerates typos; word overlap stops
+        # "What Went Well" from matching "What Went Wrong"
+        words, candidate_words = content_words(heading), content_words(candidate)
+        overlap = len(words & candidate_words) / len(words | candidate_words) if words | candidate_words else 0.0
+        score = (SequenceMatcher(None, heading, candidate).ratio() + overlap) / 2
+        # "3. Results and Analysis of Pump Trials" still names the element
+        if len(candidate) >= 5 and heading.startswith(candidate):
+            score = max(score, 0.9)
+        best = max(best, score)
+    return best
+
+
+def keyword_density(text, words):
+    tokens = WORD.findall(text.lower())
+    if not tokens:
+        return 0.0
+    return sum(1 for t in tokens if stem(t) in words) / len(tokens)
+
+
+def detect_element(element, text, headings):
+    """Judge one element; returns an element dict with a ``confidence``."""
+    best_score, best_heading = 0.0, None
+    for heading in headings:
+        score = match_score(heading[0], element)
+        if score > best_score:
+            best_score, best_heading = score, heading
+
+    result = {'name': element, 'source': 'local'}
+    if best_heading and best_score >= 0.75:
+        title, start, end = best_heading
+        body = text[start + len(title):end].strip() if text[start:start + len(title)] == title else text[start:end]
+        length = len(body)
+        if length >= MIN_SECTION_CHARS:
+            result.update(
+                status='EXISTS',
+                confidence=round(min(0.95, 0.6 + 0.35 * best_score), 2),
+                description=f'Found a "{title}" section ({len(body.split())} words).',
+                action=''
+            )
+        else:
+            result.update(
+                status='PARTIAL',
+                confidence=round(0.55 + 0.3 * best_score, 2),
+                description=f'Found a "{title}" heading but the section is very short.',
+                action=f'Expand the {element} section with more detail.'
+            )
+        return result
+
+    density = keyword_density(text, keywords(element))
+    if density == 0:
+        # Title pages, abstracts and the like are often there without naming
+        # themselves, so the LLM gets the final say on these
+        result.update(
+            status='MISSING',
+            confidence=0.6,
+            description=f'No {element} section or related wording was found.',
+            action=f'Add a section covering {element}.'
+        )
+    else:
+        # The topic is mentioned but has no heading of its own
+        result.update(
+            status='PARTIAL',
+            confidence=round(max(0.3, 0.6 - density * 5), 2),
+            description=f'{element} is mentioned but has no dedicated section.',
+            action=f'Give {element} its own clearly headed section.'
+        )
+    return result
+
+
+def detect_elements(text, elements, outline=None):
+    """Run the local detector for every expected element."""
+    headings = find_headings(text, outline)
+    return [detect_element(element, text, headings) for element in elements]
+
+
+def summarize(elements):
+    return {
+        'exists': sum(1 for e in elements if e['status'].upper() == 'EXISTS'),
+        'partial': sum(1 for e in elements if e['status'].upper() == 'PARTIAL'),
+        'missing': sum(1 for e in elements if e['status'].upper() == 'MISSING')
+    }
+
+
+def quality_score(elements):
+    """0-100 score from element statuses: EXISTS counts fully, PARTIAL half."""
+    summary = summarize(elements)
+    return round(100 * (summary['exists'] + 0.5 * summary['partial']) / (len(elements) or 1))
+
+
+def build_local_analysis(detections):
+    """Turn local detections into a complete analysis without any LLM call."""
+    summary = summarize(detections)
+    recommendations = [e['action'] for e in detections if e['status'] == 'MISSING'][:3]
+    recommendations += [e['action'] for e in detections if e['status'] == 'PARTIAL'][:5 - len(recommendations)]
+    return {
+        'elements': detections,
+        'quality_score': quality_score(detections),
+        'recommendations': recommendations or ['All expected sections are present'],
+        'summary': summary,
+        'local': True
+    }
+
+
+def merge_local_and_llm(local, llm_analysis, expected_elements):
+    """Combine confident local verdicts with the LLM's verdicts for the rest.
+
+    The LLM's quality score only covers the elements it was asked about, so
+    the merged score weights it by those elements and scores the local ones
+    from their statuses.
+    """
+    by_name = {e['name']: e for e in llm_analysis.get('elements', [])}
+    by_name.update({e['name']: e for e in local})
+    order = {name: i for i, name in enumerate(expected_elements)}
+    elements = sorted(by_name.values(), key=lambda e: order.get(e['name'], len(order)))
+    decided = {e['name'] for e in local}
+    asked = len([e for e in elements if e['name'] not in decided])
+    llm_score = llm_analysis.get('quality_score')
+    if not isinstance(llm_score, (int, float)):
+        llm_score = quality_score([e for e in elements if e['name'] not in decided])
+    score = round((llm_score * asked + quality_score(local) * len(local)) / (len(elements) or 1))
+    return {
+        **llm_analysis,
+        'elements': elements,
+        'quality_score': score,
+        'summary': summarize(elements)
+    }
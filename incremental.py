@@ -0,0 +1,107 @@
+"""Incremental re-analysis of edited documents.
+
+Every analysis stores a fingerprint per expected element: a hash of the
+section whose heading matches the element, or, for an element without a
+section of its own, of all the text no element's section covers.  When a
+new version of a document is analysed against an earlier analysis, only
+the elements whose fingerprint changed go back to the LLM, with just their
+sections as the document text; every other verdict is carried forward.
+An element judged from the uncovered text needs the whole document, so a
+change there sends the whole document, still for the changed elements only.
+
+Fingerprints ignore whitespace, so re-flowed text does not count as a change.
+"""
+import hashlib
+
+from enhancement import SECTION_MATCH
+from heuristics import find_headings, match_score, summarize
+
+
+FINGERPRINT_VERSION = '1'
+
+# Share of the quality score an element is worth, by status
+STATUS_CREDIT = {'EXISTS': 1.0, 'PARTIAL': 0.5, 'MISSING': 0.0}
+
+
+def _digest(text):
+    normalized = ' '.join(text.split())
+    return hashlib.blake2b(f"{FINGERPRINT_VERSION}:{normalized}".encode('utf-8'), digest_size=8).hexdigest()
+
+
+def match_sections(text, elements, outline=None):
+    """Map every element to the ``(start, end)`` of the section headed most like it, or None."""
+    headings = find_headings(text, outline)
+    sections = {}
+    for element in elements:
+        best_score, best = 0.0, None
+        for title, start, end in headings:
+            score = match_score(title, element)
+            if score > best_score:
+                best_score, best = score, (start, end)
+        sections[element] = best if best_score >= SECTION_MATCH else None
+    return sections
+
+
+def section_fingerprints(text, elements, outline=None):
+    """Return ``{element: fingerprint}`` for the expected elements of ``text``."""
+    sections = match_sections(text, elements, outline)
+    uncovered, position = [], 0
+    for start, end in sorted({span for span in sections.values() if span}):
+        uncovered.append(text[position:start] if start > position else '')
+        position = max(position, end)
+    uncovered.append(text[position:])
+    rest = _digest(''.join(uncovered))
+    return {
+        element: _digest(text[span[0]:span[1]]) if span else rest
+        for element, span in sections.items()
+    }
+
+
+def changed_elements(previous, current):
+    """Elements of ``current`` whose fingerprint differs from (or is absent in) ``previous``."""
+    return [element for element, fingerprint in current.items() if previous.get(element) != fingerprint]
+
+
+def changed_text(text, elements, outline=None):
+    """The text to re-analyse ``elements`` against, and whether it is the whole document."""
+    spans = match_sections(text, elements, outline).values()
+    if any(span is None for span in spans):
+        return text, True
+    return '\n\n'.join(text[start:end].strip() for start, end in sorted(set(spans))), False
+
+
+def _credit(elements):
+    return sum(STATUS_CREDIT.get(str(e.get('status', '')).upper(), 0.0) for e in elements)
+
+
+def merge_incremental(previous, update, expected_elements):
+    """Combine the carried-forward verdicts of ``previous`` with the re-checked ones in ``update``.
+
+    The quality score moves by the change in status credit of the
+    re-checked elements; their new recommendations come first.
+    """
+    expected = set(expected_elements)
+    by_name = {e['name']: e for e in previous.get('elements', []) if e['name'] in expected}
+    before = [by_name[e['name']] for e in update.get('elements', []) if e['name'] in by_name]
+    by_name.update({e['name']: e for e in update.get('elements', [])})
+    order = {name: i for i, name in enumerate(expected_elements)}
+    elements = sorted(by_name.values(), key=lambda e: order.get(e['name'], len(order)))
+
+    score = previous.get('quality_score', 0)
+    if isinstance(score, (int, float)) and elements:
+        shift = 100 * (_credit(update.get('elements', [])) - _credit(before)) / len(elements)
+        score = max(0, min(100, round(score + shift)))
+
+    recommendations = []
+    for recommendation in update.get('recommendations', []) + previous.get('recommendations', []):
+        if recommendation not in recommendations:
+            recommendations.append(recommendation)
+
+    merged = {k: v for k, v in previous.items() if k not in ('reused_from', 'incremental', 'fingerprints')}
+    merged.update(
+        elements=elements,
+        summary=summarize(elements),
+        quality_score=score,
+        recommendations=recommendations[:5]
+    )
+    return merged
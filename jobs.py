@@ -0,0 +1,325 @@
+"""Background job queue for long-running work such as LLM analysis.
+
+Requests submit a job and get its id back straight away; the work runs on a
+bounded thread pool so that slow OpenAI calls never hold a Flask worker.
+Each job keeps an append-only list of progress events that the status and
+Server-Sent Events endpoints read from.
+
+Job state and events are also written to a SQLite ``JobStore`` shared by
+every process of the app, so a status poll or event stream that reaches a
+different gunicorn worker than the one running the job still finds it
+(``StoredJob``).  Event streams end after ``window`` seconds and carry event
+ids; the browser reconnects with ``Last-Event-ID`` and resumes, so an open
+stream never holds a worker for a whole job.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when the queue already holds the maximum number of jobs."""
+
+
+def _owner_alive(pid):
+    """True if the process ``pid`` (on this host, which shares the SQLite file) still runs."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """Job state and events in SQLite, so every app process can report on every job."""
+
+    def __init__(self, path, poll_interval=0.25):
+        self.path = path
+        self.poll_interval = poll_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, result TEXT, error TEXT, '
+                'created_at REAL NOT NULL, finished_at REAL, pid INTEGER NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS job_events ('
+                'job_id TEXT NOT NULL, seq INTEGER NOT NULL, event TEXT NOT NULL, data TEXT NOT NULL, '
+                'PRIMARY KEY (job_id, seq))'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def save(self, job):
+        """Insert or update a job's state."""
+        result = json.dumps(job.result, default=str) if job.result is not None else None
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO jobs (job_id, kind, status, result, error, created_at, finished_at, pid) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.id, job.kind, job.status, result, job.error, job.created_at, job.finished_at, os.getpid())
+            )
+
+    def append(self, job_id, seq, event, data):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO job_events (job_id, seq, event, data) VALUES (?, ?, ?, ?)',
+                (job_id, seq, event, json.dumps(data, default=str))
+            )
+
+    def load(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT job_id, kind, status, result, error, created_at, finished_at, pid FROM jobs WHERE job_id = ?',
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ('job_id', 'kind', 'status', 'result', 'error', 'created_at', 'finished_at', 'pid')
+        record = dict(zip(keys, row))
+        record['result'] = json.loads(record['result']) if record['result'] is not None else None
+        return record
+
+    def events(self, job_id, since=0):
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT event, data FROM job_events WHERE job_id = ? AND seq >= ? ORDER BY seq',
+                (job_id, since)
+            ).fetchall()
+        return [(event, json.loads(data)) for event, data in rows]
+
+    def expire(self, cutoff):
+        """Delete jobs that finished before ``cutoff`` and their events."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM job_events WHERE job_id IN (SELECT job_id FROM jobs WHERE finished_at < ?)', (cutoff,))
+            return conn.execute('DELETE FROM jobs WHERE finished_at < ?', (cutoff,)).rowcount
+
+
+class Job:
+    """A unit of background work plus the progress events it published."""
+
+    def __init__(self, kind, store=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self.store = store
+        self._cond = threading.Condition()
+        if store is not None:
+            store.save(self)
+        self.publish('status', {'status': 'queued'})
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def publish(self, event, data):
+        """Append a progress event and wake up anyone waiting on this job."""
+        with self._cond:
+            if self.store is not None:
+                self.store.append(self.id, len(self.events), event, data)
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def start(self):
+        self.status = 'running'
+        if self.store is not None:
+            self.store.save(self)
+        self.publish('status', {'status': 'running'})
+
+    def finish(self, status):
+        """Mark the job finished and publish the final event atomically."""
+        with self._cond:
+            self.status = status
+            self.finished_at = time.time()
+            if self.store is not None:
+                # State first: a reader that sees the final event must also see the result
+                self.store.save(self)
+                self.store.append(self.id, len(self.events), status, self.to_dict())
+            self.events.append((status, self.to_dict()))
+            self._cond.notify_all()
+
+    def wait_for_events(self, since, timeout=None):
+        """Return events published after index ``since``, blocking up to ``timeout``."""
+        with self._cond:
+            if len(self.events) <= since and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[since:]
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class StoredJob(Job):
+    """Read-only view of a job another process runs, loaded from the JobStore.
+
+    ``wait_for_events`` polls the store, since the running process cannot
+    wake up waiters here.
+    """
+
+    def __init__(self, store, record):
+        self.id = record['job_id']
+        self.kind = record['kind']
+        self.store = store
+        self._load(record)
+
+    def _load(self, record):
+        self.result = record['result']
+        self.error = record['error']
+        self.created_at = record['created_at']
+        self.finished_at = record['finished_at']
+        self.status = record['status']
+        if self.status in ('queued', 'running') and not _owner_alive(record['pid']):
+            # The process running it exited before finishing the job
+            self.status = 'failed'
+            self.error = 'The worker running this job stopped; please try again'
+
+    @property
+    def events(self):
+        return self.store.events(self.id)
+
+    def publish(self, event, data):
+        raise RuntimeError('Jobs run by another process are read-only')
+
+    def wait_for_events(self, since, timeout=None):
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            events = self.store.events(self.id, since)
+            if events or self.finished or time.monotonic() >= deadline:
+                break
+            time.sleep(self.store.poll_interval)
+            record = self.store.load(self.id)
+            if record is not None:
+                self._load(record)
+        if not events and self.finished:
+            # The final event may have been written between the two reads
+            events = self.store.events(self.id, since)
+        return events
+
+
+class JobQueue:
+    """Bounded thread pool that runs jobs and keeps them around for a while."""
+
+    def __init__(self, max_workers=4, max_pending=32, retention=3600, store=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue ``fn(job, *args, **kwargs)`` and return the new Job.
+
+        ``fn`` returns the job result; raising an exception marks the job as
+        failed with the exception message as its error.
+        """
+        self._expire_old_jobs()
+        with self._lock:
+            if self._active >= self.max_workers + self.max_pending:
+                raise JobQueueFull('Too many jobs in progress, please try again shortly')
+            job = Job(kind, self.store)
+            self._jobs[job.id] = job
+            self._active += 1
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.start()
+        status = 'failed'
+        try:
+            job.result = fn(job, *args, **kwargs)
+            status = 'done'
+        except Exception as e:
+            logger.exception('Job failed', extra={'job_id': job.id, 'kind': job.kind})
+            job.error = str(e)
+        finally:
+            with self._lock:
+                self._active -= 1
+            job.finish(status)
+
+    def get(self, job_id):
+        """The job, whether this process or (with a store) another one runs it; None if unknown."""
+        job = self._jobs.get(job_id)
+        if job is None and job_id and self.store is not None:
+            record = self.store.load(job_id)
+            job = StoredJob(self.store, record) if record is not None else None
+        return job
+
+    def _expire_old_jobs(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+        if self.store is not None:
+            self.store.expire(cutoff)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self._active,
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'tracked': len(self._jobs)
+            }
+
+
+def sse_stream(job, keepalive=15, since=0, window=None):
+    """Yield a job's events formatted as Server-Sent Events until it finishes.
+
+    Every event carries its index as ``id``; ``since`` (from the client's
+    Last-Event-ID) skips events it already has.  With ``window`` the stream
+    ends after that many seconds and the client reconnects to resume.
+    """
+    sent = since
+    deadline = time.monotonic() + window if window else None
+    # Reconnect quickly after the window closes
+    yield 'retry: 1000\n\n'
+    while True:
+        timeout = keepalive if deadline is None else max(0.0, min(keepalive, deadline - time.monotonic()))
+        events = job.wait_for_events(sent, timeout=timeout)
+        for event, data in events:
+            yield f"id: {sent}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            sent += 1
+            if event in ('done', 'failed'):
+                # The final event is always the last one published
+                return
+        if not events and job.finished and not job.wait_for_events(sent, timeout=0):
+            return
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        if not events:
+            # Comment line keeps proxies from closing an idle connection
+            yield ': keepalive\n\n'
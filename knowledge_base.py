@@ -0,0 +1,357 @@
+"""Persistent knowledge base of every analysed document.
+
+Documents are stored once per content hash in SQLite together with their
+latest analysis, and indexed two ways:
+
+* an inverted full-text index (FTS5, Porter-stemmed) over the file name, the
+  element names the analysis found and the document text, ranked by BM25;
+* optionally, a vector index of local bag-of-words embeddings (feature
+  hashing, no model download) searched by brute-force cosine similarity in
+  NumPy.  Tens of thousands of 256-dimension vectors are a few MB and one
+  matrix product, so no approximate index is needed at this scale.  Each
+  process keeps its own copy and loads rows other processes wrote (by row
+  ``version``) before every search.
+
+``mode='hybrid'`` merges both rankings with reciprocal rank fusion.  Vector
+search needs NumPy; without it only full-text search is available.
+
+    kb = KnowledgeBase('knowledge/knowledge.sqlite3', embedder=HashingEmbedder())
+    kb.add(artifact['content_hash'], artifact['text'], 'pump-report.pdf', 'engineeringReport', analysis)
+    kb.search('cavitation impeller', limit=10)
+"""
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+from heuristics import STOPWORDS, stem
+
+try:
+    import numpy as np
+except ImportError:  # vector search is optional
+    np = None
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ('text', 'vector', 'hybrid')
+# Every write stamps its row with the next version, so readers can load just what changed
+NEXT_VERSION = '(SELECT COALESCE(MAX(version), 0) + 1 FROM documents)'
+TOKEN = re.compile(r'[^\W_]+')
+RRF_K = 60  # reciprocal rank fusion constant
+
+
+def make_snippet(text, tokens, words=16):
+    """About ``words`` words of ``text`` from just before the first word starting with a query token.
+
+    Matched words are wrapped in ``**``.  Computed here rather than with
+    FTS5's snippet(), which re-reads the full-text index for every document.
+    """
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(t) for t in tokens) + r')\w*', re.IGNORECASE)
+    hit = pattern.search(text)
+    position = hit.start() if hit else 0
+    before = text[max(0, position - 20 * words // 4):position].split()
+    head = before[-(words // 4):] if before else []
+    after = text[position:position + 20 * words].split()
+    tail = after[:words - len(head)]
+    snippet = ' '.join(head + [pattern.sub(r'**\g<0>**', word) for word in tail])
+    if position - len(' '.join(head)) > 1:
+        snippet = '... ' + snippet
+    if len(after) > len(tail) or position + 20 * words < len(text):
+        snippet += ' ...'
+    return snippet
+
+
+def fts_query(tokens):
+    """Turn query words into an FTS5 query: every word must match, the last one as a prefix."""
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    # Shorter prefixes expand to too many terms to be worth it
+    if len(tokens[-1]) >= 3:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class HashingEmbedder:
+    """Bag-of-words embeddings by feature hashing: local, deterministic and model-free.
+
+    Stemmed words and word pairs are hashed into ``dim`` signed buckets with
+    sublinear term frequency, then L2-normalised, so the dot product of two
+    embeddings is their cosine similarity.
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dim=256):
+        if np is None:
+            raise RuntimeError('NumPy is required for vector search')
+        self.dim = dim
+
+    def _features(self, text):
+        words = [stem(w) for w in TOKEN.findall(text.lower()) if w not in STOPWORDS and not w.isdigit()]
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        return features
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            h = zlib.crc32(feature.encode('utf-8'))
+            vector[h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def local_embedder(dim=256):
+    """A HashingEmbedder, or None when NumPy is not installed."""
+    return HashingEmbedder(dim) if np is not None else None
+
+
+class VectorIndex:
+    """In-memory matrix of document embeddings searched by brute force."""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._matrix = np.zeros((1024, dim), dtype=np.float32)
+        self._ids = []
+        self._types = []
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, doc_id, doc_type, vector):
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                row = len(self._ids)
+                if row == len(self._matrix):
+                    # Double the capacity so appends stay amortised O(1)
+                    grown = np.zeros((2 * len(self._matrix), self.dim), dtype=np.float32)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+                self._rows[doc_id] = row
+                self._ids.append(doc_id)
+                self._types.append(doc_type)
+            self._matrix[row] = vector
+            self._types[row] = doc_type
+
+    def search(self, vector, limit, doc_type=None):
+        """Return ``(doc_id, similarity)`` for the most similar documents."""
+        with self._lock:
+            count = len(self._ids)
+            if not count:
+                return []
+            scores = self._matrix[:count] @ vector
+            if doc_type is not None:
+                scores = np.where(np.array(self._types) == doc_type, scores, -np.inf)
+            limit = min(limit, count)
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+class KnowledgeBase:
+    """SQLite corpus of analysed documents with full-text and vector search."""
+
+    def __init__(self, path, embedder=None, max_chars=200_000):
+        self.path = path
+        self.embedder = embedder
+        self.max_chars = max_chars
+        self._write_lock = threading.Lock()
+        self._vectors = None
+        self._vectors_version = 0  # highest document version in self._vectors
+        self._vectors_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                'id INTEGER PRIMARY KEY, doc_id TEXT NOT NULL UNIQUE, name TEXT, doc_type TEXT, '
+                'quality_score INTEGER, summary TEXT, analysis TEXT, chars INTEGER, '
+                'analyzed_at TEXT, indexed_at REAL NOT NULL, vector BLOB, version INTEGER)'
+            )
+            if 'version' not in [row[1] for row in conn.execute('PRAGMA table_info(documents)')]:
+                # Knowledge bases from before the version column; their rows load with the first search
+                conn.execute('ALTER TABLE documents ADD COLUMN version INTEGER')
+            conn.execute('CREATE INDEX IF NOT EXISTS documents_doc_type ON documents (doc_type)')
+            conn.execute('CREATE INDEX IF NOT EXISTS documents_version ON documents (version)')
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+                "name, elements, body, tokenize='porter unicode61')"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @property
+    def vectors_enabled(self):
+        return self.embedder is not None
+
+    def add(self, doc_id, text, name, doc_type, analysis):
+        """Index a document (or re-index it with a newer analysis)."""
+        elements = analysis.get('elements', [])
+        present = [e['name'] for e in elements if str(e.get('status', '')).upper() != 'MISSING']
+        body = text[:self.max_chars]
+        vector = self.embedder.embed(f"{name}\n{body}") if self.embedder else None
+        with self._write_lock, self._connect() as conn:
+            row = conn.execute('SELECT id FROM documents WHERE doc_id = ?', (doc_id,)).fetchone()
+            values = (
+                name, doc_type, analysis.get('quality_score'), json.dumps(analysis.get('summary', {})),
+                json.dumps(analysis), len(text), analysis.get('analyzed_at'), time.time(),
+                vector.tobytes() if vector is not None else None
+            )
+            if row:
+                rowid = row[0]
+                conn.execute(
+                    'UPDATE documents SET name = ?, doc_type = ?, quality_score = ?, summary = ?, analysis = ?, '
+                    'chars = ?, analyzed_at = ?, indexed_at = ?, vector = ?, version = ' + NEXT_VERSION + ' WHERE id = ?',
+                    values + (rowid,)
+                )
+                conn.execute('DELETE FROM documents_fts WHERE rowid = ?', (rowid,))
+            else:
+                rowid = conn.execute(
+                    'INSERT INTO documents (doc_id, name, doc_type, quality_score, summary, analysis, chars, '
+                    'analyzed_at, indexed_at, vector, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ' + NEXT_VERSION + ')',
+                    (doc_id,) + values
+                ).lastrowid
+            conn.execute(
+                'INSERT INTO documents_fts (rowid, name, elements, body) VALUES (?, ?, ?, ?)',
+                (rowid, name, '\n'.join(present), body)
+            )
+
+    def get(self, doc_id):
+        """Return the stored name, type and latest analysis of a document, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT name, doc_type, analysis FROM documents WHERE doc_id = ?', (doc_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'doc_id': doc_id, 'name': row[0], 'doc_type': row[1], 'analysis': json.loads(row[2])}
+
+    def _vector_index(self):
+        """The vector index, loaded from SQLite on first use and then brought up to date.
+
+        Other processes add documents too, so every search first loads the
+        rows written since the last one (a newer ``version``); with nothing
+        new that is one lookup in the version index.
+        """
+        with self._vectors_lock:
+            with self._connect() as conn:
+                if self._vectors is None:
+                    self._vectors = VectorIndex(self.embedder.dim)
+                    rows = conn.execute(
+                        'SELECT doc_id, doc_type, vector, version FROM documents WHERE vector IS NOT NULL ORDER BY id')
+                else:
+                    rows = conn.execute(
+                        'SELECT doc_id, doc_type, vector, version FROM documents '
+                        'WHERE version > ? AND vector IS NOT NULL ORDER BY version', (self._vectors_version,))
+                for doc_id, doc_type, blob, version in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    if len(vector) == self._vectors.dim:
+                        self._vectors.add(doc_id, doc_type, vector)
+                    self._vectors_version = max(self._vectors_version, version or 0)
+            return self._vectors
+
+    def _text_search(self, conn, match, limit, doc_type):
+        """Return ``(doc_id, score)`` for the best BM25 matches, best first."""
+        # Rank and cut inside FTS5 first; joining or building snippets for
+        # every match would cost time proportional to the number of matches
+        inner = 'SELECT rowid, bm25(documents_fts, 10.0, 5.0, 1.0) AS score FROM documents_fts WHERE documents_fts MATCH ?'
+        params = [match]
+        if doc_type:
+            inner += ' AND rowid IN (SELECT id FROM documents WHERE doc_type = ?)'
+            params.append(doc_type)
+        params.append(limit)
+        rows = conn.execute(
+            f'SELECT d.doc_id, f.score FROM ({inner} ORDER BY score LIMIT ?) f '
+            'JOIN documents d ON d.id = f.rowid ORDER BY f.score', params
+        )
+        # BM25 is lower-is-better in SQLite; flip it so every mode sorts descending
+        return [(doc_id, -score) for doc_id, score in rows]
+
+    def _snippets(self, conn, tokens, rowids):
+        """Passages around the first query word in each document."""
+        placeholders = ','.join('?' * len(rowids))
+        return {rowid: make_snippet(body, tokens) for rowid, body in conn.execute(
+            f'SELECT rowid, body FROM documents_fts WHERE rowid IN ({placeholders})', list(rowids)
+        )}
+
+    def search(self, query, limit=10, doc_type=None, mode='text'):
+        """Return up to ``limit`` matching documents, best first."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode != 'text' and not self.vectors_enabled:
+            raise ValueError('Vector search is not available; install NumPy to enable it')
+
+        tokens = TOKEN.findall(query.lower())
+        match = fts_query(tokens)
+        with self._connect() as conn:
+            ranked = {}
+            if mode == 'text' and match:
+                ranked.update(self._text_search(conn, match, limit, doc_type))
+            elif mode == 'hybrid' and match:
+                for rank, (doc_id, _) in enumerate(self._text_search(conn, match, 3 * limit, doc_type)):
+                    ranked[doc_id] = 1 / (RRF_K + rank + 1)
+            if mode in ('vector', 'hybrid'):
+                hits = self._vector_index().search(self.embedder.embed(query), 3 * limit, doc_type)
+                for rank, (doc_id, similarity) in enumerate(hits):
+                    if mode == 'vector':
+                        ranked[doc_id] = similarity
+                    else:
+                        ranked[doc_id] = ranked.get(doc_id, 0.0) + 1 / (RRF_K + rank + 1)
+
+            best = sorted(ranked.items(), key=lambda item: item[1], reverse=True)[:limit]
+            if not best:
+                return []
+            placeholders = ','.join('?' * len(best))
+            rows = {row[1]: row for row in conn.execute(
+                'SELECT id, doc_id, name, doc_type, quality_score, summary, chars, analyzed_at '
+                f'FROM documents WHERE doc_id IN ({placeholders})', [doc_id for doc_id, _ in best]
+            )}
+            snippets = self._snippets(conn, tuple(tokens), [row[0] for row in rows.values()]) if tokens else {}
+
+        results = []
+        for doc_id, score in best:
+            rowid, _, name, doc_type_, quality_score, summary, chars, analyzed_at = rows[doc_id]
+            results.append({
+                'doc_id': doc_id,
+                'name': name,
+                'doc_type': doc_type_,
+                'quality_score': quality_score,
+                'summary': json.loads(summary) if summary else {},
+                'chars': chars,
+                'analyzed_at': analyzed_at,
+                'score': round(score, 6),
+                'snippet': snippets.get(rowid)
+            })
+        return results
+
+    def stats(self):
+        with self._connect() as conn:
+            count, chars = conn.execute('SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM documents').fetchone()
+            by_type = dict(conn.execute('SELECT doc_type, COUNT(*) FROM documents GROUP BY doc_type'))
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        return {
+            'documents': count,
+            'chars': chars,
+            'by_type': by_type,
+            'bytes': size,
+            'vectors': self.embedder.name if self.embedder else None,
+            'vectors_loaded': len(self._vectors) if self._vectors is not None else None
+        }
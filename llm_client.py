@@ -0,0 +1,211 @@
+"""Process-wide OpenAI client manager.
+
+Creating ``OpenAI(api_key=...)`` for every analysis opened a new connection
+(and TLS handshake) per call, and the API key was re-read from ``.env`` on
+every request.  The manager below loads the configuration once, shares one
+connection-pooled HTTP client between all calls, caps the number of
+concurrent requests per API key and retries rate-limit and server errors
+with jittered exponential backoff.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+import openai
+from dotenv import load_dotenv
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(error):
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if it sent a Retry-After header."""
+    response = getattr(error, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class LLMClientManager:
+    """Shared OpenAI clients with pooling, per-key concurrency limits and retries."""
+
+    def __init__(self, max_connections=20, max_concurrency=8, max_retries=4,
+                 base_delay=0.5, max_delay=8.0, timeout=30):
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._semaphores = {}
+        self._http_client = None
+        self._users = {}  # HTTP client -> calls currently using it
+        self._retired = []  # HTTP clients replaced by reload(), closed when their last call ends
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+        self.reload()
+
+    def reload(self):
+        """Re-read ``.env`` and drop cached clients so new settings take effect."""
+        load_dotenv(override=True)
+        with self._lock:
+            self.api_key = os.getenv('OPENAI_API_KEY')
+            self.base_url = os.getenv('OPENAI_BASE_URL') or None
+            self._clients = {}
+            old, idle = self._http_client, None
+            if old is not None:
+                if self._users.get(old):
+                    # In-flight calls keep using the old HTTP client until they finish
+                    self._retired.append(old)
+                else:
+                    idle = old
+            self._http_client = openai.DefaultHttpxClient(
+                limits=type(openai.DEFAULT_CONNECTION_LIMITS)(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        if idle is not None:
+            idle.close()
+
+    @property
+    def configured(self):
+        return bool(self.api_key) and self.api_key != 'your-openai-api-key-here'
+
+    def client(self, api_key=None):
+        """Return the shared client for ``api_key`` (default: the configured key)."""
+        with self._lock:
+            return self._client(api_key or self.api_key)
+
+    def _client(self, api_key):
+        # Called with self._lock held
+        client = self._clients.get(api_key)
+        if client is None:
+            # Retries are handled here so they can share the backoff policy
+            client = openai.OpenAI(
+                api_key=api_key,
+                base_url=self.base_url,
+                http_client=self._http_client,
+                max_retries=0,
+                timeout=self.timeout
+            )
+            self._clients[api_key] = client
+        return client
+
+    def _checkout(self, api_key):
+        """The client for a call plus the HTTP client it runs on, counted as in use until ``_checkin``."""
+        with self._lock:
+            client = self._client(api_key)
+            http_client = self._http_client
+            self._users[http_client] = self._users.get(http_client, 0) + 1
+        return client, http_client
+
+    def _checkin(self, http_client):
+        """End a call; close its HTTP client if reload() replaced it and this was its last call."""
+        with self._lock:
+            self._users[http_client] -= 1
+            if self._users[http_client]:
+                return
+            del self._users[http_client]
+            if http_client not in self._retired:
+                return
+            self._retired.remove(http_client)
+        http_client.close()
+
+    def _semaphore(self, api_key):
+        with self._lock:
+            semaphore = self._semaphores.get(api_key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_concurrency)
+                self._semaphores[api_key] = semaphore
+            return semaphore
+
+    def _acquire(self, api_key):
+        semaphore = self._semaphore(api_key)
+        start = time.perf_counter()
+        semaphore.acquire()
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1
+            self.wait_seconds += waited
+        return semaphore
+
+    def _backoff(self, attempt, error):
+        delay = retry_after(error)
+        if delay is None:
+            # Full jitter: spread retries out so callers don't retry in lockstep
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        with self._lock:
+            self.retries += 1
+        time.sleep(min(delay, self.max_delay))
+
+    def _create(self, client, kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return client.chat.completions.create(**kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                logger.warning('OpenAI call failed, retrying', extra={'attempt': attempt + 1, 'error': str(e)})
+                self._backoff(attempt, e)
+
+    def chat_completion(self, api_key=None, **kwargs):
+        """``chat.completions.create`` with concurrency limiting and retries."""
+        api_key = api_key or self.api_key
+        client, http_client = self._checkout(api_key)
+        semaphore = self._acquire(api_key)
+        try:
+            return self._create(client, kwargs)
+        finally:
+            semaphore.release()
+            self._checkin(http_client)
+
+    def stream_chat_completion(self, api_key=None, **kwargs):
+        """Yield streamed chunks; the concurrency slot is held until the stream ends.
+
+        Only opening the stream is retried: once chunks have been handed to
+        the caller a retry would duplicate them.  A caller that stops early
+        closes the generator, which closes the response as well.
+        """
+        api_key = api_key or self.api_key
+        client, http_client = self._checkout(api_key)
+        semaphore = self._acquire(api_key)
+        stream = None
+        try:
+            stream = self._create(client, {**kwargs, 'stream': True})
+            yield from stream
+        finally:
+            if stream is not None:
+                stream.close()
+            semaphore.release()
+            self._checkin(http_client)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'failures': self.failures,
+                'avg_wait_ms': round(1000 * self.wait_seconds / self.calls, 3) if self.calls else 0.0,
+                'max_concurrency': self.max_concurrency,
+                'max_connections': self.max_connections
+            }
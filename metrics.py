@@ -0,0 +1,164 @@
+"""In-process counters and histograms in the Prometheus text format.
+
+A small, dependency-free subset of what prometheus_client offers: labelled
+counters and histograms registered in a module-level registry and rendered
+by ``render()`` for the ``/metrics`` endpoint.
+
+    with EXTRACTION_SECONDS.time(format='pdf'):
+        pages = extract_pdf_pages(path)
+    LLM_TOKENS.inc(completion.prompt_tokens, backend='openai', direction='prompt')
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds, unless the name says otherwise)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, the +Inf overflow, sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the ``with`` block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels):
+        """Return (count, sum) for one label set."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                labels = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Metrics shared across modules
+REQUEST_SECONDS = Histogram('knowha_request_seconds', 'HTTP request time by endpoint',
+                            ['method', 'endpoint', 'status'])
+EXTRACTION_SECONDS = Histogram('knowha_extraction_seconds', 'Text extraction time by document format', ['format'])
+PROMPT_BUILD_SECONDS = Histogram('knowha_prompt_build_seconds', 'Time to build an analysis prompt')
+LLM_SECONDS = Histogram('knowha_llm_seconds', 'Analysis backend call latency', ['backend', 'mode'])
+PARSE_SECONDS = Histogram('knowha_parse_seconds', 'Time to parse and validate an analysis response')
+ANALYSIS_SECONDS = Histogram('knowha_analysis_seconds', 'End-to-end time of an analysis job', ['mode'])
+LLM_TOKENS = Counter('knowha_llm_tokens_total', 'Tokens sent to and received from analysis backends',
+                     ['backend', 'direction'])
+LLM_ERRORS = Counter('knowha_llm_errors_total', 'Failed analysis backend calls', ['backend'])
+ANALYSIS_CACHE = Counter('knowha_analysis_cache_total', 'Analysis cache lookups', ['result'])
+ENHANCEMENT_SECONDS = Histogram('knowha_enhancement_seconds', 'End-to-end time of an enhancement job')
+ENHANCEMENT_CACHE = Counter('knowha_enhancement_cache_total', 'Enhanced section cache lookups', ['result'])
+NEAR_DUPLICATES = Counter('knowha_near_duplicates_total',
+                          'Uploads flagged as near-copies and analyses reused from them', ['result'])
+INCREMENTAL_ELEMENTS = Counter('knowha_incremental_elements_total',
+                               'Elements re-checked or carried forward by incremental re-analysis', ['result'])
+SHARE_REQUESTS = Counter('knowha_share_requests_total', 'Share link requests by format and HTTP status',
+                         ['format', 'status'])
+EXPORT_SECONDS = Histogram('knowha_export_seconds', 'Time to build a DOCX or PDF export', ['format'])
+EXPORT_CACHE = Counter('knowha_export_cache_total', 'Export cache lookups', ['result', 'format'])
+SEARCH_SECONDS = Histogram('knowha_search_seconds', 'Knowledge base search time', ['mode'])
+DEFAULT_ANALYSES = Counter('knowha_default_analysis_total',
+                           'Analyses that fell back to create_default_analysis')
@@ -0,0 +1,187 @@
+"""Near-duplicate detection of uploads with MinHash and locality-sensitive hashing.
+
+Every upload's extracted text is reduced to a MinHash signature over word
+5-gram shingles: ``num_perm`` minimum hash values whose agreement rate
+estimates the Jaccard similarity of two documents' shingle sets.  The
+signature is cut into ``bands`` bands; documents that share a band bucket
+are candidates, so a lookup is one indexed query per band and costs about
+the same for a thousand or a million stored documents.  Candidates are
+then checked against the full signature.
+
+With 128 permutations in 16 bands of 8 rows, pairs at Jaccard 0.8 become
+candidates with probability > 0.99 and pairs at 0.4 with < 0.01.
+
+Signatures are computed with NumPy when it is installed and with plain
+Python (several times slower) otherwise.
+
+    index = NearDuplicateIndex('knowledge/near_duplicates.sqlite3')
+    signature = index.signature(artifact['text'])
+    matches = index.query(signature, exclude=artifact['content_hash'])
+    index.add(artifact['content_hash'], signature)
+"""
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # pure Python signatures
+    np = None
+
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+WORD = re.compile(r'[^\W_]+')
+SHINGLE_WORDS = 5
+BLOCK = 4096  # shingles hashed at once, bounds the memory of the NumPy path
+
+
+def shingle_hashes(text, k=SHINGLE_WORDS):
+    """32-bit hashes of the distinct word k-grams of ``text``."""
+    words = WORD.findall(text.lower())
+    if len(words) < k:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))} if words else set()
+    return {zlib.crc32(' '.join(words[i:i + k]).encode('utf-8')) for i in range(len(words) - k + 1)}
+
+
+class NearDuplicateIndex:
+    """SQLite-backed MinHash LSH index of document signatures."""
+
+    def __init__(self, path, num_perm=128, bands=16, threshold=0.8, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.lookups = 0
+        self.flagged = 0
+        self._lock = threading.Lock()
+
+        # Hash functions h(x) = (a * x + b) mod p; a, b < 2**32 so a * x + b fits in 64 bits
+        rng = random.Random(seed)
+        self._perms = [(rng.randint(1, MAX_HASH), rng.randint(0, MAX_HASH)) for _ in range(num_perm)]
+        if np is not None:
+            self._a = np.array([a for a, _ in self._perms], dtype=np.uint64)
+            self._b = np.array([b for _, b in self._perms], dtype=np.uint64)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS signatures ('
+                'doc_id TEXT PRIMARY KEY, signature BLOB NOT NULL, shingles INTEGER, created_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS lsh_bands ('
+                'band INTEGER NOT NULL, bucket INTEGER NOT NULL, doc_id TEXT NOT NULL, '
+                'PRIMARY KEY (band, bucket, doc_id)) WITHOUT ROWID'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def signature(self, text):
+        """MinHash signature of ``text`` as a tuple of ``num_perm`` 32-bit values."""
+        hashes = shingle_hashes(text)
+        if not hashes:
+            return (MAX_HASH,) * self.num_perm
+        if np is None:
+            return tuple(min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in self._perms)
+
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        signature = np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(values), BLOCK):
+            block = values[start:start + BLOCK, None]
+            hashed = ((self._a * block + self._b) % MERSENNE_PRIME) & MAX_HASH
+            np.minimum(signature, hashed.min(axis=0), out=signature)
+        return tuple(int(v) for v in signature)
+
+    def _buckets(self, signature):
+        """One 64-bit bucket id per band."""
+        buckets = []
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(struct.pack(f'<{self.rows}I', *values), digest_size=8).digest()
+            buckets.append((band, int.from_bytes(digest, 'little', signed=True)))
+        return buckets
+
+    @staticmethod
+    def similarity(a, b):
+        """Estimated Jaccard similarity of the documents behind two signatures."""
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+    def add(self, doc_id, signature, shingles=None):
+        """Store a document's signature (replacing an earlier one for the same id)."""
+        self.add_many([(doc_id, signature, shingles)])
+
+    def add_many(self, documents):
+        """Store ``(doc_id, signature[, shingles])`` tuples in one transaction."""
+        with self._connect() as conn:
+            for doc_id, signature, *rest in documents:
+                old = conn.execute('SELECT signature FROM signatures WHERE doc_id = ?', (doc_id,)).fetchone()
+                if old:
+                    previous = struct.unpack(f'<{self.num_perm}I', old[0])
+                    conn.executemany(
+                        'DELETE FROM lsh_bands WHERE band = ? AND bucket = ? AND doc_id = ?',
+                        [(band, bucket, doc_id) for band, bucket in self._buckets(previous)]
+                    )
+                conn.execute(
+                    'INSERT OR REPLACE INTO signatures (doc_id, signature, shingles, created_at) VALUES (?, ?, ?, ?)',
+                    (doc_id, struct.pack(f'<{self.num_perm}I', *signature), rest[0] if rest else None, time.time())
+                )
+                conn.executemany(
+                    'INSERT OR IGNORE INTO lsh_bands (band, bucket, doc_id) VALUES (?, ?, ?)',
+                    [(band, bucket, doc_id) for band, bucket in self._buckets(signature)]
+                )
+
+    def query(self, signature, exclude=None, limit=5, max_candidates=100):
+        """Return ``(doc_id, similarity)`` of stored documents at or above the threshold, most similar first."""
+        buckets = self._buckets(signature)
+        # One primary-key lookup per band
+        lookups = ' UNION ALL '.join(['SELECT doc_id FROM lsh_bands WHERE band = ? AND bucket = ?'] * len(buckets))
+        params = [v for pair in buckets for v in pair]
+        with self._connect() as conn:
+            # Documents sharing more bands are likelier to be similar; check those first
+            candidates = [doc_id for doc_id, _ in conn.execute(
+                f'SELECT doc_id, COUNT(*) AS shared FROM ({lookups}) GROUP BY doc_id ORDER BY shared DESC LIMIT ?',
+                params + [max_candidates + 1]
+            ) if doc_id != exclude][:max_candidates]
+            stored = conn.execute(
+                f"SELECT doc_id, signature FROM signatures WHERE doc_id IN ({','.join('?' * len(candidates))})",
+                candidates
+            ).fetchall() if candidates else []
+
+        matches = []
+        for doc_id, blob in stored:
+            similarity = self.similarity(signature, struct.unpack(f'<{self.num_perm}I', blob))
+            if similarity >= self.threshold:
+                matches.append((doc_id, round(similarity, 4)))
+        matches.sort(key=lambda m: m[1], reverse=True)
+        with self._lock:
+            self.lookups += 1
+            self.flagged += bool(matches)
+        return matches[:limit]
+
+    def stats(self):
+        with self._connect() as conn:
+            documents = conn.execute('SELECT COUNT(*) FROM signatures').fetchone()[0]
+        with self._lock:
+            return {
+                'documents': documents,
+                'lookups': self.lookups,
+                'flagged': self.flagged,
+                'threshold': self.threshold,
+                'num_perm': self.num_perm,
+                'bands': self.bands,
+                'numpy': np is not None
+            }
@@ -0,0 +1,300 @@
+"""Opt-in profiling of selected requests and the jobs they start.
+
+A request is profiled when it carries ``X-Profile: 1`` plus a matching
+``X-Profile-Token`` or is picked by the sampling rate.  Without a configured
+token only sampling works, and stored profiles cannot be read.  Two modes:
+
+* ``sample`` (default): a background thread records the profiled thread's
+  Python stack every few milliseconds.  Overhead is low and the result is
+  real call stacks, exported as collapsed stacks (flamegraph.pl, inferno)
+  or speedscope JSON (https://www.speedscope.app).
+* ``cprofile``: deterministic cProfile of the thread, exported as a pstats
+  summary.  Exact call counts, but it slows the profiled code down.
+
+Analysis runs on the job queue rather than in the request, so work handed to
+a job from a profiled request is profiled too (``follow``), as a separate
+profile that points back to the request's.  Work the job fans out to a
+thread pool (document chunks) is folded into the job's profile (``attach``).  Profiles are stored as JSON in
+a directory that keeps the newest ``max_profiles``.  When profiling is
+disabled the app never creates a RequestProfiler, so requests pay nothing.
+"""
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """One thread that samples the stacks of every thread being profiled."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, thread_id, samples):
+        with self._lock:
+            self._targets[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def remove(self, thread_id):
+        with self._lock:
+            self._targets.pop(thread_id, None)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                targets = list(self._targets.items())
+            frames = sys._current_frames()
+            for thread_id, samples in targets:
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                samples[tuple(reversed(stack))] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class Profile:
+    """One profiled request or job while it runs."""
+
+    def __init__(self, kind, label, mode, parent=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.label = label
+        self.mode = mode
+        self.parent = parent
+        self.started_at = datetime.now().isoformat()
+        self.thread_id = threading.get_ident()
+        self.samples = Counter()
+        self.profiler = None
+        self.helpers = []  # cProfile runs of attached worker threads
+        self._started = time.perf_counter()
+        self.seconds = None
+
+    def to_dict(self, interval):
+        record = {
+            'id': self.id,
+            'kind': self.kind,
+            'label': self.label,
+            'mode': self.mode,
+            'parent': self.parent,
+            'started_at': self.started_at,
+            'seconds': round(self.seconds, 6),
+            'interval': interval
+        }
+        if self.mode == 'sample':
+            record['samples'] = [[list(stack), count] for stack, count in self.samples.most_common()]
+        else:
+            out = io.StringIO()
+            stats = pstats.Stats(self.profiler, *self.helpers, stream=out)
+            stats.sort_stats('cumulative').print_stats(60)
+            record['pstats'] = out.getvalue()
+        return record
+
+
+class RequestProfiler:
+    """Decides which requests to profile, runs the profiler and stores the results."""
+
+    def __init__(self, directory, sample_rate=0.0, mode='sample', interval=0.005, token=None, max_profiles=200):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval
+        self.token = token
+        self.max_profiles = max_profiles
+        self.sampler = StackSampler(interval)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def authorized(self, headers):
+        """True if the headers carry the configured token; nobody is authorized without one."""
+        return bool(self.token) and hmac.compare_digest(headers.get('X-Profile-Token', ''), self.token)
+
+    def wants(self, headers):
+        """True if a request with these headers should be profiled."""
+        if headers.get('X-Profile'):
+            return self.authorized(headers)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, kind, label, parent=None):
+        profile = Profile(kind, label, self.mode, parent)
+        if self.mode == 'sample':
+            self.sampler.add(profile.thread_id, profile.samples)
+        else:
+            profile.profiler = cProfile.Profile()
+            try:
+                profile.profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one cProfile at a time; skip this one
+                return None
+        self._local.current = profile
+        return profile
+
+    def stop(self, profile, **meta):
+        """Finish ``profile``, store it and return its id."""
+        profile.seconds = time.perf_counter() - profile._started
+        if profile.mode == 'sample':
+            self.sampler.remove(profile.thread_id)
+        else:
+            profile.profiler.disable()
+        self._local.current = None
+        record = profile.to_dict(self.interval)
+        record.update(meta)
+        self._save(record)
+        return profile.id
+
+    @property
+    def current(self):
+        return getattr(self._local, 'current', None)
+
+    def follow(self, fn):
+        """Wrap ``fn`` so it is profiled on its worker thread if the calling request is being profiled."""
+        parent = self.current
+        if parent is None:
+            return fn
+
+        def profiled(*args, **kwargs):
+            profile = self.start('job', getattr(fn, '__name__', 'job'), parent=parent.id)
+            if profile is None:
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.stop(profile)
+        return profiled
+
+    def attach(self, fn):
+        """Wrap ``fn`` so that, run on a pool thread, it counts towards the caller's profile."""
+        parent = self.current
+        if parent is None:
+            return fn
+
+        def attached(*args, **kwargs):
+            thread_id = threading.get_ident()
+            if parent.mode == 'sample':
+                self.sampler.add(thread_id, parent.samples)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.sampler.remove(thread_id)
+            helper = cProfile.Profile()
+            try:
+                helper.enable()
+            except ValueError:
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                helper.disable()
+                parent.helpers.append(helper)
+        return attached
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def _save(self, record):
+        with self._write_lock:
+            with open(self._path(record['id']), 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            entries = sorted(os.scandir(self.directory), key=lambda e: e.stat().st_mtime)
+            for entry in entries[:max(0, len(entries) - self.max_profiles)]:
+                os.remove(entry.path)
+        logger.info('Stored profile', extra={
+            'profile_id': record['id'], 'label': record['label'], 'seconds': record['seconds']
+        })
+
+    def load(self, profile_id):
+        """Return a stored profile, or None for unknown or malformed ids."""
+        if len(profile_id) != 32 or not all(c in '0123456789abcdef' for c in profile_id):
+            return None
+        try:
+            with open(self._path(profile_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self):
+        """Metadata of every stored profile, newest first."""
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            record = self.load(entry.name[:-len('.json')])
+            if record:
+                record.pop('samples', None)
+                record.pop('pstats', None)
+                profiles.append(record)
+        return sorted(profiles, key=lambda p: p['started_at'], reverse=True)
+
+
+def to_collapsed(record):
+    """Collapsed stacks, one ``frame;frame;frame count`` line per distinct stack."""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in record['samples'])
+
+
+def to_speedscope(record):
+    """A speedscope file with one sampled profile."""
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, count in record['samples']:
+        indices = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                name, _, location = label.rpartition(' (')
+                file, _, line = location.rstrip(')').rpartition(':')
+                frames.append({'name': name, 'file': file, 'line': int(line) if line.isdigit() else None})
+            indices.append(index[label])
+        samples.append(indices)
+        weights.append(count * record['interval'])
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': record['label'],
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights
+        }],
+        'name': f"{record['label']} {record['started_at']}",
+        'exporter': 'knowha profiling'
+    }
@@ -0,0 +1,184 @@
+"""Analysis prompt compiler.
+
+The instruction block of the analysis prompt is the same for every request
+and the element list only changes with the knowledge type, so both are
+built once and cached; per request only the document excerpt is added.
+The layout puts the static parts first (system message, then the per-type
+element list) and the document last, so consecutive requests share the
+longest possible prefix and provider-side prompt caching can reuse it.
+
+The excerpt is packed into a token budget instead of being cut at a fixed
+number of characters: every heading goes in first, then the opening of
+each section, then more of each section in turn until the budget is used,
+with ``[...]`` marking what was left out.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from chunking import sections_from_outline, split_sections
+
+try:
+    import tiktoken
+except ImportError:  # fall back to an approximate count
+    tiktoken = None
+
+
+SYSTEM_PROMPT = """You are a technical document analyst. Analyze documents by evaluating the presence and quality of required elements. Always respond with valid JSON.
+
+For each required element, determine its status: EXISTS (complete and well-documented), PARTIAL (present but needs improvement), or MISSING (completely absent).
+
+For each element, provide:
+1. Status (EXISTS, PARTIAL, or MISSING)
+2. Brief description of what you found (or what's missing)
+3. Specific action needed to improve (if PARTIAL or MISSING)
+
+Also provide:
+- Overall quality score (0-100)
+- 3-5 overall recommendations for the document
+
+Format your response as JSON:
+{
+    "elements": [
+        {
+            "name": "Element Name",
+            "status": "EXISTS|PARTIAL|MISSING",
+            "description": "What was found or what's missing",
+            "action": "What needs to be done (if applicable)"
+        }
+    ],
+    "quality_score": 75,
+    "recommendations": ["Recommendation 1", "Recommendation 2"]
+}"""
+
+OMITTED = '[...]'
+UNIT_TOKENS = 60  # sections are packed in pieces of about this many tokens
+APPROX_TOKEN = re.compile(r"\w{1,6}|[^\w\s]")
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+PromptTemplate = namedtuple('PromptTemplate', ['system', 'prefix', 'fixed_tokens'])
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+
+
+def count_tokens(text, model='gpt-4o-mini'):
+    """Token count of ``text``; exact with tiktoken, approximate without it."""
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text, disallowed_special=()))
+    # Words of up to six letters are usually one token; longer words count once per six letters
+    return len(APPROX_TOKEN.findall(text))
+
+
+@lru_cache(maxsize=256)
+def compile_template(title, elements, model='gpt-4o-mini'):
+    """Build (once per knowledge type and element list) the static parts of the prompt."""
+    prefix = (f"Analyze this {title} document and evaluate the following required elements.\n\n"
+              "Required Elements to Check:\n"
+              + '\n'.join(f"- {element}" for element in elements)
+              + "\n\n")
+    return PromptTemplate(SYSTEM_PROMPT, prefix, count_tokens(SYSTEM_PROMPT + prefix, model))
+
+
+def _units(section, model):
+    """Yield (text, tokens) pieces of a section: lines, split further at sentences and words."""
+    for line in section.split('\n'):
+        if not line.strip():
+            continue
+        tokens = count_tokens(line, model)
+        if tokens <= UNIT_TOKENS:
+            yield line, tokens
+            continue
+        for sentence in SENTENCE_END.split(line):
+            tokens = count_tokens(sentence, model)
+            if tokens <= UNIT_TOKENS:
+                yield sentence, tokens
+                continue
+            words = sentence.split(' ')
+            step = max(1, len(words) * UNIT_TOKENS // tokens)
+            for i in range(0, len(words), step):
+                piece = ' '.join(words[i:i + step])
+                yield piece, count_tokens(piece, model)
+
+
+def pack_document(text, budget, outline=None, model='gpt-4o-mini'):
+    """Fit ``text`` into ``budget`` tokens, keeping headings and section openings first."""
+    if budget <= 0:
+        return ''
+    # Counting a whole long document is wasted work when it clearly cannot fit
+    if len(text) < 16 * budget and count_tokens(text, model) <= budget:
+        return text
+
+    sections = sections_from_outline(text, outline) if outline else split_sections(text)
+    sources = [_units(section, model) for section in sections]
+    kept = [[] for _ in sections]
+    exhausted = [False] * len(sections)
+    marker = count_tokens(OMITTED, model) + 1
+    used = marker  # for a gap at the end
+
+    # Round-robin over sections: first unit (the heading) of every section,
+    # then the second unit of every section, and so on
+    active = list(range(len(sections)))
+    while active and used < budget:
+        still_active = []
+        for index in active:
+            unit = next(sources[index], None)
+            if unit is None:
+                exhausted[index] = True
+                continue
+            text_unit, tokens = unit
+            # A section's first unit also pays for the gap marker that may follow it
+            cost = tokens + 1 + (0 if kept[index] else marker)
+            if used + cost > budget:
+                continue  # this section is done; smaller pieces of others may still fit
+            kept[index].append(text_unit)
+            used += cost
+            still_active.append(index)
+        active = still_active
+    for index, units in enumerate(kept):
+        if units and not exhausted[index]:
+            exhausted[index] = next(sources[index], None) is None
+
+    parts = []
+    for index, units in enumerate(kept):
+        if not units:
+            if not parts or parts[-1] != OMITTED:
+                parts.append(OMITTED)
+            continue
+        parts.extend(units)
+        if not exhausted[index]:
+            parts.append(OMITTED)
+    packed = '\n'.join(parts)
+
+    # Joining can merge or split tokens at the seams; trim until it really fits
+    while parts and count_tokens(packed, model) > budget:
+        parts.pop()
+        packed = '\n'.join(parts)
+    return packed
+
+
+def _part_note(part):
+    if part is None:
+        return ''
+    return (f"The content below is part {part[0] + 1} of {part[1]} of the document. "
+            "Judge each element only on this part; mark elements not covered here as MISSING.\n\n")
+
+
+def document_budget(doc_info, elements, budget, part=None, model='gpt-4o-mini'):
+    """Tokens left for the document in a prompt of ``budget`` tokens."""
+    template = compile_template(doc_info['title'], tuple(elements), model)
+    header = _part_note(part) + "Document Content:\n"
+    return budget - template.fixed_tokens - count_tokens(header, model)
+
+
+def build_prompt(doc_info, elements, content, budget, part=None, outline=None, model='gpt-4o-mini'):
+    """Return ``(system, user)`` messages with the document packed into ``budget`` prompt tokens."""
+    template = compile_template(doc_info['title'], tuple(elements), model)
+    header = _part_note(part) + "Document Content:\n"
+    available = document_budget(doc_info, elements, budget, part, model)
+    return template.system, template.prefix + header + pack_document(content, available, outline, model)
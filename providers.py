@@ -0,0 +1,285 @@
+"""Analysis backends: one interface over OpenAI, Gemini and a local mock.
+
+Every backend turns a (system, prompt) pair into text, either in one piece
+(``complete``) or as a stream of text deltas (``stream``), and keeps call,
+latency and token counters.  The mock backend answers deterministically after
+a configurable delay without any network access, which is what load tests
+and provider comparisons run against.
+
+    backend = create_backend(app, llm_clients)
+    completion = backend.complete(system, prompt, max_tokens=1500)
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+
+from metrics import LLM_ERRORS, LLM_SECONDS, LLM_TOKENS
+from prompts import count_tokens
+
+try:
+    import google.generativeai as genai
+except ImportError:  # only needed for the Gemini backend
+    genai = None
+
+
+Completion = namedtuple('Completion', ['text', 'prompt_tokens', 'completion_tokens'])
+
+
+class AnalysisBackend:
+    """Base class; subclasses implement ``_complete`` and ``_stream``."""
+
+    name = None
+    missing_config_message = 'Analysis backend not configured'
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.latency_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def configured(self):
+        return True
+
+    @property
+    def cache_id(self):
+        """Identifies the backend and model in analysis cache keys."""
+        return f"{self.name}:{self.model}"
+
+    def _record(self, started, mode, prompt_tokens=0, completion_tokens=0, error=False):
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.latency_seconds += seconds
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        LLM_SECONDS.observe(seconds, backend=self.name, mode=mode)
+        if error:
+            LLM_ERRORS.inc(backend=self.name)
+        LLM_TOKENS.inc(prompt_tokens, backend=self.name, direction='prompt')
+        LLM_TOKENS.inc(completion_tokens, backend=self.name, direction='completion')
+
+    def complete(self, system, prompt, max_tokens=1500, temperature=0.3):
+        """Return a Completion for ``prompt``."""
+        started = time.perf_counter()
+        try:
+            completion = self._complete(system, prompt, max_tokens, temperature)
+        except Exception:
+            self._record(started, 'complete', error=True)
+            raise
+        self._record(started, 'complete', completion.prompt_tokens, completion.completion_tokens)
+        return completion
+
+    def stream(self, system, prompt, max_tokens=1500, temperature=0.3):
+        """Yield the response text in pieces as the backend produces them."""
+        started = time.perf_counter()
+        parts = []
+        try:
+            for delta in self._stream(system, prompt, max_tokens, temperature):
+                parts.append(delta)
+                yield delta
+        except Exception:
+            self._record(started, 'stream', error=True)
+            raise
+        self._record(started, 'stream', count_tokens(system + prompt, self.model), count_tokens(''.join(parts), self.model))
+
+    def _complete(self, system, prompt, max_tokens, temperature):
+        raise NotImplementedError
+
+    def _stream(self, system, prompt, max_tokens, temperature):
+        # Backends without streaming hand over the whole answer at once
+        yield self._complete(system, prompt, max_tokens, temperature).text
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'model': self.model,
+                'calls': self.calls,
+                'errors': self.errors,
+                'avg_latency_ms': round(1000 * self.latency_seconds / self.calls, 3) if self.calls else 0.0,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens
+            }
+
+
+class OpenAIBackend(AnalysisBackend):
+    """Chat completions through the shared, pooled LLMClientManager."""
+
+    name = 'openai'
+    missing_config_message = 'OpenAI API key not configured. Please set OPENAI_API_KEY in .env file'
+
+    def __init__(self, model='gpt-4o-mini', llm_clients=None, timeout=30):
+        super().__init__(model)
+        if llm_clients is None:
+            from llm_client import LLMClientManager
+            llm_clients = LLMClientManager()
+        self.llm_clients = llm_clients
+        self.timeout = timeout
+
+    @property
+    def configured(self):
+        return self.llm_clients.configured
+
+    def _messages(self, system, prompt):
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _complete(self, system, prompt, max_tokens, temperature):
+        response = self.llm_clients.chat_completion(
+            model=self.model,
+            messages=self._messages(system, prompt),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=self.timeout
+        )
+        text = response.choices[0].message.content or ''
+        usage = response.usage
+        if usage is None:
+            return Completion(text, count_tokens(system + prompt, self.model), count_tokens(text, self.model))
+        return Completion(text, usage.prompt_tokens, usage.completion_tokens)
+
+    def _stream(self, system, prompt, max_tokens, temperature):
+        response = self.llm_clients.stream_chat_completion(
+            model=self.model,
+            messages=self._messages(system, prompt),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=self.timeout
+        )
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
+class GeminiBackend(AnalysisBackend):
+    """Google Gemini via google-generativeai (optional dependency)."""
+
+    name = 'gemini'
+    missing_config_message = 'Gemini API key not configured. Please set GOOGLE_API_KEY in .env file'
+
+    def __init__(self, model='gemini-pro', api_key=None, timeout=30):
+        super().__init__(model)
+        self.api_key = api_key or os.getenv('GOOGLE_API_KEY')
+        self.timeout = timeout
+        if genai is not None and self.api_key:
+            genai.configure(api_key=self.api_key)
+
+    @property
+    def configured(self):
+        return genai is not None and bool(self.api_key)
+
+    def _generate(self, system, prompt, max_tokens, temperature, stream):
+        if genai is None:
+            raise RuntimeError('google-generativeai is not installed')
+        model = genai.GenerativeModel(self.model, system_instruction=system or None)
+        return model.generate_content(
+            prompt,
+            generation_config={
+                'max_output_tokens': max_tokens,
+                'temperature': temperature,
+                'top_p': 0.8,
+            },
+            request_options={'timeout': self.timeout},
+            stream=stream
+        )
+
+    def _complete(self, system, prompt, max_tokens, temperature):
+        response = self._generate(system, prompt, max_tokens, temperature, stream=False)
+        text = response.text
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is None:
+            return Completion(text, count_tokens(system + prompt, self.model), count_tokens(text, self.model))
+        return Completion(text, usage.prompt_token_count, usage.candidates_token_count)
+
+    def _stream(self, system, prompt, max_tokens, temperature):
+        for chunk in self._generate(system, prompt, max_tokens, temperature, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+ELEMENT_BLOCK = re.compile(r'Required Elements to Check:\s*\n(.*?)(?:\n\s*\n|$)', re.DOTALL)
+ELEMENT_LINE = re.compile(r'^\s*- (.+)$', re.MULTILINE)
+MOCK_STATUSES = ['EXISTS', 'EXISTS', 'PARTIAL', 'MISSING']
+SECTION_HEADER = re.compile(r'Document type: .+\nSection: (.+)')
+
+
+def mock_response(prompt):
+    """Deterministic answer shaped like what the prompt asks for."""
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+    section = SECTION_HEADER.match(prompt)
+    if section:
+        # Enhancement prompts ask for the body of one section
+        name = section.group(1).strip()
+        return '\n\n'.join([
+            f"This section sets out the {name.lower()} of the work described in this document.",
+            '\n'.join(f"- [Key point {i} about {name.lower()}]" for i in range(1, rng.randint(3, 5))),
+            'See the preceding sections for the supporting details.'
+        ])
+    # Analysis and repair prompts get the JSON analysis of the listed elements
+    block = ELEMENT_BLOCK.search(prompt)
+    names = ELEMENT_LINE.findall(block.group(1)) if block else []
+    return json.dumps({
+        'elements': [
+            {
+                'name': name.strip(),
+                'status': rng.choice(MOCK_STATUSES),
+                'description': f'Mock assessment of {name.strip()}.',
+                'action': f'Review the {name.strip()} section.'
+            }
+            for name in names
+        ],
+        'quality_score': rng.randint(40, 95),
+        'recommendations': ['Add supporting evidence', 'Tighten the summary', 'Cite relevant standards']
+    })
+
+
+class MockBackend(AnalysisBackend):
+    """Offline backend with a fixed latency, for load tests and benchmarks."""
+
+    name = 'mock'
+
+    def __init__(self, model='mock', latency=0.0, chunk_size=40):
+        super().__init__(model)
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    def _complete(self, system, prompt, max_tokens, temperature):
+        time.sleep(self.latency)
+        text = mock_response(prompt)
+        return Completion(text, count_tokens(system + prompt, self.model), count_tokens(text, self.model))
+
+    def _stream(self, system, prompt, max_tokens, temperature):
+        time.sleep(self.latency)
+        text = mock_response(prompt)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+
+ANALYSIS_BACKENDS = {
+    'openai': lambda app, llm_clients: OpenAIBackend(app.config['OPENAI_MODEL'], llm_clients),
+    'gemini': lambda app, llm_clients: GeminiBackend(app.config['GEMINI_MODEL']),
+    'mock': lambda app, llm_clients: MockBackend(latency=app.config['MOCK_LATENCY']),
+}
+
+
+def create_backend(app, llm_clients=None):
+    """Build the backend selected by ``app.config['ANALYSIS_BACKEND']``."""
+    backend = app.config.get('ANALYSIS_BACKEND', 'openai')
+    if backend not in ANALYSIS_BACKENDS:
+        raise ValueError(f"Unknown ANALYSIS_BACKEND: {backend}")
+    return ANALYSIS_BACKENDS[backend](app, llm_clients)
@@ -0,0 +1,258 @@
+"""Server-side session storage.
+
+Flask's default session serialises everything into a signed cookie, which
+breaks down as soon as the extracted document text or the analysis result
+lands in ``session``.  The interface below keeps the session data on the
+server and only sends a short random session id to the browser.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import secrets
+import tempfile
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+
+
+logger = logging.getLogger(__name__)
+
+SID_LENGTH = 32
+
+
+class ServerSideSession(SecureCookieSession):
+    """Session dict that also remembers its server-side id."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+
+
+class FilesystemSessionStore:
+    """One file per session; the file's mtime is the last access time."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, f"{sid}.session")
+
+    def load(self, sid, lifetime):
+        path = self._path(sid)
+        try:
+            if os.path.getmtime(path) + lifetime < time.time():
+                self.delete(sid)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save(self, sid, payload, lifetime):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self._path(sid))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def exists(self, sid, lifetime):
+        try:
+            return os.path.getmtime(self._path(sid)) + lifetime >= time.time()
+        except OSError:
+            return False
+
+    def touch(self, sid, lifetime):
+        try:
+            os.utime(self._path(sid))
+        except OSError:
+            pass
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+
+    def sweep(self, lifetime):
+        """Remove expired sessions and return how many were deleted."""
+        cutoff = time.time() - lifetime
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.session'):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+class SQLiteSessionStore:
+    """All sessions in a single SQLite table indexed by expiry time."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'sid TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def load(self, sid, lifetime):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT data FROM sessions WHERE sid = ? AND expires_at >= ?',
+                (sid, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid, payload, lifetime):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)',
+                (sid, payload, time.time() + lifetime)
+            )
+
+    def exists(self, sid, lifetime):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM sessions WHERE sid = ? AND expires_at >= ?',
+                (sid, time.time())
+            ).fetchone()
+        return row is not None
+
+    def touch(self, sid, lifetime):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE sessions SET expires_at = ? WHERE sid = ?',
+                (time.time() + lifetime, sid)
+            )
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def sweep(self, lifetime):
+        """Remove expired sessions and return how many were deleted."""
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM sessions WHERE expires_at < ?', (time.time(),))
+            return cursor.rowcount
+
+
+# Backends selectable through app.config['SESSION_TYPE']
+SESSION_BACKENDS = {
+    'filesystem': lambda app: FilesystemSessionStore(app.config['SESSION_FILE_DIR']),
+    'sqlite': lambda app: SQLiteSessionStore(app.config['SESSION_SQLITE_PATH']),
+}
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Session interface that stores data in a backend and only sends the id."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, lifetime, sweep_interval=300):
+        self.store = store
+        self.lifetime = lifetime
+        self.sweep_interval = sweep_interval
+        self._stop = threading.Event()
+        if sweep_interval:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='session-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                removed = self.store.sweep(self.lifetime)
+                if removed:
+                    logger.info('Session sweeper removed expired sessions', extra={'removed': removed})
+            except Exception:
+                logger.exception('Session sweep failed')
+
+    def stop(self):
+        self._stop.set()
+
+    def session_exists(self, sid):
+        """True while the session ``sid`` has not expired."""
+        return self.store.exists(sid, self.lifetime)
+
+    def _new_session(self):
+        return ServerSideSession(sid=secrets.token_urlsafe(SID_LENGTH), new=True)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or len(sid) > 2 * SID_LENGTH or not sid.replace('-', '').replace('_', '').isalnum():
+            return self._new_session()
+
+        payload = self.store.load(sid, self.lifetime)
+        if payload is None:
+            return self._new_session()
+
+        try:
+            data = self.serializer.loads(payload.decode('utf-8'))
+        except Exception:
+            return self._new_session()
+        return ServerSideSession(data, sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.modified:
+            payload = self.serializer.dumps(dict(session)).encode('utf-8')
+            self.store.save(session.sid, payload, self.lifetime)
+        elif session.accessed:
+            # Sliding expiry: every request that uses the session keeps it alive
+            self.store.touch(session.sid, self.lifetime)
+
+        if session.new or session.modified or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def create_session_interface(app):
+    """Build the session interface configured by ``SESSION_TYPE``."""
+    backend = app.config.get('SESSION_TYPE', 'filesystem')
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"Unknown SESSION_TYPE: {backend}")
+    return ServerSideSessionInterface(
+        SESSION_BACKENDS[backend](app),
+        lifetime=int(app.permanent_session_lifetime.total_seconds()),
+        sweep_interval=app.config.get('SESSION_SWEEP_INTERVAL', 300),
+    )
@@ -0,0 +1,228 @@
+"""Share links backed by precomputed, static artifacts.
+
+Sharing renders the shared view once, as HTML and as JSON, and stores both
+under ``<directory>/<share_id>/`` next to gzip copies and, when the
+``brotli`` package is installed, brotli copies.  Opening a link is then a
+primary-key lookup and a file send: no template rendering, no LLM call and
+no compression per request.  Every artifact has a strong ETag (a hash of
+its bytes) and the share's creation time as its Last-Modified date.
+
+Share ids are 8 URL-safe characters (48 random bits).  Links expire
+``ttl`` seconds after they are created; expired shares are refused on
+lookup and a background sweeper deletes their rows and files.  ``find``
+lets a session that shares the same content again get its existing link.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+SHARE_ID = re.compile(r'[A-Za-z0-9_-]{8}')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+Share = namedtuple('Share', ['share_id', 'name', 'created_at', 'expires_at', 'etags'])
+
+
+class ShareStore:
+    """Short share ids with expiry, each pointing at a directory of precompressed artifacts."""
+
+    def __init__(self, directory, index_path, ttl=24 * 3600, sweep_interval=300, cache_size=1024):
+        self.directory = directory
+        self.index_path = index_path
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.cache_size = cache_size
+        self.encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        self.created = 0
+        self.reused = 0
+        self.expired = 0
+        self.last_sweep_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._cache = OrderedDict()  # share_id -> Share of recently opened links, most recent last
+
+        os.makedirs(directory, exist_ok=True)
+        index_dir = os.path.dirname(index_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS shares ('
+                'share_id TEXT PRIMARY KEY, owner TEXT, content_hash TEXT NOT NULL, name TEXT, '
+                'etags TEXT NOT NULL, bytes INTEGER NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS shares_owner ON shares (owner, content_hash)')
+            conn.execute('CREATE INDEX IF NOT EXISTS shares_expires_at ON shares (expires_at)')
+
+        if sweep_interval:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='share-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=10)
+
+    def path(self, share_id, artifact, encoding=None):
+        """Path of one artifact file; ``encoding`` is 'br', 'gzip' or None for the raw bytes."""
+        return os.path.join(self.directory, share_id, artifact + ENCODING_SUFFIXES.get(encoding, ''))
+
+    def find(self, owner, content_hash):
+        """Return the owner's live share of the same content, or None."""
+        if not owner:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT share_id, name, created_at, expires_at, etags FROM shares '
+                'WHERE owner = ? AND content_hash = ? AND expires_at > ? ORDER BY expires_at DESC LIMIT 1',
+                (owner, content_hash, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self.reused += 1
+        return Share(*row[:4], json.loads(row[4]))
+
+    def _write(self, target, artifacts):
+        """Write artifacts and their compressed copies to a fresh directory, then move it to ``target``."""
+        staging = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        total = 0
+        try:
+            for name, data in artifacts.items():
+                copies = {None: data, 'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    copies['br'] = brotli.compress(data, quality=11)
+                for encoding, blob in copies.items():
+                    with open(os.path.join(staging, name + ENCODING_SUFFIXES.get(encoding, '')), 'wb') as f:
+                        f.write(blob)
+                    total += len(blob)
+            os.replace(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return total
+
+    def new_id(self):
+        """Return a share id not used by any stored share."""
+        while True:
+            share_id = secrets.token_urlsafe(6)
+            if not os.path.exists(os.path.join(self.directory, share_id)):
+                return share_id
+
+    def create(self, share_id, artifacts, content_hash, owner=None, name=None, created_at=None):
+        """Store ``{artifact_name: bytes}`` under ``share_id`` (see ``new_id``) and return the Share.
+
+        ``content_hash`` identifies what is shared, for ``find``; the share
+        expires ``ttl`` seconds after ``created_at`` (default now).
+        """
+        created_at = time.time() if created_at is None else created_at
+        etags = {artifact: hashlib.sha256(data).hexdigest()[:32] for artifact, data in artifacts.items()}
+        size = self._write(os.path.join(self.directory, share_id), artifacts)
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO shares (share_id, owner, content_hash, name, etags, bytes, created_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (share_id, owner, content_hash, name, json.dumps(etags), size, created_at, created_at + self.ttl)
+            )
+        with self._lock:
+            self.created += 1
+        return Share(share_id, name, created_at, created_at + self.ttl, etags)
+
+    def get(self, share_id):
+        """Return the live Share for ``share_id``, or None if it is unknown or has expired.
+
+        Shares never change once created, so popular links are answered
+        from memory without touching the index.
+        """
+        if not SHARE_ID.fullmatch(share_id):
+            return None
+        with self._lock:
+            share = self._cache.get(share_id)
+            if share is not None:
+                self._cache.move_to_end(share_id)
+        if share is None:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT share_id, name, created_at, expires_at, etags FROM shares WHERE share_id = ?',
+                    (share_id,)
+                ).fetchone()
+            if row is None:
+                return None
+            share = Share(*row[:4], json.loads(row[4]))
+            with self._lock:
+                self._cache[share_id] = share
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return share if share.expires_at > time.time() else None
+
+    def delete(self, share_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM shares WHERE share_id = ?', (share_id,))
+        with self._lock:
+            self._cache.pop(share_id, None)
+        shutil.rmtree(os.path.join(self.directory, share_id), ignore_errors=True)
+
+    def sweep(self):
+        """Delete expired shares and directories no share points at; return how many shares expired."""
+        now = time.time()
+        with self._connect() as conn:
+            doomed = conn.execute('SELECT share_id FROM shares WHERE expires_at <= ?', (now,)).fetchall()
+            conn.executemany('DELETE FROM shares WHERE share_id = ?', doomed)
+            live = {row[0] for row in conn.execute('SELECT share_id FROM shares')}
+        for (share_id,) in doomed:
+            shutil.rmtree(os.path.join(self.directory, share_id), ignore_errors=True)
+        # Leftovers of interrupted writes, and directories whose row was removed
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and entry.name not in live and entry.stat().st_mtime < now - 60:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        with self._lock:
+            for (share_id,) in doomed:
+                self._cache.pop(share_id, None)
+            self.expired += len(doomed)
+            self.last_sweep_at = now
+        return len(doomed)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                expired = self.sweep()
+                if expired:
+                    logger.info('Share sweep finished', extra={'expired': expired})
+            except Exception:
+                logger.exception('Share sweep failed')
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._connect() as conn:
+            shares, total = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM shares WHERE expires_at > ?', (time.time(),)
+            ).fetchone()
+        with self._lock:
+            return {
+                'shares': shares,
+                'bytes': total,
+                'created': self.created,
+                'reused': self.reused,
+                'expired': self.expired,
+                'encodings': self.encodings,
+                'ttl': self.ttl,
+                'last_sweep_at': self.last_sweep_at
+            }
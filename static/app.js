@@ -1,6 +1,14 @@
 // Global state
 let selectedDocType = null;
 
+// Shared helpers
+// Escape text (server, LLM or user provided) before it goes into innerHTML
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text || '';
+    return div.innerHTML;
+}
+
 // Generic error handler
 function showError(message) {
     const errorDiv = document.getElementById('error-message');
@@ -199,7 +207,8 @@ async function handleFileUpload(file) {
             fileInfo.className = 'mt-6 p-4 bg-blue-50 rounded-lg upload-status';
             fileInfo.innerHTML = `
                 <h4 class="font-medium text-blue-900">Current File:</h4>
-                <p class="text-sm text-blue-800">${data.file_info.name} (${(data.file_info.size / 1024 / 1024).toFixed(2)}MB)</p>
+                <p class="text-sm text-blue-800">${escapeHtml(data.file_info.name)} (${(data.file_info.size / 1024 / 1024).toFixed(2)}MB)</p>
+                ${nearDuplicateNote(data.file_info.near_duplicates)}
             `;
             
             // Replace or add file info section
@@ -258,6 +267,18 @@ async function handleFileUpload(file) {
     }
 }
 
+// Note shown when an upload is nearly identical to an earlier one
+function nearDuplicateNote(matches) {
+    if (!matches || matches.length === 0) return '';
+    const match = matches[0];
+    const name = match.name ? `"${escapeHtml(match.name)}"` : 'an earlier upload';
+    return `
+        <p class="text-sm text-yellow-800 mt-2">
+            <i class="fas fa-clone mr-1"></i>Nearly identical to ${name} (${Math.round(match.similarity * 100)}% similar)
+        </p>
+    `;
+}
+
 // Analysis functionality
 async function initializeAnalysis() {
     // Show loading state immediately
@@ -270,7 +291,7 @@ async function initializeAnalysis() {
                         <circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle>
                         <path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path>
                     </svg>
-                    <p class="text-gray-600">Analyzing your document with ChatGPT...</p>
+                    <p class="analysis-progress text-gray-600">Analyzing your document with ChatGPT...</p>
                     <p class="text-gray-500 text-sm mt-2">This may take 5-10 seconds</p>
                 </div>
             </div>
@@ -290,44 +311,175 @@ async function initializeAnalysis() {
         const data = await response.json();
         console.log('Data:', data);
         
-        if (data.success) {
+        if (data.success && data.job_id) {
+            console.log('Analysis queued as job', data.job_id);
+            watchAnalysisJob(data);
+        } else {
+            console.error('Analysis failed:', data.error);
+            showAnalysisError('Analysis Failed', data.error || 'Failed to analyze document');
+        }
+    } catch (error) {
+        console.error('Error during analysis:', error);
+        showAnalysisError('Connection Error', 'Failed to connect to the server. Please try again.');
+    }
+}
+
+function showAnalysisError(title, message) {
+    const analysisSection = document.querySelector('.analysis-section');
+    if (!analysisSection) return;
+
+    analysisSection.innerHTML = `
+        <div class="bg-red-50 border border-red-200 rounded-lg p-6 text-center">
+            <svg class="w-12 h-12 text-red-500 mx-auto mb-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M12 8v4m0 4h.01M21 12a9 9 0 11-18 0 9 9 0 0118 0z"/>
+            </svg>
+            <h3 class="text-lg font-semibold text-red-900 mb-2">${escapeHtml(title)}</h3>
+            <p class="text-red-700 mb-4">${escapeHtml(message)}</p>
+            <button onclick="window.location.reload()" class="px-4 py-2 bg-red-600 text-white rounded-lg hover:bg-red-700">
+                Try Again
+            </button>
+        </div>
+    `;
+}
+
+function updateAnalysisProgress(message) {
+    const progressText = document.querySelector('.analysis-progress');
+    if (progressText && message) {
+        progressText.textContent = message;
+    }
+}
+
+// Follow a queued analysis job: subscribe to its event stream when the
+// browser supports it, otherwise (or if the stream fails) poll its status.
+function watchAnalysisJob(job) {
+    let finished = false;
+
+    if (window.EventSource) {
+        const source = new EventSource(job.events_url);
+        source.addEventListener('progress', (e) => {
+            updateAnalysisProgress(JSON.parse(e.data).message);
+        });
+        source.addEventListener('element', (e) => {
+            appendStreamedElement(JSON.parse(e.data));
+        });
+        ['done', 'failed'].forEach(name => {
+            source.addEventListener(name, () => {
+                finished = true;
+                source.close();
+                fetchAnalysisStatus(job.status_url);
+            });
+        });
+        source.onerror = () => {
+            // The server ends each stream after a while; the browser then reconnects
+            // by itself and resumes after the last event. Poll only if it gave up.
+            if (source.readyState !== EventSource.CLOSED) {
+                return;
+            }
+            if (!finished) {
+                pollAnalysisJob(job.status_url);
+            }
+        };
+    } else {
+        pollAnalysisJob(job.status_url);
+    }
+}
+
+async function pollAnalysisJob(statusUrl) {
+    const done = await fetchAnalysisStatus(statusUrl);
+    if (!done) {
+        setTimeout(() => pollAnalysisJob(statusUrl), 1000);
+    }
+}
+
+// Fetch the job status once; returns true when the job has finished.
+async function fetchAnalysisStatus(statusUrl) {
+    try {
+        const response = await fetch(statusUrl);
+        const data = await response.json();
+
+        if (data.status === 'done') {
             console.log('Analysis successful, displaying results');
             displayAnalysisResults(data.analysis);
             updateNextButtonState(true);
-        } else {
+            return true;
+        }
+        if (!data.success) {
             console.error('Analysis failed:', data.error);
-            if (analysisSection) {
-                analysisSection.innerHTML = `
-                    <div class="bg-red-50 border border-red-200 rounded-lg p-6 text-center">
-                        <svg class="w-12 h-12 text-red-500 mx-auto mb-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                            <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M12 8v4m0 4h.01M21 12a9 9 0 11-18 0 9 9 0 0118 0z"/>
-                        </svg>
-                        <h3 class="text-lg font-semibold text-red-900 mb-2">Analysis Failed</h3>
-                        <p class="text-red-700 mb-4">${data.error || 'Failed to analyze document'}</p>
-                        <button onclick="window.location.reload()" class="px-4 py-2 bg-red-600 text-white rounded-lg hover:bg-red-700">
-                            Try Again
-                        </button>
-                    </div>
-                `;
-            }
+            showAnalysisError('Analysis Failed', data.error || 'Failed to analyze document');
+            return true;
         }
+        return false;
     } catch (error) {
-        console.error('Error during analysis:', error);
-        if (analysisSection) {
-            analysisSection.innerHTML = `
-                <div class="bg-red-50 border border-red-200 rounded-lg p-6 text-center">
-                    <svg class="w-12 h-12 text-red-500 mx-auto mb-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M12 8v4m0 4h.01M21 12a9 9 0 11-18 0 9 9 0 0118 0z"/>
+        console.error('Error checking analysis status:', error);
+        showAnalysisError('Connection Error', 'Failed to connect to the server. Please try again.');
+        return true;
+    }
+}
+
+// Render a single element row of the analysis report
+function renderElementCard(element, index) {
+    // Element fields come from the LLM (possibly for another user's upload), so they are escaped
+    const statusClass = escapeHtml(element.status.toLowerCase());
+    const statusIcon = statusClass === 'exists' ? 'fa-check-circle' : 
+                      statusClass === 'partial' ? 'fa-exclamation-circle' : 
+                      'fa-times-circle';
+    const statusColor = statusClass === 'exists' ? 'text-green-600' : 
+                       statusClass === 'partial' ? 'text-yellow-600' : 
+                       'text-red-600';
+
+    return `
+        <div class="element-card ${statusClass} bg-white rounded-xl p-6 shadow-sm border border-gray-200" style="animation-delay: ${index * 0.1}s">
+            <div class="flex items-start justify-between mb-3">
+                <div class="flex items-center space-x-3">
+                    <i class="fas ${statusIcon} ${statusColor} text-2xl"></i>
+                    <h4 class="text-lg font-bold text-gray-900">${escapeHtml(element.name)}</h4>
+                </div>
+                <span class="status-badge status-${statusClass}">
+                    ${escapeHtml(element.status.toUpperCase())}
+                </span>
+            </div>
+            <p class="text-gray-700 mb-4">${escapeHtml(element.description)}</p>
+            ${element.action ? `
+                <div class="mt-4 p-4 bg-blue-50 border-l-4 border-blue-500 rounded">
+                    <p class="text-sm font-semibold text-blue-900 mb-1">
+                        <i class="fas fa-lightbulb text-blue-600 mr-2"></i>Action Required:
+                    </p>
+                    <p class="text-sm text-blue-800">${escapeHtml(element.action)}</p>
+                </div>
+            ` : ''}
+        </div>
+    `;
+}
+
+// Append an element that arrived over the event stream before the full
+// analysis (summary, score, recommendations) is available
+function appendStreamedElement(element) {
+    const analysisSection = document.querySelector('.analysis-section');
+    if (!analysisSection) return;
+
+    let list = analysisSection.querySelector('.streamed-elements');
+    if (!list) {
+        analysisSection.innerHTML = `
+            <div class="analysis-results">
+                <div class="mb-6 flex items-center space-x-3 text-gray-600">
+                    <svg class="animate-spin h-5 w-5 text-blue-600" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24">
+                        <circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle>
+                        <path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path>
                     </svg>
-                    <h3 class="text-lg font-semibold text-red-900 mb-2">Connection Error</h3>
-                    <p class="text-red-700 mb-4">Failed to connect to the server. Please try again.</p>
-                    <button onclick="window.location.reload()" class="px-4 py-2 bg-red-600 text-white rounded-lg hover:bg-red-700">
-                        Try Again
-                    </button>
+                    <p class="analysis-progress">Analyzing remaining elements...</p>
                 </div>
-            `;
-        }
+                <h3 class="text-xl font-bold text-gray-900 mb-4 flex items-center space-x-2">
+                    <i class="fas fa-list-check text-blue-600"></i>
+                    <span>Document Elements Analysis</span>
+                </h3>
+                <div class="streamed-elements space-y-4"></div>
+            </div>
+        `;
+        list = analysisSection.querySelector('.streamed-elements');
     }
+
+    list.insertAdjacentHTML('beforeend', renderElementCard(element, 0));
+    list.lastElementChild.classList.add('slide-in');
 }
 
 // Display analysis results with a nice UI
@@ -338,6 +490,23 @@ function displayAnalysisResults(analysis) {
     // Build the analysis report HTML
     let html = `
         <div class="analysis-results slide-in">
+            ${analysis.reused_from ? `
+                <div class="mb-6 p-4 bg-yellow-50 border border-yellow-200 rounded-lg text-sm text-yellow-800">
+                    <i class="fas fa-clone mr-2"></i>This document is a near-copy of
+                    ${analysis.reused_from.name ? `"${escapeHtml(analysis.reused_from.name)}"` : 'an earlier upload'}
+                    (${Math.round(analysis.reused_from.similarity * 100)}% similar); its analysis was reused.
+                </div>
+            ` : ''}
+            ${analysis.incremental ? `
+                <div class="mb-6 p-4 bg-blue-50 border border-blue-200 rounded-lg text-sm text-blue-800">
+                    <i class="fas fa-code-compare mr-2"></i>Compared with
+                    ${analysis.incremental.name ? `"${escapeHtml(analysis.incremental.name)}"` : 'your previous version'}:
+                    ${analysis.incremental.reanalyzed.length
+                        ? `re-checked ${analysis.incremental.reanalyzed.map(escapeHtml).join(', ')}`
+                        : 'no section changed'};
+                    ${analysis.incremental.carried_forward} unchanged element${analysis.incremental.carried_forward === 1 ? '' : 's'} carried forward.
+                </div>
+            ` : ''}
             <!-- Color Legend -->
             <div class="mb-8 p-6 bg-gradient-to-r from-gray-50 to-gray-100 rounded-xl border border-gray-200">
                 <h3 class="text-lg font-bold text-gray-900 mb-4 flex items-center space-x-2">
@@ -421,36 +590,7 @@ function displayAnalysisResults(analysis) {
     // Add each element
     if (analysis.elements && analysis.elements.length > 0) {
         analysis.elements.forEach((element, index) => {
-            const statusClass = element.status.toLowerCase();
-            const statusIcon = statusClass === 'exists' ? 'fa-check-circle' : 
-                              statusClass === 'partial' ? 'fa-exclamation-circle' : 
-                              'fa-times-circle';
-            const statusColor = statusClass === 'exists' ? 'text-green-600' : 
-                               statusClass === 'partial' ? 'text-yellow-600' : 
-                               'text-red-600';
-
-            html += `
-                <div class="element-card ${statusClass} bg-white rounded-xl p-6 shadow-sm border border-gray-200" style="animation-delay: ${index * 0.1}s">
-                    <div class="flex items-start justify-between mb-3">
-                        <div class="flex items-center space-x-3">
-                            <i class="fas ${statusIcon} ${statusColor} text-2xl"></i>
-                            <h4 class="text-lg font-bold text-gray-900">${element.name}</h4>
-                        </div>
-                        <span class="status-badge status-${statusClass}">
-                            ${element.status.toUpperCase()}
-                        </span>
-                    </div>
-                    <p class="text-gray-700 mb-4">${element.description || ''}</p>
-                    ${element.action ? `
-                        <div class="mt-4 p-4 bg-blue-50 border-l-4 border-blue-500 rounded">
-                            <p class="text-sm font-semibold text-blue-900 mb-1">
-                                <i class="fas fa-lightbulb text-blue-600 mr-2"></i>Action Required:
-                            </p>
-                            <p class="text-sm text-blue-800">${element.action}</p>
-                        </div>
-                    ` : ''}
-                </div>
-            `;
+            html += renderElementCard(element, index);
         });
     }
 
@@ -469,7 +609,7 @@ function displayAnalysisResults(analysis) {
                         ${analysis.recommendations.map(rec => `
                             <li class="flex items-start space-x-3">
                                 <i class="fas fa-arrow-right text-purple-600 mt-1"></i>
-                                <span class="text-gray-700">${rec}</span>
+                                <span class="text-gray-700">${escapeHtml(rec)}</span>
                             </li>
                         `).join('')}
                     </ul>
@@ -481,6 +621,253 @@ function displayAnalysisResults(analysis) {
     analysisSection.innerHTML = html;
 }
 
+// Enhancement functionality
+async function initializeEnhancement() {
+    const enhancementSection = document.querySelector('.enhancement-section');
+    // The page already shows the result when the document was enhanced before
+    if (!enhancementSection || !enhancementSection.querySelector('.loading-container')) return;
+
+    updateNextButtonState(false);
+    try {
+        const response = await fetch('/api/enhance', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        });
+        const data = await response.json();
+
+        if (data.success && data.job_id) {
+            console.log('Enhancement queued as job', data.job_id);
+            watchEnhancementJob(data);
+        } else {
+            console.error('Enhancement failed:', data.error);
+            showEnhancementError(data.error || 'Failed to enhance document');
+        }
+    } catch (error) {
+        console.error('Error during enhancement:', error);
+        showEnhancementError('Failed to connect to the server. Please try again.');
+    }
+}
+
+function showEnhancementError(message) {
+    const enhancementSection = document.querySelector('.enhancement-section');
+    if (!enhancementSection) return;
+
+    enhancementSection.innerHTML = `
+        <div class="bg-red-50 border border-red-200 rounded-lg p-6 text-center">
+            <h3 class="text-lg font-semibold text-red-900 mb-2">Enhancement Failed</h3>
+            <p class="text-red-700 mb-4">${escapeHtml(message)}</p>
+            <button onclick="window.location.reload()" class="px-4 py-2 bg-red-600 text-white rounded-lg hover:bg-red-700">
+                Try Again
+            </button>
+        </div>
+    `;
+}
+
+// Follow a queued enhancement job the same way as an analysis job: sections
+// are shown as they arrive, the full result once the job has finished.
+function watchEnhancementJob(job) {
+    let finished = false;
+
+    if (window.EventSource) {
+        const source = new EventSource(job.events_url);
+        source.addEventListener('progress', (e) => {
+            const progressText = document.querySelector('.enhancement-progress');
+            if (progressText) {
+                progressText.textContent = JSON.parse(e.data).message;
+            }
+        });
+        source.addEventListener('section', (e) => {
+            appendEnhancedSection(JSON.parse(e.data));
+        });
+        ['done', 'failed'].forEach(name => {
+            source.addEventListener(name, () => {
+                finished = true;
+                source.close();
+                fetchEnhancementStatus(job.status_url);
+            });
+        });
+        source.onerror = () => {
+            // The server ends each stream after a while; the browser then reconnects
+            // by itself and resumes after the last event. Poll only if it gave up.
+            if (source.readyState !== EventSource.CLOSED) {
+                return;
+            }
+            if (!finished) {
+                pollEnhancementJob(job.status_url);
+            }
+        };
+    } else {
+        pollEnhancementJob(job.status_url);
+    }
+}
+
+async function pollEnhancementJob(statusUrl) {
+    const done = await fetchEnhancementStatus(statusUrl);
+    if (!done) {
+        setTimeout(() => pollEnhancementJob(statusUrl), 1000);
+    }
+}
+
+// Fetch the job status once; returns true when the job has finished.
+async function fetchEnhancementStatus(statusUrl) {
+    try {
+        const response = await fetch(statusUrl);
+        const data = await response.json();
+
+        if (data.status === 'done') {
+            displayEnhancementResults(data.enhanced_content);
+            updateNextButtonState(true);
+            return true;
+        }
+        if (!data.success) {
+            showEnhancementError(data.error || 'Failed to enhance document');
+            return true;
+        }
+        return false;
+    } catch (error) {
+        console.error('Error checking enhancement status:', error);
+        showEnhancementError('Failed to connect to the server. Please try again.');
+        return true;
+    }
+}
+
+function renderEnhancedSection(section) {
+    const rewritten = section.kind === 'rewrite';
+    return `
+        <div class="border rounded-lg p-6 slide-in">
+            <div class="flex items-center justify-between mb-3">
+                <h4 class="font-medium text-gray-900">${escapeHtml(section.name)}</h4>
+                <span class="text-xs font-semibold uppercase ${rewritten ? 'text-yellow-700' : 'text-blue-700'}">
+                    ${rewritten ? 'Rewritten' : 'New section'}
+                </span>
+            </div>
+            ${section.error
+                ? `<p class="text-sm text-red-700">${escapeHtml(section.error)}</p>`
+                : `<div class="prose max-w-none whitespace-pre-wrap text-gray-700">${escapeHtml(section.text)}</div>`}
+        </div>
+    `;
+}
+
+// Append a section that arrived over the event stream while others are still being written
+function appendEnhancedSection(section) {
+    const enhancementSection = document.querySelector('.enhancement-section');
+    if (!enhancementSection) return;
+
+    let list = enhancementSection.querySelector('.enhanced-sections');
+    if (!list) {
+        enhancementSection.innerHTML = `
+            <div class="mb-6 flex items-center space-x-3 text-gray-600">
+                <div class="animate-spin rounded-full h-5 w-5 border-t-2 border-b-2 border-blue-500"></div>
+                <p class="enhancement-progress">Enhancing remaining sections...</p>
+            </div>
+            <div class="enhanced-sections space-y-4"></div>
+        `;
+        list = enhancementSection.querySelector('.enhanced-sections');
+    }
+    list.insertAdjacentHTML('beforeend', renderEnhancedSection(section));
+}
+
+function displayEnhancementResults(enhanced) {
+    const enhancementSection = document.querySelector('.enhancement-section');
+    if (!enhancementSection) return;
+
+    enhancementSection.innerHTML = `
+        <div class="enhancement-results">
+            <div class="bg-gray-50 rounded-lg p-6 mb-6">
+                <h4 class="font-medium text-gray-900 mb-4">Improvements Made</h4>
+                <ul class="space-y-2">
+                    ${(enhanced.improvements || []).map(improvement => `
+                        <li class="flex items-center text-sm text-gray-600">
+                            <i class="fas fa-check text-green-500 mr-2"></i>${escapeHtml(improvement)}
+                        </li>
+                    `).join('')}
+                </ul>
+            </div>
+            <div class="enhanced-sections space-y-4">
+                ${(enhanced.sections || []).map(renderEnhancedSection).join('')}
+            </div>
+        </div>
+    `;
+}
+
+// Step 5: create the share link (the server returns the existing one when
+// the same content was shared before) and show it.
+async function initializeShare() {
+    const input = document.querySelector('.share-url');
+    if (!input) return;
+
+    const expiry = document.querySelector('.share-expiry');
+    try {
+        const response = await fetch('/api/share', {method: 'POST'});
+        const data = await response.json();
+        if (data.success) {
+            input.value = data.share_info.share_url;
+            document.querySelector('.share-copy').disabled = false;
+            expiry.textContent = `Link expires in ${data.share_info.expiry}`;
+        } else {
+            input.placeholder = 'Link unavailable';
+            expiry.textContent = data.error || 'Could not create a share link';
+        }
+    } catch (error) {
+        console.error('Error creating share link:', error);
+        input.placeholder = 'Link unavailable';
+        expiry.textContent = 'Failed to connect to the server. Please try again.';
+    }
+}
+
+async function copyShareLink() {
+    const input = document.querySelector('.share-url');
+    if (!input || !input.value) return;
+    try {
+        await navigator.clipboard.writeText(input.value);
+    } catch (error) {
+        input.select();
+        document.execCommand('copy');
+    }
+    const button = document.querySelector('.share-copy');
+    button.textContent = 'Copied';
+    setTimeout(() => { button.textContent = 'Copy'; }, 2000);
+}
+
+// Export the enhanced document: a cached export downloads straight away,
+// otherwise the export job is polled until the file is ready.
+async function exportDocument(format) {
+    const button = document.querySelector(`.export-button[data-format="${format}"]`);
+    const status = document.querySelector('.export-status');
+    const label = button.querySelector('span');
+    const text = label.textContent;
+    button.disabled = true;
+    label.textContent = `Preparing ${format.toUpperCase()}...`;
+    status.textContent = '';
+
+    try {
+        const response = await fetch('/api/export', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({format})
+        });
+        let data = await response.json();
+        const statusUrl = data.status_url;
+        while (data.success && data.status !== 'done') {
+            await new Promise(resolve => setTimeout(resolve, 500));
+            data = await (await fetch(statusUrl)).json();
+        }
+        if (data.success) {
+            window.location.href = data.download_url;
+        } else {
+            status.textContent = data.error || `Could not export the document as ${format.toUpperCase()}`;
+        }
+    } catch (error) {
+        console.error('Error exporting document:', error);
+        status.textContent = 'Failed to connect to the server. Please try again.';
+    } finally {
+        button.disabled = false;
+        label.textContent = text;
+    }
+}
+
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
     const currentStep = getCurrentStep();
@@ -497,5 +884,11 @@ document.addEventListener('DOMContentLoaded', function() {
         case 3:
             initializeAnalysis();
             break;
+        case 4:
+            initializeEnhancement();
+            break;
+        case 5:
+            initializeShare();
+            break;
     }
 });
@@ -0,0 +1,352 @@
+"""Incremental, tolerant parsing of analysis responses.
+
+The model answers with a JSON object whose ``elements`` array is what the
+user is waiting for.  ``ElementStreamParser`` is fed the response text chunk
+by chunk and hands back every element object as soon as its closing brace
+arrives, so step 3 can render rows while the rest is still being generated.
+
+Responses are not always valid JSON: they come wrapped in markdown fences or
+prose, get cut off at ``max_tokens``, carry trailing commas or Python-style
+literals, or spell statuses and scores loosely.  ``parse_analysis`` recovers
+what it can from such text and ``validate_analysis`` normalises the result
+against the element schema and reports exactly which fields are still
+missing, so that only those need to be asked for again.
+"""
+import json
+import re
+
+
+ELEMENTS_ARRAY = re.compile(r'["\']elements["\']\s*:\s*\[')
+
+STATUSES = ('EXISTS', 'PARTIAL', 'MISSING')
+STATUS_ALIASES = {
+    'EXIST': 'EXISTS', 'PRESENT': 'EXISTS', 'COMPLETE': 'EXISTS', 'FOUND': 'EXISTS', 'YES': 'EXISTS',
+    'PARTIALLY': 'PARTIAL', 'INCOMPLETE': 'PARTIAL', 'PARTIALLY PRESENT': 'PARTIAL', 'NEEDS IMPROVEMENT': 'PARTIAL',
+    'ABSENT': 'MISSING', 'NOT FOUND': 'MISSING', 'NONE': 'MISSING', 'NO': 'MISSING', 'NOT PRESENT': 'MISSING'
+}
+ELEMENT_FIELDS = ('status', 'description', 'action')
+PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+SCORE = re.compile(r'\d+(\.\d+)?')
+WHITESPACE = re.compile(r'\s+')
+# Characters that need attention inside a double- or single-quoted string
+STRING_SPECIALS = {'"': re.compile(r'[\\"\n]'), "'": re.compile(r'[\\\'"\n]')}
+
+
+class ElementStreamParser:
+    """Pull complete objects out of the ``elements`` array of a partial JSON text."""
+
+    def __init__(self):
+        self.text = ''
+        self._pos = None        # scan position inside the elements array
+        self._depth = 0         # brace depth relative to the array
+        self._start = None      # start index of the object being read
+        self._in_string = False
+        self._escaped = False
+        self._done = False
+
+    def feed(self, chunk):
+        """Add a chunk of response text and return newly completed elements."""
+        self.text += chunk
+        if self._done:
+            return []
+
+        if self._pos is None:
+            match = ELEMENTS_ARRAY.search(self.text)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        found = []
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    element = self._decode(text[self._start:i + 1])
+                    if element is not None:
+                        found.append(element)
+                    self._start = None
+            elif char == ']' and self._depth == 0:
+                self._done = True
+                i += 1
+                break
+            i += 1
+        self._pos = i
+        return found
+
+    @staticmethod
+    def _decode(fragment):
+        try:
+            element = json.loads(fragment)
+        except json.JSONDecodeError:
+            try:
+                element = json.loads(close_truncated_json(fragment))
+            except json.JSONDecodeError:
+                return None
+        if isinstance(element, dict) and 'name' in element and 'status' in element:
+            return element
+        return None
+
+
+def close_truncated_json(text):
+    """Turn the JSON value that starts ``text`` into parseable JSON.
+
+    Text after the value is ignored, trailing commas are dropped, single
+    quoted strings and Python literals are converted, and a value that was
+    cut off is closed at the last point where everything before it was
+    complete (a string value that was cut off is kept and closed).
+    """
+    out = []
+    stack = []              # open '{' / '['
+    expect = []             # per level: 'key', 'value' or 'after'
+    checkpoint = (0, '')    # (len(out), closers) of the last complete prefix
+    quote = None            # quote character of the string being read
+    string_is_key = False
+    escaped = False
+    i = 0
+
+    def closers():
+        return ''.join('}' if c == '{' else ']' for c in reversed(stack))
+
+    def value_done():
+        if expect:
+            expect[-1] = 'after'
+
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+                out.append("'" if char == "'" and quote == "'" else '\\' + char)
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+                out.append('"')
+                if not string_is_key:
+                    value_done()
+                    checkpoint = (len(out), closers())
+            elif char == '"':
+                out.append('\\"')  # inside a single-quoted string
+            elif char == '\n':
+                out.append('\\n')
+            else:
+                # Copy plain string content up to the next special character in one go
+                match = STRING_SPECIALS[quote].search(text, i)
+                end = match.start() if match else len(text)
+                out.append(text[i:end])
+                i = end
+                continue
+            i += 1
+            continue
+
+        if char in '"\'':
+            quote = char
+            string_is_key = bool(expect) and expect[-1] == 'key'
+            out.append('"')
+        elif char in '{[':
+            stack.append(char)
+            expect.append('key' if char == '{' else 'value')
+            out.append(char)
+            checkpoint = (len(out), closers())
+        elif char in '}]':
+            if not stack:
+                break
+            while out and (out[-1] == ',' or out[-1].isspace()):
+                out.pop()
+            stack.pop()
+            expect.pop()
+            out.append('}' if char == '}' else ']')
+            value_done()
+            checkpoint = (len(out), closers())
+            if not stack:
+                return ''.join(out)
+        elif char == ':':
+            if expect:
+                expect[-1] = 'value'
+            out.append(char)
+        elif char == ',':
+            if expect:
+                expect[-1] = 'key' if stack[-1] == '{' else 'value'
+            out.append(char)
+        elif char.isspace():
+            end = WHITESPACE.match(text, i).end()
+            out.append(text[i:end])
+            i = end
+            continue
+        else:
+            # Number or literal: read up to the next delimiter
+            end = i
+            while end < len(text) and text[end] not in ',}] \n\t\r':
+                end += 1
+            token = PYTHON_LITERALS.get(text[i:end], text[i:end])
+            if end == len(text):
+                break  # may have been cut off mid-token
+            out.append(token)
+            value_done()
+            checkpoint = (len(out), closers())
+            i = end
+            continue
+        i += 1
+
+    if quote and not string_is_key:
+        return ''.join(out) + '"' + closers()
+    length, tail = checkpoint
+    return ''.join(out[:length]) + tail
+
+
+def parse_analysis(text):
+    """Best-effort decode of an analysis response; returns a dict or None.
+
+    Handles prose or markdown fences around the JSON, truncated output and
+    JSON that was encoded as a string.  When the object as a whole cannot be
+    decoded, the complete element objects that can be found are returned.
+    """
+    stripped = text.strip()
+    if stripped.startswith('"'):
+        try:
+            decoded = json.loads(stripped)
+            if isinstance(decoded, str):
+                return parse_analysis(decoded)
+        except json.JSONDecodeError:
+            pass
+
+    start = text.find('{')
+    if start < 0:
+        return None
+    # Fast path: the JSON is intact apart from whatever surrounds it
+    try:
+        data = json.loads(text[start:text.rfind('}') + 1])
+        if isinstance(data, dict):
+            return data
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        data = json.loads(close_truncated_json(text[start:]))
+        if isinstance(data, str):
+            return parse_analysis(data)
+        if isinstance(data, dict):
+            return data
+    except json.JSONDecodeError:
+        pass
+
+    parser = ElementStreamParser()
+    elements = parser.feed(text)
+    return {'elements': elements} if elements else None
+
+
+def normalize_status(value):
+    status = re.sub(r'[^A-Z ]', '', str(value).upper()).strip()
+    if status in STATUSES:
+        return status
+    return STATUS_ALIASES.get(status)
+
+
+def normalize_score(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        score = value
+    else:
+        match = SCORE.search(str(value))  # "80", "80/100", "Score: 80%"
+        if not match:
+            return None
+        score = float(match.group())
+    if 0 < score <= 1 and isinstance(score, float):
+        score *= 100
+    return int(round(score)) if 0 <= score <= 100 else None
+
+
+def validate_analysis(data, expected_elements):
+    """Normalise a parsed analysis against the element schema.
+
+    Returns ``(analysis, missing)``.  ``analysis`` has one entry per expected
+    element, in order, with whatever fields could be recovered; ``missing``
+    maps each element name to its absent fields (all of them if the element
+    was not returned at all) and ``''`` to absent top-level fields.
+    """
+    data = data if isinstance(data, dict) else {}
+    missing = {}
+    by_name = {}
+    for element in data.get('elements') or []:
+        if isinstance(element, dict) and element.get('name'):
+            by_name.setdefault(str(element['name']).strip().lower(), element)
+
+    elements = []
+    for name in expected_elements:
+        found = by_name.get(name.lower(), {})
+        element = {'name': name}
+        status = normalize_status(found.get('status', ''))
+        if status:
+            element['status'] = status
+        for field in ('description', 'action'):
+            value = found.get(field)
+            if isinstance(value, str) and (value.strip() or field == 'action'):
+                element[field] = value.strip()
+        if status == 'EXISTS' and 'action' not in element:
+            element['action'] = ''
+        # Extra keys the model added are kept; invalid schema fields stay absent so they get repaired
+        for key, value in found.items():
+            if key not in ELEMENT_FIELDS:
+                element.setdefault(key, value)
+        absent = [field for field in ELEMENT_FIELDS if field not in element]
+        if absent:
+            missing[name] = absent
+        elements.append(element)
+
+    analysis = {'elements': elements}
+    score = normalize_score(data.get('quality_score'))
+    if score is not None:
+        analysis['quality_score'] = score
+    recommendations = data.get('recommendations')
+    if isinstance(recommendations, str):
+        recommendations = [r.strip(' -*\u2022') for r in recommendations.split('\n') if r.strip(' -*\u2022')]
+    if isinstance(recommendations, list) and recommendations:
+        analysis['recommendations'] = [str(r) for r in recommendations]
+    top = [field for field in ('quality_score', 'recommendations') if field not in analysis]
+    if top:
+        missing[''] = top
+    return analysis, missing
+
+
+def merge_repair(analysis, repair, missing):
+    """Fill the fields listed in ``missing`` from a repair response; returns what is still missing."""
+    repaired, _ = validate_analysis(repair, [name for name in missing if name])
+    by_name = {e['name']: e for e in repaired['elements']}
+    still_missing = {}
+    for element in analysis['elements']:
+        fields = missing.get(element['name'])
+        if not fields:
+            continue
+        patch = by_name.get(element['name'], {})
+        absent = []
+        for field in fields:
+            if field in patch:
+                element[field] = patch[field]
+            else:
+                absent.append(field)
+        if absent:
+            still_missing[element['name']] = absent
+    absent = [field for field in missing.get('', []) if field not in repaired]
+    for field in missing.get('', []):
+        if field in repaired:
+            analysis[field] = repaired[field]
+    if absent:
+        still_missing[''] = absent
+    return still_missing
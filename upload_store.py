@@ -0,0 +1,416 @@
+"""Content-addressed store for uploaded documents.
+
+Uploads are streamed to a temporary file in chunks while being hashed and
+then moved to ``<sha256>.<ext>``, so two users uploading ``report.pdf`` at
+the same time never overwrite each other and identical files are stored
+once.  The extraction artifact lives next to the blob, which means a
+deduplicated upload reuses the text extracted the first time.  Blobs are
+sharded two levels deep on the hash (``ab/cd/abcd....pdf``) so that no
+directory grows large.
+
+Each session (the owner) references at most one blob, its current document.
+A SQLite index keeps the references and a reference count per blob.  A
+background sweeper
+
+* releases the references of sessions that have expired,
+* deletes blobs, with their artifacts, once they have had no references for
+  a grace period (an analysis already queued on a blob can still read it),
+* evicts least recently used blobs, unreferenced ones first, while the
+  store is over its byte quota, and
+* removes files left in the old flat upload folder once no session can
+  still point at them, and
+* deletes batch directories (copied inputs, unpacked archives, results)
+  that no running batch uses and nothing has written to for
+  ``batch_retention`` seconds.
+
+Batch directories count towards the byte quota and the stats too; their
+size is measured on every sweep.  While over the quota, unreferenced blobs
+go first, then idle batches, oldest first, then referenced blobs.
+"""
+import logging
+import os
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from artifacts import ARTIFACT_SUFFIX, artifact_path
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+LEGACY_EXTENSIONS = ('.pdf', '.docx', '.txt', ARTIFACT_SUFFIX)
+
+StoredUpload = namedtuple('StoredUpload', ['blob_id', 'path', 'size', 'created'])
+
+
+class UploadStore:
+    """Deduplicating, sharded blob directory with per-owner references and a byte quota."""
+
+    def __init__(self, directory, index_path, grace=600, max_bytes=0, owner_alive=None,
+                 owner_lifetime=1800, sweep_interval=300, legacy_directory=None,
+                 batch_directory=None, batch_retention=7 * 24 * 3600, batch_active=None):
+        self.directory = directory
+        self.index_path = index_path
+        self.grace = grace
+        self.max_bytes = max_bytes
+        self.owner_alive = owner_alive
+        self.owner_lifetime = owner_lifetime
+        self.sweep_interval = sweep_interval
+        self.legacy_directory = legacy_directory
+        self.batch_directory = batch_directory
+        self.batch_retention = batch_retention
+        self.batch_active = batch_active
+        self.uploads = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+        self.collected = 0
+        self.evictions = 0
+        self.expired_references = 0
+        self.legacy_removed = 0
+        self.batches_removed = 0
+        self._batches = {}  # batch directory name -> (bytes, last modified), as of the last sweep
+        self.last_sweep_at = None
+        self.last_sweep_seconds = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        os.makedirs(directory, exist_ok=True)
+        index_dir = os.path.dirname(index_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS blobs ('
+                'blob_id TEXT PRIMARY KEY, size INTEGER NOT NULL, refcount INTEGER NOT NULL, '
+                'created_at REAL NOT NULL, released_at REAL, last_used_at REAL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS refs ('
+                'owner TEXT PRIMARY KEY, blob_id TEXT NOT NULL, name TEXT, created_at REAL NOT NULL)'
+            )
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(blobs)')}
+            if 'last_used_at' not in columns:
+                conn.execute('ALTER TABLE blobs ADD COLUMN last_used_at REAL')
+                conn.execute('UPDATE blobs SET last_used_at = created_at')
+            conn.execute('CREATE INDEX IF NOT EXISTS blobs_released_at ON blobs (released_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS blobs_last_used_at ON blobs (last_used_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS refs_blob_id ON refs (blob_id)')
+        self._shard_flat_blobs()
+        self._batches = self._measure_batches()
+
+        if sweep_interval:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='upload-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=10)
+
+    def path_for(self, blob_id):
+        return os.path.join(self.directory, blob_id[:2], blob_id[2:4], blob_id)
+
+    def _shard_flat_blobs(self):
+        """Move blobs stored directly in ``directory`` (the unsharded layout) into their shard."""
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            blob_id = entry.name[:-len(ARTIFACT_SUFFIX)] if entry.name.endswith(ARTIFACT_SUFFIX) else entry.name
+            target = os.path.join(os.path.dirname(self.path_for(blob_id)), entry.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # rename keeps the mtime, so the artifact still matches its blob
+            os.replace(entry.path, target)
+
+    def _write_temp(self, stream):
+        """Copy ``stream`` to a temporary file in chunks; return (tmp_path, sha256, size)."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def add(self, owner, stream, extension, name=None):
+        """Store ``stream`` and make it ``owner``'s current document.
+
+        The owner's previous document, if any, loses its reference.  Returns a
+        StoredUpload whose ``created`` is False when an identical blob was
+        already stored.
+        """
+        tmp_path, digest, size = self._write_temp(stream)
+        blob_id = f"{digest}.{extension.lower()}"
+        path = self.path_for(blob_id)
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                # Serialises against the sweeper in this and other processes
+                conn.execute('BEGIN IMMEDIATE')
+                created = not os.path.exists(path)
+                if created:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                previous = conn.execute('SELECT blob_id FROM refs WHERE owner = ?', (owner,)).fetchone()
+                conn.execute(
+                    'INSERT INTO blobs (blob_id, size, refcount, created_at, last_used_at) VALUES (?, ?, 1, ?, ?) '
+                    'ON CONFLICT(blob_id) DO UPDATE SET refcount = refcount + 1, released_at = NULL, '
+                    'last_used_at = excluded.last_used_at',
+                    (blob_id, size, now, now)
+                )
+                conn.execute(
+                    'INSERT OR REPLACE INTO refs (owner, blob_id, name, created_at) VALUES (?, ?, ?, ?)',
+                    (owner, blob_id, name, now)
+                )
+                if previous:
+                    self._unref(conn, previous[0], now)
+                self.uploads += 1
+                if not created:
+                    self.deduplicated += 1
+                    self.bytes_saved += size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if self.max_bytes and created:
+            self.evict(keep=blob_id)
+        return StoredUpload(blob_id, path, size, created)
+
+    def _unref(self, conn, blob_id, now):
+        conn.execute(
+            'UPDATE blobs SET refcount = refcount - 1, '
+            'released_at = CASE WHEN refcount <= 1 THEN ? ELSE released_at END WHERE blob_id = ?',
+            (now, blob_id)
+        )
+
+    def _remove_files(self, blob_id):
+        path = self.path_for(blob_id)
+        for leftover in (path, artifact_path(path)):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
+    def touch(self, path):
+        """Mark the blob at ``path`` as used, for LRU eviction; other paths are ignored."""
+        blob_id = os.path.basename(path)
+        if path != self.path_for(blob_id):
+            return
+        with self._connect() as conn:
+            conn.execute('UPDATE blobs SET last_used_at = ? WHERE blob_id = ?', (time.time(), blob_id))
+
+    def release(self, owner):
+        """Drop ``owner``'s reference, e.g. when its session ends."""
+        with self._lock, self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT blob_id FROM refs WHERE owner = ?', (owner,)).fetchone()
+            if row:
+                conn.execute('DELETE FROM refs WHERE owner = ?', (owner,))
+                self._unref(conn, row[0], time.time())
+        return row is not None
+
+    def expire_owners(self):
+        """Release references held by owners that ``owner_alive`` reports as gone."""
+        if self.owner_alive is None:
+            return 0
+        # A reference younger than the owner lifetime cannot belong to an expired session
+        with self._connect() as conn:
+            owners = [row[0] for row in conn.execute(
+                'SELECT owner FROM refs WHERE created_at < ?', (time.time() - self.owner_lifetime,)
+            )]
+        expired = sum(1 for owner in owners if not self.owner_alive(owner) and self.release(owner))
+        with self._lock:
+            self.expired_references += expired
+        return expired
+
+    def collect(self):
+        """Delete blobs (and their artifacts) that have had no references for ``grace`` seconds."""
+        with self._lock, self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            doomed = conn.execute(
+                'SELECT blob_id FROM blobs WHERE refcount <= 0 AND released_at < ?',
+                (time.time() - self.grace,)
+            ).fetchall()
+            for (blob_id,) in doomed:
+                self._remove_files(blob_id)
+            conn.executemany('DELETE FROM blobs WHERE blob_id = ?', doomed)
+            self.collected += len(doomed)
+        return len(doomed)
+
+    def evict(self, keep=None):
+        """Delete least recently used blobs and idle batches until under ``max_bytes``.
+
+        Unreferenced blobs go first, then idle batches (oldest first), then
+        referenced blobs.
+        """
+        if not self.max_bytes:
+            return 0
+        with self._lock, self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            blob_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+            total = blob_bytes + sum(size for size, _ in self._batches.values())
+            if total <= self.max_bytes:
+                return 0
+            doomed = []
+            doomed_batches = []
+            idle = sorted((modified, name, size) for name, (size, modified) in self._batches.items()
+                          if not self._batch_running(name))
+            rows = conn.execute('SELECT blob_id, size, refcount > 0 FROM blobs ORDER BY refcount > 0, last_used_at')
+            for blob_id, size, referenced in rows:
+                while referenced and idle and total > self.max_bytes:
+                    _, name, batch_size = idle.pop(0)
+                    doomed_batches.append(name)
+                    total -= batch_size
+                if total <= self.max_bytes:
+                    break
+                if blob_id == keep:
+                    continue
+                doomed.append((blob_id,))
+                total -= size
+            while idle and total > self.max_bytes:
+                _, name, batch_size = idle.pop(0)
+                doomed_batches.append(name)
+                total -= batch_size
+            for (blob_id,) in doomed:
+                self._remove_files(blob_id)
+            # Sessions pointing at an evicted blob are told to upload again
+            conn.executemany('DELETE FROM refs WHERE blob_id = ?', doomed)
+            conn.executemany('DELETE FROM blobs WHERE blob_id = ?', doomed)
+            self.evictions += len(doomed) + len(doomed_batches)
+        for name in doomed_batches:
+            self._remove_batch(name)
+        return len(doomed) + len(doomed_batches)
+
+    def _batch_running(self, name):
+        return self.batch_active is not None and self.batch_active(name)
+
+    def _remove_batch(self, name):
+        shutil.rmtree(os.path.join(self.batch_directory, name), ignore_errors=True)
+        with self._lock:
+            self._batches.pop(name, None)
+
+    def _measure_batches(self):
+        """Return ``{name: (bytes, last modified)}`` for every batch directory."""
+        batches = {}
+        if not self.batch_directory or not os.path.isdir(self.batch_directory):
+            return batches
+        for entry in os.scandir(self.batch_directory):
+            if not entry.is_dir():
+                continue
+            size, modified = 0, entry.stat().st_mtime
+            for root, _, files in os.walk(entry.path):
+                for name in files:
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    size += stat.st_size
+                    modified = max(modified, stat.st_mtime)
+            batches[entry.name] = (size, modified)
+        return batches
+
+    def sweep_batches(self):
+        """Delete batch directories idle for ``batch_retention`` seconds and re-measure the rest."""
+        batches = self._measure_batches()
+        cutoff = time.time() - self.batch_retention
+        removed = [name for name, (_, modified) in batches.items()
+                   if modified < cutoff and not self._batch_running(name)]
+        for name in removed:
+            shutil.rmtree(os.path.join(self.batch_directory, name), ignore_errors=True)
+            del batches[name]
+        with self._lock:
+            self._batches = batches
+            self.batches_removed += len(removed)
+        return len(removed)
+
+    def sweep_legacy(self):
+        """Remove files from the old flat upload folder once every session that could use them has expired."""
+        if not self.legacy_directory or not os.path.isdir(self.legacy_directory):
+            return 0
+        cutoff = time.time() - self.owner_lifetime - self.grace
+        removed = 0
+        for entry in os.scandir(self.legacy_directory):
+            if not entry.name.endswith(LEGACY_EXTENSIONS):
+                continue
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        with self._lock:
+            self.legacy_removed += removed
+        return removed
+
+    def sweep(self):
+        """Run every cleanup step once and return what each removed."""
+        started = time.perf_counter()
+        result = {
+            'expired_references': self.expire_owners(),
+            'collected': self.collect(),
+            'legacy_removed': self.sweep_legacy(),
+            'batches_removed': self.sweep_batches()
+        }
+        result['evicted'] = self.evict()
+        with self._lock:
+            self.last_sweep_at = time.time()
+            self.last_sweep_seconds = time.perf_counter() - started
+        return result
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                result = self.sweep()
+                if any(result.values()):
+                    logger.info('Upload sweep finished', extra={'sweep': result})
+            except Exception:
+                logger.exception('Upload sweep failed')
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        """Return dedup and retention counters, the size of the store and free disk space."""
+        with self._connect() as conn:
+            blobs, total, orphans = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refcount <= 0), 0) FROM blobs'
+            ).fetchone()
+            refs = conn.execute('SELECT COUNT(*) FROM refs').fetchone()[0]
+        disk = shutil.disk_usage(self.directory)
+        with self._lock:
+            batch_bytes = sum(size for size, _ in self._batches.values())
+            return {
+                'uploads': self.uploads,
+                'deduplicated': self.deduplicated,
+                'dedup_rate': round(self.deduplicated / self.uploads, 4) if self.uploads else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'blobs': blobs,
+                'bytes': total + batch_bytes,
+                'blob_bytes': total,
+                'batches': len(self._batches),
+                'batch_bytes': batch_bytes,
+                'max_bytes': self.max_bytes,
+                'unreferenced': orphans,
+                'references': refs,
+                'collected': self.collected,
+                'evictions': self.evictions,
+                'expired_references': self.expired_references,
+                'legacy_removed': self.legacy_removed,
+                'batches_removed': self.batches_removed,
+                'last_sweep_at': self.last_sweep_at,
+                'last_sweep_ms': round(1000 * self.last_sweep_seconds, 3),
+                'disk_total': disk.total,
+                'disk_free': disk.free
+            }